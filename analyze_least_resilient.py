@@ -6,6 +6,7 @@ These are the true crisis areas needing immediate intervention
 
 import pandas as pd
 import numpy as np
+import tract_store
 
 def analyze_least_resilient():
     """
@@ -18,21 +19,10 @@ def analyze_least_resilient():
     # Load all data with coordinates
     df = pd.read_csv('data/processed/all_1059_resilient_FINAL_with_coordinates.csv')
     
-    # Also load the full model results to get ALL tracts, not just resilient ones
-    all_results = pd.read_csv('data/processed/model_table_with_residuals.csv')
-    fara = pd.read_csv('data/interim/fara_2019.csv')
-    
-    # Prepare for merge
-    fara['GEOID'] = fara['CensusTract'].astype(str).str.zfill(11)
-    all_results['GEOID'] = all_results['GEOID'].astype(str).str.zfill(11)
-    
-    # Merge to identify ALL LILA tracts
-    merged = all_results.merge(
-        fara[['GEOID', 'LILATracts_1And10', 'County', 'State', 'PovertyRate', 
-              'MedianFamilyIncome', 'Pop2010', 'Urban']], 
-        on='GEOID', 
-        how='left'
-    )
+    # Also load the full model results to get ALL tracts, not just resilient ones,
+    # merged with FARA to identify ALL LILA tracts
+    merged = tract_store.load_merged(['LILATracts_1And10', 'County', 'State', 'PovertyRate',
+                                      'MedianFamilyIncome', 'Pop2010', 'Urban'])
     
     # Filter to LILA tracts only
     all_lila = merged[merged['LILATracts_1And10'] == 1].copy()
@@ -49,11 +39,7 @@ def analyze_least_resilient():
     least_resilient = least_resilient.sort_values('resilience_score')
     
     # Add coordinates from gazetteer
-    gaz = pd.read_csv('data/census_gazetteer/2019_Gaz_tracts_national.txt', 
-                      sep='\t', dtype={'GEOID': str})
-    gaz.columns = gaz.columns.str.strip()
-    gaz = gaz[['GEOID', 'INTPTLAT', 'INTPTLONG']]
-    gaz.columns = ['GEOID', 'latitude', 'longitude']
+    gaz = tract_store.load_centroids()
     
     least_resilient = least_resilient.merge(gaz, on='GEOID', how='left')
     
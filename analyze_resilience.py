@@ -5,46 +5,48 @@ Implements missing components from original vision
 """
 
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy import stats
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
 import warnings
+import tract_store
+import places_store
+import bivariate
+import figure_engine
 warnings.filterwarnings('ignore')
 
 # Set style for publication-quality figures
 plt.style.use('seaborn-v0_8-darkgrid')
 sns.set_palette("husl")
 
+# Key outcomes from original vision
+PLACES_MEASURES = ['OBESITY', 'DIABETES', 'CHD', 'BPHIGH', 'LPA']
+
 def load_data():
     """Load PLACES and FARA data"""
     print("Loading data...")
     
     # Load FARA data
-    fara = pd.read_csv('data/interim/fara_2019.csv')
+    fara = tract_store.load_fara()
     print(f"FARA data: {fara.shape[0]} tracts")
     
-    # Load PLACES data
-    places = pd.read_csv('data/raw/places_tract.csv')
+    # Load PLACES data (only the measures analyzed below)
+    places = places_store.load_places(PLACES_MEASURES)
     print(f"PLACES data: {places.shape[0]} records")
     
     # Load model results
-    results = pd.read_csv('data/processed/model_table_with_residuals.csv')
+    results = tract_store.load_model_table()
     print(f"Model results: {results.shape[0]} tracts")
     
     return fara, places, results
 
-def analyze_places_outcomes(places):
+def analyze_places_outcomes():
     """Analyze which health outcomes are included"""
     print("\n=== PLACES Health Outcomes Analysis ===")
     
-    # Key outcomes from original vision
-    target_outcomes = ['OBESITY', 'DIABETES', 'CHD', 'BPHIGH', 'LPA']
+    target_outcomes = PLACES_MEASURES
     
-    # Check available outcomes
-    outcome_counts = places.groupby('MeasureId').size().sort_values(ascending=False)
+    # Check available outcomes (counts come from the cache manifest)
+    outcome_counts = places_store.measure_counts()
     print(f"\nTop 10 health outcomes by frequency:")
     print(outcome_counts.head(10))
     
@@ -114,12 +116,9 @@ def perform_sensitivity_analysis(fara, results):
     """Run sensitivity analysis across LILA thresholds"""
     print("\n=== Sensitivity Analysis Across LILA Thresholds ===")
     
-    # Merge data - ensure both GEOIDs are strings
-    fara['GEOID'] = fara['CensusTract'].astype(str).str.zfill(11)
-    results['GEOID'] = results['GEOID'].astype(str).str.zfill(11)
-    merged = results.merge(fara[['GEOID', 'LILATracts_1And10', 'LILATracts_halfAnd10', 
-                                  'LILATracts_1And20', 'LILATracts_Vehicle']], 
-                           on='GEOID', how='left')
+    # Merge data on the store's normalized GEOID
+    merged = tract_store.load_merged(['LILATracts_1And10', 'LILATracts_halfAnd10',
+                                      'LILATracts_1And20', 'LILATracts_Vehicle'])
     
     # Analyze resilience by LILA status
     lila_cols = ['LILATracts_1And10', 'LILATracts_halfAnd10', 'LILATracts_1And20']
@@ -185,66 +184,9 @@ def create_visualizations(merged, results):
     """Create missing visualizations for paper"""
     print("\n=== Creating Visualizations ===")
     
-    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-    
-    # 1. Scatter plot: Food access vs health burden with LOESS
-    ax1 = axes[0, 0]
-    lila_status = merged['LILATracts_1And10'].fillna(0)
-    colors = ['blue' if x == 0 else 'red' for x in lila_status]
-    ax1.scatter(merged['burden'], merged['resilience_score'], 
-                c=colors, alpha=0.3, s=10)
-    
-    # Add LOESS smoothing
-    from scipy.signal import savgol_filter
-    sorted_idx = np.argsort(merged['burden'].dropna())
-    burden_sorted = merged['burden'].dropna().iloc[sorted_idx]
-    resilience_sorted = merged['resilience_score'].dropna().iloc[sorted_idx]
-    
-    # Simple moving average as LOESS approximation
-    window = 100
-    smooth_resilience = pd.Series(resilience_sorted.values).rolling(window, center=True).mean()
-    ax1.plot(burden_sorted, smooth_resilience, 'green', linewidth=2, label='Smoothed trend')
-    
-    ax1.set_xlabel('Health Burden (z-score)')
-    ax1.set_ylabel('Resilience Score')
-    ax1.set_title('Health Burden vs Resilience\n(Red = LILA tracts, Blue = Non-LILA)')
-    ax1.legend()
-    ax1.grid(True, alpha=0.3)
-    
-    # 2. Distribution of resilience scores
-    ax2 = axes[0, 1]
-    ax2.hist(results['resilience_score'], bins=50, edgecolor='black', alpha=0.7)
-    ax2.axvline(results['resilience_score'].quantile(0.9), color='red', 
-                linestyle='--', label='90th percentile')
-    ax2.axvline(results['resilience_score'].quantile(0.1), color='blue', 
-                linestyle='--', label='10th percentile')
-    ax2.set_xlabel('Resilience Score')
-    ax2.set_ylabel('Number of Tracts')
-    ax2.set_title('Distribution of Resilience Scores')
-    ax2.legend()
-    ax2.grid(True, alpha=0.3)
-    
-    # 3. Residual Q-Q plot for model diagnostics
-    ax3 = axes[1, 0]
-    stats.probplot(results['resid'], dist="norm", plot=ax3)
-    ax3.set_title('Q-Q Plot of Model Residuals')
-    ax3.grid(True, alpha=0.3)
-    
-    # 4. Top resilient tracts bar chart
-    ax4 = axes[1, 1]
-    top_10 = results.nlargest(10, 'resilience_score')
-    tract_labels = [f"{row['StateAbbr']}-{str(row['TractFIPS'])[-4:]}" 
-                   for _, row in top_10.iterrows()]
-    y_pos = np.arange(len(tract_labels))
-    ax4.barh(y_pos, top_10['resilience_score'].values, color='green', alpha=0.7)
-    ax4.set_yticks(y_pos)
-    ax4.set_yticklabels(tract_labels)
-    ax4.set_xlabel('Resilience Score')
-    ax4.set_title('Top 10 Resilient Census Tracts')
-    ax4.grid(True, alpha=0.3, axis='x')
-    
-    plt.tight_layout()
-    plt.savefig('figures/resilience_analysis.png', dpi=300, bbox_inches='tight')
+    # Density raster + binned LOWESS, histogram, Q-Q and top-10 panels, all
+    # drawn from precomputed aggregates rather than one marker per tract
+    fig = figure_engine.resilience_figure(merged, results, 'figures/resilience_analysis.png', dpi=300)
     print("Saved: figures/resilience_analysis.png")
     
     return fig
@@ -253,24 +195,14 @@ def create_bivariate_map_data(merged):
     """Prepare data for bivariate choropleth map"""
     print("\n=== Preparing Bivariate Map Data ===")
     
-    # Create quintiles for both variables
-    merged['lila_intensity'] = pd.qcut(merged['LILATracts_1And10'].fillna(0), 
-                                       q=3, labels=['Low', 'Medium', 'High'])
-    merged['resilience_category'] = pd.qcut(merged['resilience_score'], 
-                                            q=3, labels=['Low', 'Medium', 'High'])
-    
-    # Create bivariate categories
-    bivariate_map = {
-        ('Low', 'Low'): 1, ('Low', 'Medium'): 2, ('Low', 'High'): 3,
-        ('Medium', 'Low'): 4, ('Medium', 'Medium'): 5, ('Medium', 'High'): 6,
-        ('High', 'Low'): 7, ('High', 'Medium'): 8, ('High', 'High'): 9
-    }
-    
-    merged['bivariate_class'] = merged.apply(
-        lambda x: bivariate_map.get((x['lila_intensity'], x['resilience_category']), 0)
-        if pd.notna(x['lila_intensity']) and pd.notna(x['resilience_category']) else 0,
-        axis=1
-    )
+    # Terciles of continuous LILA intensity (low-access population share) and
+    # resilience, combined into integer class codes 1-9 (0 = missing)
+    intensity = bivariate.INTENSITY_COLUMN
+    if intensity not in merged.columns:
+        merged = merged.merge(tract_store.load_fara([intensity]), on='GEOID', how='left')
+    classes = bivariate.tract_classes(merged, intensity=intensity, n=3)
+    for col in ['lila_intensity', 'resilience_category', 'bivariate_class']:
+        merged[col] = classes[col].values
     
     # Summary
     print("\nBivariate classification distribution:")
@@ -289,7 +221,7 @@ def create_bivariate_map_data(merged):
     
     # Save for mapping
     merged[['GEOID', 'bivariate_class', 'lila_intensity', 'resilience_category',
-            'burden', 'resilience_score']].to_csv(
+            intensity, 'burden', 'resilience_score']].to_csv(
         'data/processed/bivariate_map_data.csv', index=False
     )
     print("Saved: data/processed/bivariate_map_data.csv")
@@ -333,7 +265,7 @@ def main():
     fara, places, results = load_data()
     
     # 1. Analyze PLACES outcomes
-    outcome_counts = analyze_places_outcomes(places)
+    outcome_counts = analyze_places_outcomes()
     
     # 2. Analyze confidence intervals
     places_with_ci = analyze_confidence_intervals(places)
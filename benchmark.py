@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for every analysis stage on synthetic fixtures
+Runs each stage against a synthetic_data fixture in its own freshly spawned
+process (so in-memory caches start cold and peak RSS belongs to that stage
+alone), records wall time and peak RSS to a JSON history and flags runs
+slower than recent history for the same stage, size and host.
+
+    python benchmark.py                       all stages on the 68k fixture
+    python benchmark.py --size 1m --only model_fit merge --repeat 3
+    python benchmark.py --check               exit 1 on any regression
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import synthetic_data
+
+HISTORY_PATH = 'data/benchmarks/history.json'
+REGRESSION_RATIO = 1.25  # slower than this multiple of the recent median is a regression
+HISTORY_WINDOW = 5
+PERMUTATIONS = 99
+GWR_BANDWIDTH = 300  # one fixed-bandwidth fit; the AICc search repeats it ~15 times
+
+
+def _setup_none():
+    return ()
+
+
+def _setup_places_ingest():
+    import places_store
+    shutil.rmtree(places_store.CACHE_DIR, ignore_errors=True)
+    return ()
+
+
+def _run_places_ingest():
+    import places_store
+    places_store.build_cache(force=True)
+
+
+def _setup_places_load():
+    import places_store
+    places_store.build_cache()
+    return ()
+
+
+def _run_places_load():
+    import burden_model
+    import places_store
+    places_store.load_places(list(burden_model.OUTCOME_MEASURES.values()))
+
+
+def _run_store_build():
+    import tract_store
+    tract_store.build_store(force=True)
+
+
+def _setup_store():
+    import tract_store
+    tract_store.build_store()
+    tract_store.clear_cache()
+    return ()
+
+
+def _run_merge():
+    import tract_store
+    tract_store.load_merged()
+
+
+def _run_merge_compact():
+    import tract_store
+    tract_store.load_merged(compact=True)
+
+
+def _setup_model_fit():
+    import burden_model
+    import tract_store
+    tract_store.build_store()
+    cols = [c for c, _ in burden_model.covariates() if c != 'Rural']
+    return burden_model.load_burden_table(), tract_store.load_fara(cols + ['Urban'])
+
+
+def _run_model_fit(burden, fara):
+    import burden_model
+    burden_model.fit_expected_burden(burden, fara)
+
+
+def _setup_spatial_stats():
+    import tract_store
+    tract_store.build_store()
+    return tract_store.load_model_table(), tract_store.load_centroids()
+
+
+def _run_spatial_stats(results, centroids):
+    import spatial_stats
+    W, mask = spatial_stats.weights_for_tracts(results['GEOID'], centroids=centroids)
+    spatial_stats.morans_i(results['resid'].to_numpy()[mask], W, permutations=PERMUTATIONS)
+
+
+def _setup_spatial_regression():
+    import spatial_regression
+    import tract_store
+    tract_store.build_store()
+    return (spatial_regression.spatial_design(),)
+
+
+def _run_spatial_regression(design):
+    import spatial_regression
+    cp = spatial_regression.cross_products(design['y'], design['Z'], design['W'])
+    logdet = spatial_regression.logdet_function(design['W'])
+    for model in ('sem', 'sar'):
+        spatial_regression.fit_spatial(cp, logdet, model)
+
+
+def _setup_gwr():
+    import gwr
+    import tract_store
+    tract_store.build_store()
+    return (gwr.gwr_design(),)
+
+
+def _run_gwr(design):
+    import gwr
+    gwr.fit_gwr(design, GWR_BANDWIDTH)
+
+
+def _setup_hotspots():
+    import hotspots
+    import tract_store
+    tract_store.build_store()
+    tracts, _ = hotspots.located_tracts()
+    return (tracts,)
+
+
+def _run_hotspots(tracts):
+    import hotspots
+    W = hotspots.gi_star_weights(tracts['latitude'], tracts['longitude'])
+    hotspots.getis_ord_gi_star(tracts['value'], W)
+    hotspots.bernoulli_scan(tracts, tracts['resilient_lila'], permutations=PERMUTATIONS)
+
+
+def _setup_twin_matching():
+    import tract_store
+    import twin_matching
+    tract_store.build_store()
+    merged = tract_store.load_merged(['LILATracts_1And10', 'PovertyRate', 'Pop2010', 'Urban',
+                                      'MedianFamilyIncome'])
+    lila = merged['LILATracts_1And10'] == 1
+    return merged[lila], merged[~lila], twin_matching.DEFAULT_COVARIATES + ['MedianFamilyIncome']
+
+
+def _run_twin_matching(treated, pool, covariates):
+    import twin_matching
+    twin_matching.match_twins(treated, pool, covariates, k=5)
+
+
+def _setup_place_assignment():
+    import place_assignment
+    import tract_store
+    places = place_assignment.load_place_polygons('data/tiger_places/places.geojson')
+    return tract_store.load_centroids(), places
+
+
+def _run_place_assignment(centroids, places):
+    import place_assignment
+    place_assignment.assign_tracts(centroids, places)
+
+
+def _setup_geojson_join():
+    import geojson_stream
+    import tract_store
+    tract_store.build_store()
+    return (geojson_stream.property_lookup(),)
+
+
+def _run_geojson_join(lookup):
+    import geojson_stream
+    geojson_stream.join_geojson('data/external/tracts_full.geojson', 'figures/resilience.geojson',
+                                lookup)
+
+
+def _setup_tables():
+    os.makedirs('tables', exist_ok=True)
+    return _setup_store()
+
+
+def _run_tables():
+    import generate_tables
+    generate_tables.create_summary_statistics_table()
+    generate_tables.create_regression_table()
+    generate_tables.create_state_resilience_table()
+    generate_tables.create_correlation_matrix()
+
+
+# Stages in pipeline order; setup is untimed, leaves in-memory caches cold and
+# its result is passed to run
+BENCHMARKS = {
+    'places_ingest': (_setup_places_ingest, _run_places_ingest),
+    'places_load': (_setup_places_load, _run_places_load),
+    'store_build': (_setup_none, _run_store_build),
+    'merge': (_setup_store, _run_merge),
+    'merge_compact': (_setup_store, _run_merge_compact),
+    'model_fit': (_setup_model_fit, _run_model_fit),
+    'spatial_stats': (_setup_spatial_stats, _run_spatial_stats),
+    'spatial_regression': (_setup_spatial_regression, _run_spatial_regression),
+    'gwr': (_setup_gwr, _run_gwr),
+    'hotspots': (_setup_hotspots, _run_hotspots),
+    'twin_matching': (_setup_twin_matching, _run_twin_matching),
+    'place_assignment': (_setup_place_assignment, _run_place_assignment),
+    'geojson_join': (_setup_geojson_join, _run_geojson_join),
+    'tables': (_setup_tables, _run_tables),
+}
+
+
+def _measure(task):
+    """
+    Worker: run one benchmark in the fixture directory
+
+    Returns the best of repeat timings, peak RSS and the peak already
+    reached by imports and setup before the first timed run.
+    """
+    name, root, repeat = task
+    os.chdir(root)
+    setup, run = BENCHMARKS[name]
+    times = []
+    with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+        for _ in range(repeat):
+            args = setup()
+            if not times:
+                before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            start = time.perf_counter()
+            run(*args)
+            times.append(time.perf_counter() - start)
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {'wall_s': min(times), 'wall_s_all': times, 'peak_rss_mb': peak,
+            'setup_rss_mb': before}
+
+
+def measure(name, root, repeat=1):
+    """Run one benchmark in a fresh spawned process"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_measure, (name, os.path.abspath(root), repeat)).result()
+
+
+def _commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                             text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path=HISTORY_PATH):
+    """Every recorded run, oldest first"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(history, path=HISTORY_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+
+def baseline(history, record, window=HISTORY_WINDOW):
+    """Median wall time of the last window runs of the same stage, size and host"""
+    same = [r['wall_s'] for r in history
+            if (r['benchmark'], r['size'], r['host']) == (record['benchmark'], record['size'],
+                                                          record['host'])]
+    same = sorted(same[-window:])
+    if not same:
+        return None
+    mid = len(same) // 2
+    return same[mid] if len(same) % 2 else (same[mid - 1] + same[mid]) / 2
+
+
+def run_benchmarks(names=None, size='68k', repeat=1, history_path=HISTORY_PATH,
+                   fixture_dir=synthetic_data.FIXTURE_DIR, ratio=REGRESSION_RATIO):
+    """Run the selected benchmarks, append them to the history; returns the new records"""
+    names = names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"unknown benchmark(s): {', '.join(unknown)}")
+    n_tracts = synthetic_data.SIZES.get(size) or int(size)
+    root = synthetic_data.fixture_root(size, fixture_dir)
+    synthetic_data.write_fixture(n_tracts, root)
+
+    history = load_history(history_path)
+    stamp = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    commit, host = _commit(), platform.node()
+    records = []
+    for name in names:
+        result = measure(name, root, repeat)
+        record = {'timestamp': stamp, 'commit': commit, 'host': host,
+                  'python': platform.python_version(), 'benchmark': name, 'size': str(size),
+                  'tracts': n_tracts, 'repeat': repeat, **result}
+        base = baseline(history, record)
+        record['baseline_s'] = base
+        record['regression'] = bool(base and record['wall_s'] > ratio * base)
+        flag = '  REGRESSION' if record['regression'] else ''
+        vs = f"  (baseline {base:.2f}s)" if base else ''
+        print(f"  {name:18s} {record['wall_s']:8.2f}s  {record['peak_rss_mb']:8.0f} MB{vs}{flag}")
+        records.append(record)
+    save_history(history + records, history_path)
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', default='68k',
+                        help=f"fixture size: tract count or one of {', '.join(synthetic_data.SIZES)}")
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per benchmark (best is kept)')
+    parser.add_argument('--check', action='store_true', help='exit 1 if any benchmark regressed')
+    parser.add_argument('--list', action='store_true', help='list benchmarks and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        sys.exit(0)
+    print("=" * 60)
+    print(f"BENCHMARKS: {args.size} TRACTS")
+    print("=" * 60)
+    records = run_benchmarks(args.only, args.size, args.repeat)
+    print(f"\nAppended {len(records)} runs to {HISTORY_PATH}")
+    if args.check and any(r['regression'] for r in records):
+        print(f"Regression: slower than {REGRESSION_RATIO}x the recent median")
+        sys.exit(1)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Bivariate choropleth classification
+Classes an x and a y variable into n quantile levels each and combines the
+integer level codes into n*n class codes (x-major, 1..n*n, 0 = missing)
+without per-row Python. Works for continuous measures such as the
+low-access population share as well as for 0/1 flags, and builds n x n
+colour schemes for the map.
+"""
+
+import numpy as np
+import pandas as pd
+
+import tract_store
+
+INTENSITY_COLUMN = 'lapophalfshare'  # share of population beyond 1/2 mile from a supermarket
+OUTPUT_CSV = 'data/processed/bivariate_classes.csv'  # bivariate_map_data.csv comes from analyze_resilience.py
+
+# Corners of the default scheme: (low x, low y), (low x, high y), (high x, low y), (high x, high y)
+CORNERS = ('#e8e8e8', '#5ac8c8', '#be64ac', '#3b4994')
+
+
+def level_labels(n):
+    """Names for n ordered levels"""
+    if n == 2:
+        return ['Low', 'High']
+    if n == 3:
+        return ['Low', 'Medium', 'High']
+    return [f"Q{i + 1}" for i in range(n)]
+
+
+def quantile_levels(values, n):
+    """
+    Integer level 0..n-1 per value from n-quantile breaks, -1 where missing
+
+    Bins are right-closed as in pd.qcut. Tied breaks collapse (a 0/1 flag
+    has at most two levels) and the levels actually used are spread over
+    0..n-1, so a binary measure maps to Low/High instead of failing.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    ok = np.isfinite(values)
+    if not ok.any():
+        return np.full(len(values), -1, dtype=np.int8)
+    breaks = np.unique(np.quantile(values[ok], np.arange(1, n) / n))
+    levels = np.searchsorted(breaks, values, side='left')
+    used = np.unique(levels[ok])
+    if len(used) < n:
+        spread = np.zeros(len(breaks) + 1, dtype=np.int64)
+        spread[used] = np.round(np.arange(len(used)) * (n - 1) / max(len(used) - 1, 1))
+        levels = spread[levels]
+    return np.where(ok, levels, -1).astype(np.int8)
+
+
+def class_codes(x_levels, y_levels, n):
+    """x-major bivariate class: x * n + y + 1, or 0 if either level is missing"""
+    x_levels = np.asarray(x_levels, dtype=np.int16)
+    y_levels = np.asarray(y_levels, dtype=np.int16)
+    codes = x_levels * n + y_levels + 1
+    return np.where((x_levels < 0) | (y_levels < 0), 0, codes).astype(np.int16)
+
+
+def classify(x, y, n=3):
+    """
+    Levels and class codes for two aligned value arrays
+
+    Returns a DataFrame with categorical x_level/y_level and integer
+    bivariate_class (1..n*n, 0 = unclassified).
+    """
+    x_levels = quantile_levels(x, n)
+    y_levels = quantile_levels(y, n)
+    labels = level_labels(n)
+    return pd.DataFrame({
+        'x_level': pd.Categorical.from_codes(x_levels, labels, ordered=True),
+        'y_level': pd.Categorical.from_codes(y_levels, labels, ordered=True),
+        'bivariate_class': class_codes(x_levels, y_levels, n),
+    })
+
+
+def _hex_to_rgb(color):
+    return np.array([int(color[i:i + 2], 16) for i in (1, 3, 5)], dtype=np.float64)
+
+
+def palette(n=3, corners=CORNERS):
+    """
+    n*n hex colours indexed by bivariate_class - 1
+
+    Bilinear interpolation between the four corner colours, so any n gives
+    a scheme with the same reading as the classic 3 x 3 one.
+    """
+    c00, c01, c10, c11 = (_hex_to_rgb(c) for c in corners)
+    t = np.linspace(0, 1, n)
+    colours = []
+    for tx in t:
+        for ty in t:
+            rgb = (1 - tx) * ((1 - ty) * c00 + ty * c01) + tx * ((1 - ty) * c10 + ty * c11)
+            colours.append('#' + ''.join(f"{int(round(v)):02x}" for v in rgb))
+    return colours
+
+
+def tract_classes(table=None, intensity=INTENSITY_COLUMN, score='resilience_score', n=3):
+    """
+    Bivariate classes of LILA intensity (x) and resilience score (y) per tract
+
+    table defaults to the model table merged with the intensity column from
+    FARA; returns GEOID, both measures, their levels and bivariate_class.
+    """
+    if table is None:
+        table = tract_store.load_merged([intensity])
+    classes = classify(table[intensity], table[score], n)
+    out = table[['GEOID', intensity, score]].reset_index(drop=True)
+    out['lila_intensity'] = classes['x_level']
+    out['resilience_category'] = classes['y_level']
+    out['bivariate_class'] = classes['bivariate_class']
+    return out
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BIVARIATE CLASSIFICATION")
+    print("=" * 60)
+    classes = tract_classes()
+    print(pd.crosstab(classes['lila_intensity'], classes['resilience_category']))
+    print("\nPalette:", palette())
+    classes.to_csv(OUTPUT_CSV, index=False)
+    print(f"Saved: {OUTPUT_CSV}")
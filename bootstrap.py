@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+State-stratified bootstrap of the expected-burden model
+Each replicate resamples tracts with replacement within every state, refits
+the model and rescores all tracts, giving per-tract resilience score
+intervals and the probability of clearing the top-decile cut used for the
+resilient LILA list in extract_all_resilient.py
+
+A resample is fitted as OLS weighted by how often each tract was drawn,
+which is the same estimator as fitting the duplicated rows, so replicates
+never materialize a resampled design matrix.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import burden_model
+import shared_arrays
+
+OUTPUT_DIR = 'data/processed/bootstrap'
+REPLICATES = 1000
+SEED = 20190101
+BATCH = 25  # replicates per pool task
+QUANTILE_COLUMNS = 8192  # tracts per block when taking per-tract quantiles
+
+
+def bootstrap_design(burden=None, config=None):
+    """
+    Design frame sorted by state, with y, X and state offsets
+
+    Sorting by state makes each state a contiguous block, so a stratified
+    draw is one vectorized offset + floor(u * size) per replicate.
+    """
+    config = config or burden_model.load_model_config()
+    if burden is None:
+        burden = burden_model.load_burden_table()
+    include_no_vehicle = config.get('include_no_vehicle', True)
+    frame = burden_model.design_frame(burden, include_no_vehicle=include_no_vehicle)
+    frame = frame.sort_values('StateAbbr', kind='stable').reset_index(drop=True)
+    cols = burden_model.covariates(include_no_vehicle)
+    codes, states = pd.factorize(frame['StateAbbr'], sort=True)
+    size = np.bincount(codes, minlength=len(states))
+    arrays = {
+        'y': frame['burden'].to_numpy(dtype=np.float64),
+        'X': frame[[c for c, _ in cols]].to_numpy(dtype=np.float64),
+        'codes': codes.astype(np.int64),
+        'start': np.concatenate([[0], np.cumsum(size)[:-1]]),
+        'size': size,
+    }
+    return frame, arrays, [label for _, label in cols]
+
+
+def fit_weighted(y, X, codes, n_groups, w, state_fe=True):
+    """
+    Count-weighted OLS with absorbed state effects
+
+    Returns (coef, fitted) where coef is [constant, slopes...] on the areg
+    scale and fitted covers every tract, including those not drawn.
+    """
+    if state_fe:
+        wsum = np.bincount(codes, weights=w, minlength=n_groups)
+        drawn = wsum > 0
+        wsum[~drawn] = 1.0
+        ybar = np.bincount(codes, weights=w * y, minlength=n_groups) / wsum
+        xbar = np.column_stack([np.bincount(codes, weights=w * X[:, j], minlength=n_groups)
+                                for j in range(X.shape[1])]) / wsum[:, None]
+        yt = y - ybar[codes]
+        Xt = X - xbar[codes]
+    else:
+        yt = y - np.average(y, weights=w)
+        Xt = X - np.average(X, axis=0, weights=w)
+    Xw = Xt * w[:, None]
+    slopes = np.linalg.solve(Xw.T @ Xt, Xw.T @ yt)
+    if state_fe:
+        effects = ybar - xbar @ slopes
+        fitted = effects[codes] + X @ slopes
+        constant = np.average(effects, weights=np.where(drawn, wsum, 0))
+    else:
+        constant = np.average(y, weights=w) - np.average(X, axis=0, weights=w) @ slopes
+        fitted = constant + X @ slopes
+    return np.concatenate([[constant], slopes]), fitted
+
+
+def _replicates(task):
+    """Worker: fit a batch of replicates, writing scores and coefficients in place"""
+    first, count, seed, state_fe = task
+    data = shared_arrays.ATTACHED
+    y, X, codes = data['y'], data['X'], data['codes']
+    start, size = data['start'], data['size']
+    n = len(y)
+    rng = np.random.default_rng(seed)
+    offset, width = start[codes], size[codes].astype(np.float64)
+    for b in range(first, first + count):
+        draws = offset + (rng.random(n) * width).astype(np.int64)
+        w = np.bincount(draws, minlength=n).astype(np.float64)
+        coef, fitted = fit_weighted(y, X, codes, len(size), w, state_fe)
+        resid = y - fitted
+        stdev = np.sqrt((w * resid ** 2).sum() / w.sum())
+        data['scores'][b] = -resid / (stdev + 1e-9)
+        data['coefs'][b] = coef
+    return count
+
+
+def run_bootstrap(arrays, replicates=REPLICATES, seed=SEED, state_fe=True, max_workers=None,
+                  batch=BATCH):
+    """
+    Run the replicates across a process pool
+
+    The design arrays and the (replicates x tracts) float32 score matrix
+    live in shared memory; workers write their rows directly. Returns
+    (scores, coefs) as ordinary arrays.
+    """
+    n, k = arrays['X'].shape
+    outputs = {'scores': np.zeros((replicates, n), dtype=np.float32),
+               'coefs': np.zeros((replicates, k + 1))}
+    seeds = np.random.SeedSequence(seed).spawn(-(-replicates // batch))
+    tasks = [(first, min(batch, replicates - first), s, state_fe)
+             for first, s in zip(range(0, replicates, batch), seeds)]
+
+    blocks, spec = shared_arrays.share_arrays({**arrays, **outputs}, writable=outputs)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=shared_arrays.attach_arrays,
+                                 initargs=(spec,)) as pool:
+            done = 0
+            for count in pool.map(_replicates, tasks):
+                done += count
+                if done % (10 * batch) == 0 or done == replicates:
+                    print(f"  {done:,}/{replicates:,} replicates", flush=True)
+        views = shared_arrays.parent_views(blocks, spec)
+        scores, coefs = views['scores'].copy(), views['coefs'].copy()
+    finally:
+        shared_arrays.release(blocks)
+    return scores, coefs
+
+
+def summarize_tracts(scores, lila, top_pct=0.10, level=0.95):
+    """
+    Per-tract interval and top-decile probability
+
+    A tract is in the top decile of a replicate when its score exceeds that
+    replicate's (1 - top_pct) quantile over all tracts, the same rule as the
+    point-estimate list; p_resilient additionally requires LILA status.
+    """
+    replicates, n = scores.shape
+    tail = (1 - level) / 2
+    thresholds = np.quantile(scores, 1 - top_pct, axis=1).astype(np.float32)
+    summary = {name: np.empty(n) for name in
+               ('score_mean', 'score_sd', 'score_low', 'score_median', 'score_high', 'p_top_decile')}
+    for lo in range(0, n, QUANTILE_COLUMNS):
+        block = scores[:, lo:lo + QUANTILE_COLUMNS]
+        cols = slice(lo, lo + block.shape[1])
+        summary['score_mean'][cols] = block.mean(axis=0)
+        summary['score_sd'][cols] = block.std(axis=0, ddof=1)
+        q = np.quantile(block, [tail, 0.5, 1 - tail], axis=0)
+        summary['score_low'][cols], summary['score_median'][cols], summary['score_high'][cols] = q
+        summary['p_top_decile'][cols] = (block > thresholds[:, None]).mean(axis=0)
+    summary = pd.DataFrame(summary)
+    summary['p_resilient'] = np.where(lila == 1, summary['p_top_decile'], 0.0)
+    return summary
+
+
+def bootstrap_resilience(config=None, replicates=REPLICATES, seed=SEED, max_workers=None,
+                         output_dir=OUTPUT_DIR):
+    """Bootstrap the configured model and write per-tract and coefficient summaries"""
+    config = config or burden_model.load_model_config()
+    state_fe = config.get('state_fixed_effects', True)
+    frame, arrays, names = bootstrap_design(config=config)
+    n = len(frame)
+    print(f"Bootstrapping {replicates:,} state-stratified replicates on {n:,} tracts "
+          f"({frame['StateAbbr'].nunique()} states)...")
+    start = time.perf_counter()
+    scores, coefs = run_bootstrap(arrays, replicates, seed, state_fe, max_workers)
+    print(f"Replicates finished in {time.perf_counter() - start:.1f}s")
+
+    point = burden_model.fit_ols(arrays['y'], arrays['X'], names,
+                                 groups=frame['StateAbbr'].to_numpy() if state_fe else None,
+                                 se_type='classical')
+    lila = frame['LILATracts_1And10'].to_numpy()
+    tracts = frame[['GEOID', 'StateAbbr']].copy()
+    tracts['lila'] = lila.astype(np.int8)
+    tracts['resilience_score'] = burden_model.resilience_scores(point['resid'])
+    tracts = pd.concat([tracts, summarize_tracts(scores, lila, config.get('top_pct', 0.10))],
+                       axis=1)
+
+    coef_table = pd.DataFrame(coefs, columns=list(point['coef'].index))
+    coef_summary = pd.DataFrame({
+        'Coefficient': point['coef']['Coefficient'],
+        'Bootstrap_SE': coef_table.std(ddof=1),
+        'CI_low': coef_table.quantile(0.025),
+        'CI_high': coef_table.quantile(0.975),
+    })
+
+    os.makedirs(output_dir, exist_ok=True)
+    tracts.to_csv(os.path.join(output_dir, 'tract_intervals.csv'), index=False, float_format='%.4f')
+    coef_summary.to_csv(os.path.join(output_dir, 'coefficients.csv'), float_format='%.6f')
+    return tracts, coef_summary
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BOOTSTRAP: RESILIENCE SCORE INTERVALS")
+    print("=" * 60)
+    tracts, coef_summary = bootstrap_resilience()
+
+    print("\nCoefficients (bootstrap SEs, 95% percentile intervals):")
+    print(coef_summary.round(4))
+
+    threshold = tracts['resilience_score'].quantile(0.9)
+    listed = tracts[(tracts['lila'] == 1) & (tracts['resilience_score'] > threshold)]
+    print(f"\nResilient LILA tracts (point estimate): {len(listed):,}")
+    for cut in (0.5, 0.8, 0.95):
+        print(f"  with P(top decile) >= {cut:.2f}: {(listed['p_top_decile'] >= cut).sum():,}")
+    print(f"Expected list size over replicates: {tracts['p_resilient'].sum():,.0f}")
+    print(f"Median 95% interval width: {(tracts['score_high'] - tracts['score_low']).median():.3f}")
+    print(f"\nSaved {OUTPUT_DIR}/tract_intervals.csv and coefficients.csv")
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Expected-burden model in Python
+Fits burden ~ LILA + low income + rural + no vehicle + state FE on columnar
+arrays, with state fixed effects absorbed by within-state demeaning, and
+writes model_table_with_residuals.csv in the same layout as the Go model
+"""
+
+import numpy as np
+import pandas as pd
+import yaml
+from scipy import stats
+
+import tract_store
+
+CONFIG_PATH = 'config/default.yml'
+BURDEN_CSV = 'data/processed/burden_table.csv'
+MODEL_CSV = 'data/processed/model_table_with_residuals.csv'
+
+# Outcome short names (config/default.yml) -> PLACES MeasureId
+OUTCOME_MEASURES = {
+    'obesity': 'OBESITY',
+    'diabetes': 'DIABETES',
+    'hypertension': 'BPHIGH',
+    'chd': 'CHD',
+    'physical_inactivity': 'LPA',
+}
+
+# Design columns and their publication labels
+COVARIATES = [
+    ('LILATracts_1And10', 'LILA (1+10 miles)'),
+    ('LowIncomeTracts', 'Low Income'),
+    ('Rural', 'Rural'),
+]
+NO_VEHICLE = ('LILATracts_Vehicle', 'No Vehicle Access')
+
+MODEL_COLUMNS = ['TractFIPS', 'StateAbbr', 'burden', 'resid', 'resilience_score', 'GEOID']
+
+
+def load_model_config(path=CONFIG_PATH):
+    """The model section of config/default.yml"""
+    with open(path) as f:
+        return yaml.safe_load(f)['model']
+
+
+def covariates(include_no_vehicle=True):
+    """(column, label) pairs of the design, in coefficient order"""
+    return COVARIATES + ([NO_VEHICLE] if include_no_vehicle else [])
+
+
+def compose_burden(wide, outcomes, method='zmean'):
+    """
+    Composite burden from wide outcome columns
+
+    zmean averages the population z-scores of the available outcomes (the Go
+    ComposeBurden definition); pca takes the standardized first principal
+    component, oriented so that higher values mean worse health. Outcomes
+    with no observed values are skipped.
+    """
+    values = wide[outcomes].to_numpy(dtype=np.float64)
+    values = values[:, ~np.isnan(values).all(axis=0)]
+    means = np.nanmean(values, axis=0)
+    sds = np.nanstd(values, axis=0)
+    sds[~(sds > 0)] = 1.0
+    z = (values - means) / sds
+    if method == 'zmean':
+        with np.errstate(invalid='ignore'):
+            return np.nanmean(z, axis=1)
+    if method == 'pca':
+        complete = ~np.isnan(z).any(axis=1)
+        _, _, vt = np.linalg.svd(z[complete], full_matrices=False)
+        loading = vt[0] * np.sign(vt[0].sum() or 1.0)
+        score = np.full(len(z), np.nan)
+        score[complete] = z[complete] @ loading
+        return (score - np.nanmean(score)) / np.nanstd(score)
+    raise ValueError(f"unknown burden_method: {method}")
+
+
+def load_burden_table(path=BURDEN_CSV):
+    """Wide outcome table with burden, keyed by a normalized TractFIPS"""
+    burden = pd.read_csv(path, dtype={'TractFIPS': str, 'StateAbbr': str})
+    burden['TractFIPS'] = tract_store.normalize_geoid(burden['TractFIPS'])
+    return burden
+
+
+def design_frame(burden, fara=None, include_no_vehicle=True, lila_column='LILATracts_1And10'):
+    """
+    Join burden to the FARA design columns
+
+    Tracts missing from FARA are dropped; suppressed FARA flags count as 0,
+    as in the Go model.
+    """
+    cols = [c for c, _ in covariates(include_no_vehicle) if c != 'Rural']
+    cols = [lila_column if c == 'LILATracts_1And10' else c for c in cols]
+    if fara is None:
+        fara = tract_store.load_fara(cols + ['Urban'])
+    frame = burden.merge(fara[['GEOID'] + cols + ['Urban']],
+                         left_on='TractFIPS', right_on='GEOID', how='inner')
+    frame[cols] = frame[cols].fillna(0)
+    frame['Rural'] = 1 - frame['Urban'].fillna(0)
+    if lila_column != 'LILATracts_1And10':
+        frame['LILATracts_1And10'] = frame[lila_column]
+    return frame[frame['burden'].notna()].reset_index(drop=True)
+
+
+def demean_by_group(values, codes, n_groups):
+    """Subtract group means column-wise using bincount sums"""
+    values = np.asarray(values, dtype=np.float64)
+    flat = values.reshape(len(values), -1)
+    counts = np.bincount(codes, minlength=n_groups).astype(np.float64)
+    out = np.empty_like(flat)
+    for j in range(flat.shape[1]):
+        means = np.bincount(codes, weights=flat[:, j], minlength=n_groups) / counts
+        out[:, j] = flat[:, j] - means[codes]
+    return out.reshape(values.shape)
+
+
+def fit_ols(y, X, names, groups=None, cluster=None, se_type='cluster'):
+    """
+    OLS with optional absorbed fixed effects
+
+    groups absorbs one fixed effect per group by within-transformation (the
+    areg approach: group means are replaced by grand means so the constant is
+    still estimated). se_type is 'classical', 'hc1' or 'cluster'; clustered
+    errors use cluster (defaulting to groups) with the CR1 correction.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    X = np.asarray(X, dtype=np.float64)
+    n = len(y)
+    n_absorbed = 0
+    if groups is not None:
+        codes, uniques = pd.factorize(np.asarray(groups))
+        n_absorbed = len(uniques) - 1
+        yt = demean_by_group(y, codes, len(uniques)) + y.mean()
+        Xt = demean_by_group(X, codes, len(uniques)) + X.mean(axis=0)
+    else:
+        yt, Xt = y, X
+    Z = np.column_stack([np.ones(n), Xt])
+    names = ['Constant'] + list(names)
+    k = Z.shape[1]
+
+    xtx = Z.T @ Z
+    bread = np.linalg.inv(xtx)
+    coef = bread @ (Z.T @ yt)
+    resid = yt - Z @ coef
+    ssr = float(resid @ resid)
+    df_resid = n - k - n_absorbed
+
+    if se_type == 'classical':
+        vcov = bread * ssr / df_resid
+        df_t = df_resid
+    elif se_type == 'hc1':
+        scores = Z * resid[:, None]
+        vcov = bread @ (scores.T @ scores) @ bread * n / df_resid
+        df_t = df_resid
+    elif se_type == 'cluster':
+        cl = groups if cluster is None else cluster
+        if cl is None:
+            raise ValueError("clustered errors need groups or cluster")
+        cl_codes, cl_uniques = pd.factorize(np.asarray(cl))
+        n_clusters = len(cl_uniques)
+        scores = np.zeros((n_clusters, k))
+        np.add.at(scores, cl_codes, Z * resid[:, None])
+        correction = n_clusters / (n_clusters - 1) * (n - 1) / (n - k)
+        vcov = bread @ (scores.T @ scores) @ bread * correction
+        df_t = n_clusters - 1
+    else:
+        raise ValueError(f"unknown se_type: {se_type}")
+
+    se = np.sqrt(np.diag(vcov))
+    t = coef / se
+    p = 2 * stats.t.sf(np.abs(t), df_t)
+    crit = stats.t.ppf(0.975, df_t)
+    table = pd.DataFrame({
+        'Coefficient': coef, 'Std_Error': se, 't': t, 'p_value': p,
+        'CI_low': coef - crit * se, 'CI_high': coef + crit * se,
+    }, index=pd.Index(names, name='Variable'))
+
+    sst = float(((y - y.mean()) ** 2).sum())
+    r2 = 1 - ssr / sst
+    return {
+        'coef': table,
+        'vcov': vcov,
+        'resid': resid,
+        'fitted': y - resid,
+        'n': n,
+        'df_resid': df_resid,
+        'n_absorbed': n_absorbed,
+        'r2': r2,
+        'adj_r2': 1 - (1 - r2) * (n - 1) / df_resid,
+        'rmse': np.sqrt(ssr / df_resid),
+        'se_type': se_type,
+    }
+
+
+def resilience_scores(resid):
+    """Standardized negative residuals (positive = healthier than expected)"""
+    resid = np.asarray(resid, dtype=np.float64)
+    stdev = np.sqrt((resid ** 2).mean())
+    return -resid / (stdev + 1e-9)
+
+
+def fit_expected_burden(burden=None, fara=None, config=None, se_type='cluster'):
+    """
+    Fit the expected-burden model as configured
+
+    Returns the model table (MODEL_COLUMNS) and the fit summary from fit_ols.
+    """
+    config = config or load_model_config()
+    if burden is None:
+        burden = load_burden_table()
+    include_no_vehicle = config.get('include_no_vehicle', True)
+    frame = design_frame(burden, fara, include_no_vehicle)
+    cols = covariates(include_no_vehicle)
+    X = frame[[c for c, _ in cols]].to_numpy(dtype=np.float64)
+    groups = frame['StateAbbr'].to_numpy() if config.get('state_fixed_effects', True) else None
+    result = fit_ols(frame['burden'], X, [label for _, label in cols], groups=groups,
+                     cluster=frame['StateAbbr'].to_numpy(), se_type=se_type)
+
+    model_table = frame[['TractFIPS', 'StateAbbr', 'burden']].copy()
+    model_table['resid'] = result['resid']
+    model_table['resilience_score'] = resilience_scores(result['resid'])
+    model_table['GEOID'] = frame['GEOID'].values
+    return model_table[MODEL_COLUMNS], result
+
+
+def write_model_table(model_table, path=MODEL_CSV):
+    """Write the model table with the Go model's six-decimal formatting"""
+    model_table[MODEL_COLUMNS].to_csv(path, index=False, float_format='%.6f')
+
+
+def format_regression_table(result, state_fe=True):
+    """Publication layout of a fit_ols result (Table 2)"""
+    coef = result['coef']
+    order = [v for v in coef.index if v != 'Constant'] + ['Constant']
+    rows = []
+    for var in order:
+        r = coef.loc[var]
+        stars = '***' if r['p_value'] < 0.01 else '**' if r['p_value'] < 0.05 else '*' if r['p_value'] < 0.1 else ''
+        rows.append({
+            'Variable': var,
+            'Coefficient': f"{r['Coefficient']:.3f}{stars}",
+            'Std. Error': f"({r['Std_Error']:.3f})",
+            '95% CI': f"[{r['CI_low']:.3f}, {r['CI_high']:.3f}]",
+            'p-value': '<0.001' if r['p_value'] < 0.001 else f"{r['p_value']:.3f}",
+        })
+    rows.append({'Variable': ''})
+    for label, value in [('State FE', 'Yes' if state_fe else 'No'),
+                         ('N', f"{result['n']:,}"),
+                         ('R²', f"{result['r2']:.3f}"),
+                         ('Adjusted R²', f"{result['adj_r2']:.3f}"),
+                         ('RMSE', f"{result['rmse']:.3f}")]:
+        rows.append({'Variable': label, 'Coefficient': value})
+    return pd.DataFrame(rows, columns=['Variable', 'Coefficient', 'Std. Error',
+                                       '95% CI', 'p-value']).fillna('')
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("FITTING EXPECTED-BURDEN MODEL")
+    print("=" * 60)
+    model_table, result = fit_expected_burden()
+    print(result['coef'].round(4))
+    print(f"\nN = {result['n']:,}, R² = {result['r2']:.3f}, "
+          f"Adjusted R² = {result['adj_r2']:.3f}, RMSE = {result['rmse']:.3f}")
+    write_model_table(model_table)
+    print(f"\nSaved: {MODEL_CSV}")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo propagation of PLACES confidence limits into burden and resilience
+Each draw samples every tract's outcome prevalences from the distribution
+implied by its Low/High_Confidence_Limit, recomputes the z-mean burden and
+the expected-burden model residuals, and scores resilience. Draws are
+generated in chunks of shape (draws, tracts, outcomes) and folded into
+running per-tract moments, so memory depends on the chunk size only.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import burden_model
+import places_store
+
+OUTPUT_CSV = 'data/processed/burden_uncertainty.csv'
+DRAWS = 1000
+CHUNK = 25
+SEED = 20230101
+Z_95 = 1.959964
+
+
+def load_outcome_limits(config=None):
+    """
+    Design frame (sorted by state) with aligned value/low/high arrays
+
+    The arrays have shape (tracts, outcomes) in config order. Outcomes with
+    no PLACES values are skipped (as in compose_burden) and tracts with no
+    value for any outcome are dropped, so the same tracts enter every fit.
+    """
+    config = config or burden_model.load_model_config()
+    outcomes = list(config['outcomes'])
+    measures = [burden_model.OUTCOME_MEASURES[o] for o in outcomes]
+    burden = burden_model.load_burden_table()
+    frame = burden_model.design_frame(burden, include_no_vehicle=config.get('include_no_vehicle', True))
+    frame = frame.sort_values('StateAbbr', kind='stable').reset_index(drop=True)
+
+    places = places_store.load_places(measures)
+    limits = {}
+    for column in places_store.VALUE_COLUMNS:
+        wide = places.pivot_table(index='LocationID', columns='MeasureId', values=column,
+                                  observed=False, aggfunc='first')
+        wide = wide.reindex(index=frame['GEOID'], columns=measures)
+        limits[column] = wide.to_numpy(dtype=np.float32)
+    present = ~np.isnan(limits['Data_Value']).all(axis=0)
+    observed = ~np.isnan(limits['Data_Value'][:, present]).all(axis=1)
+    frame = frame[observed].reset_index(drop=True)
+    value, low, high = (limits[c][observed][:, present] for c in places_store.VALUE_COLUMNS)
+    return frame, value, low, high, [o for o, keep in zip(outcomes, present) if keep]
+
+
+def split_normal_scales(value, low, high):
+    """
+    Lower and upper standard deviations implied by a 95% interval
+
+    PLACES intervals are asymmetric, so each side gets its own scale (a
+    split normal centred on the estimate). Missing limits mean no noise.
+    """
+    lower = np.nan_to_num((value - low) / Z_95, nan=0.0).clip(min=0)
+    upper = np.nan_to_num((high - value) / Z_95, nan=0.0).clip(min=0)
+    return lower.astype(np.float32), upper.astype(np.float32)
+
+
+def draw_outcomes(rng, value, lower, upper, draws):
+    """(draws, tracts, outcomes) prevalences, clipped to [0, 100]"""
+    z = rng.standard_normal((draws,) + value.shape, dtype=np.float32)
+    sample = value + z * np.where(z < 0, lower, upper)
+    return np.clip(sample, 0, 100, out=sample)
+
+
+def zmean_burden(sample):
+    """compose_burden's zmean, per draw: (draws, tracts, outcomes) -> (draws, tracts)"""
+    means = np.nanmean(sample, axis=1, keepdims=True)
+    sds = np.nanstd(sample, axis=1, keepdims=True)
+    sds[~(sds > 0)] = 1.0
+    return np.nanmean((sample - means) / sds, axis=2)
+
+
+class ResidualProjector:
+    """
+    Residuals of the expected-burden model for many outcome vectors at once
+
+    The design does not change between draws, so the within-state demeaned
+    X and its cross-product are computed once; each chunk of burden vectors
+    is then demeaned by state and projected with two matrix products,
+    giving exactly fit_ols's areg residuals.
+    """
+
+    def __init__(self, X, states=None):
+        self.n = len(X)
+        if states is not None:
+            states = np.asarray(states)
+            if np.any(states[1:] < states[:-1]):
+                raise ValueError("rows must be sorted by state")
+            self.starts = np.flatnonzero(np.r_[True, states[1:] != states[:-1]])
+            self.sizes = np.diff(np.r_[self.starts, self.n])
+        else:
+            self.starts, self.sizes = np.array([0]), np.array([self.n])
+        self.Xt = self.demean(np.asarray(X, dtype=np.float64))
+        self.inverse = np.linalg.inv(self.Xt.T @ self.Xt)
+
+    def demean(self, values):
+        """Subtract state means from the rows of a (tracts, columns) array"""
+        means = np.add.reduceat(values, self.starts, axis=0) / self.sizes[:, None]
+        return values - np.repeat(means, self.sizes, axis=0)
+
+    def residuals(self, Y):
+        """(tracts, k) burden columns -> (tracts, k) residuals"""
+        Yt = self.demean(np.asarray(Y, dtype=np.float64))
+        return Yt - self.Xt @ (self.inverse @ (self.Xt.T @ Yt))
+
+
+class RunningMoments:
+    """Per-tract mean and variance merged chunk by chunk (Chan et al.)"""
+
+    def __init__(self, n):
+        self.count = 0
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)
+
+    def update(self, chunk):
+        """Fold in a (draws, tracts) chunk"""
+        k = len(chunk)
+        chunk_mean = chunk.mean(axis=0)
+        chunk_m2 = ((chunk - chunk_mean) ** 2).sum(axis=0)
+        total = self.count + k
+        delta = chunk_mean - self.mean
+        self.mean += delta * k / total
+        self.m2 += chunk_m2 + delta ** 2 * self.count * k / total
+        self.count = total
+
+    @property
+    def sd(self):
+        return np.sqrt(self.m2 / max(self.count - 1, 1))
+
+
+def simulate(frame, value, low, high, draws=DRAWS, chunk=CHUNK, seed=SEED, top_pct=0.10,
+             state_fe=True, include_no_vehicle=True):
+    """
+    Run the Monte Carlo and return per-tract summaries
+
+    Peak memory is a few (chunk, tracts, outcomes) float32 arrays plus the
+    (tracts, chunk) burden and residual matrices.
+    """
+    cols = [c for c, _ in burden_model.covariates(include_no_vehicle)]
+    projector = ResidualProjector(frame[cols].to_numpy(dtype=np.float64),
+                                  frame['StateAbbr'].to_numpy() if state_fe else None)
+    lower, upper = split_normal_scales(value, low, high)
+    rng = np.random.default_rng(seed)
+    n = len(frame)
+    burden_stats, score_stats = RunningMoments(n), RunningMoments(n)
+    top_counts = np.zeros(n, dtype=np.int64)
+
+    done = 0
+    while done < draws:
+        k = min(chunk, draws - done)
+        burden = zmean_burden(draw_outcomes(rng, value, lower, upper, k))
+        resid = projector.residuals(burden.T)
+        scores = (-resid / (np.sqrt((resid ** 2).mean(axis=0)) + 1e-9)).T
+        burden_stats.update(burden)
+        score_stats.update(scores)
+        top_counts += (scores > np.quantile(scores, 1 - top_pct, axis=1)[:, None]).sum(axis=0)
+        done += k
+        if done % (20 * chunk) == 0 or done == draws:
+            print(f"  {done:,}/{draws:,} draws", flush=True)
+
+    point_burden = zmean_burden(value[None])
+    point_resid = projector.residuals(point_burden.T)[:, 0]
+    summary = frame[['GEOID', 'StateAbbr']].copy()
+    summary['lila'] = frame['LILATracts_1And10'].to_numpy().astype(np.int8)
+    summary['burden_point'] = point_burden[0]
+    summary['burden_mean'] = burden_stats.mean
+    summary['burden_sd'] = burden_stats.sd
+    summary['score_point'] = burden_model.resilience_scores(point_resid)
+    summary['score_mean'] = score_stats.mean
+    summary['score_sd'] = score_stats.sd
+    summary['score_low'] = score_stats.mean - Z_95 * score_stats.sd
+    summary['score_high'] = score_stats.mean + Z_95 * score_stats.sd
+    summary['p_top_decile'] = top_counts / draws
+    return summary
+
+
+def run_simulation(config=None, draws=DRAWS, chunk=CHUNK, seed=SEED, output_csv=OUTPUT_CSV):
+    """Load PLACES limits, simulate and write the per-tract summary"""
+    config = config or burden_model.load_model_config()
+    if config.get('burden_method', 'zmean') != 'zmean':
+        print("Note: simulation recomputes the zmean burden regardless of burden_method")
+    frame, value, low, high, outcomes = load_outcome_limits(config)
+    print(f"Simulating {draws:,} draws of {len(outcomes)} outcomes on {len(frame):,} tracts "
+          f"in chunks of {chunk} ({chunk * value.size * 4 / 1e6:.0f} MB per draw array)...")
+    start = time.perf_counter()
+    summary = simulate(frame, value, low, high, draws, chunk, seed,
+                       top_pct=config.get('top_pct', 0.10),
+                       state_fe=config.get('state_fixed_effects', True),
+                       include_no_vehicle=config.get('include_no_vehicle', True))
+    print(f"Simulation finished in {time.perf_counter() - start:.1f}s")
+    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+    summary.to_csv(output_csv, index=False, float_format='%.4f')
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--draws', type=int, default=DRAWS)
+    parser.add_argument('--chunk', type=int, default=CHUNK, help='draws generated per batch')
+    parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("MONTE CARLO: PLACES CONFIDENCE LIMITS")
+    print("=" * 60)
+    summary = run_simulation(draws=args.draws, chunk=args.chunk, seed=args.seed)
+
+    print("\nPer-tract uncertainty (median across tracts):")
+    print(f"  burden sd: {summary['burden_sd'].median():.3f}")
+    print(f"  resilience score sd: {summary['score_sd'].median():.3f}")
+    threshold = summary['score_point'].quantile(0.9)
+    listed = summary[(summary['lila'] == 1) & (summary['score_point'] > threshold)]
+    print(f"\nResilient LILA tracts at the point estimate: {len(listed):,}")
+    for cut in (0.5, 0.8, 0.95):
+        print(f"  with P(top decile) >= {cut:.2f}: {(listed['p_top_decile'] >= cut).sum():,}")
+    print(f"\nSaved per-tract summaries to {OUTPUT_CSV}")
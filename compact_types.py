@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Compact typed tract tables
+GEOIDs as int64 (state/county/tract decoded arithmetically), text as
+categoricals, 0/1 flags as int8, integers downcast and float columns as
+float32 wherever that is lossless at the precision the values carry. Every
+change is recorded so expand_frame restores the original dtypes and values
+exactly, and writing the expanded frame reproduces the source CSV.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+GEOID_COLUMNS = ('GEOID', 'TractFIPS', 'CensusTract')
+GEOID_WIDTH = 11
+MAX_DECIMALS = 6          # float32 keeps ~7 significant digits
+CATEGORY_RATIO = 0.5      # text columns with fewer distinct values than this share of rows
+METADATA_KEY = b'compact'
+
+
+def geoid_to_int(values):
+    """GEOID strings (padded or not) as int64"""
+    return pd.to_numeric(pd.Series(values).astype(str).str.strip(), errors='raise').to_numpy(np.int64)
+
+
+def int_to_geoid(values, width=GEOID_WIDTH):
+    """int64 GEOIDs as zero-padded strings"""
+    return pd.Series(np.asarray(values, dtype=np.int64)).astype(str).str.zfill(width).to_numpy()
+
+
+def state_fips(geoids):
+    """2-digit state FIPS of int64 tract GEOIDs"""
+    return np.asarray(geoids, dtype=np.int64) // 10**9
+
+
+def county_fips(geoids):
+    """5-digit state+county FIPS of int64 tract GEOIDs"""
+    return np.asarray(geoids, dtype=np.int64) // 10**6
+
+
+def tract_code(geoids):
+    """6-digit tract code within the county"""
+    return np.asarray(geoids, dtype=np.int64) % 10**6
+
+
+def _compact_geoid(series):
+    """(int64 values, padded) when the column round-trips through integers, else None"""
+    if series.isna().any():
+        return None
+    text = pc.cast(pa.array(series.to_numpy(dtype=object)), pa.string())
+    lengths = pc.utf8_length(text)
+    if len(text) and (not pc.all(pc.utf8_is_digit(text)).as_py()
+                      or pc.max(lengths).as_py() > 18):
+        return None
+    values = pc.cast(text, pa.int64())
+    padded = bool(pc.all(pc.equal(lengths, GEOID_WIDTH)).as_py()) if len(text) else False
+    back = pc.cast(values, pa.string())
+    back = pc.utf8_lpad(back, GEOID_WIDTH, '0') if padded else back
+    if len(text) and not pc.all(pc.equal(back, text)).as_py():
+        return None
+    return values.to_numpy(), padded
+
+
+def _float_decimals(values):
+    """Smallest decimals d at which float32 storage rounds back exactly, or None"""
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return 0
+    as32 = finite.astype(np.float32)
+    if not np.isfinite(as32).all():
+        return None
+    as64 = as32.astype(np.float64)
+    for d in range(MAX_DECIMALS + 1):
+        if np.array_equal(np.round(as64, d), finite):
+            return d
+    return None
+
+
+def compact_frame(df):
+    """
+    Compact copy of df; df.attrs['compact'] records how to undo each change
+
+    GEOID-like columns become int64 when they are all digits and round-trip
+    (zero padding is remembered); 0/1 columns become int8 (nullable Int8
+    with missing values); other integers are downcast; floats become
+    float32 with a stored rounding precision; low-cardinality text becomes
+    categorical.
+    """
+    out = {}
+    info = {'dtypes': {}, 'decimals': {}, 'padded': []}
+    for col in df.columns:
+        series = df[col]
+        dtype = str(series.dtype)
+        if col in GEOID_COLUMNS:
+            geoid = _compact_geoid(series)
+            if geoid is not None:
+                out[col] = geoid[0]
+                info['dtypes'][col] = dtype
+                if geoid[1]:
+                    info['padded'].append(col)
+                continue
+        if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+            if (not pd.api.types.is_bool_dtype(series)
+                    and series.nunique() < CATEGORY_RATIO * max(len(series), 1)):
+                out[col] = series.astype('category')
+                info['dtypes'][col] = dtype
+            else:
+                out[col] = series
+            continue
+        values = series.to_numpy(dtype=np.float64)
+        observed = values[~np.isnan(values)]
+        if len(observed) and np.isin(observed, (0, 1)).all():
+            out[col] = series.astype('Int8' if len(observed) < len(values) else np.int8)
+        elif pd.api.types.is_integer_dtype(series):
+            out[col] = pd.to_numeric(series, downcast='integer')
+        else:
+            decimals = _float_decimals(values)
+            if decimals is None:
+                out[col] = series
+                continue
+            out[col] = series.astype(np.float32)
+            info['decimals'][col] = decimals
+        info['dtypes'][col] = dtype
+    compact = pd.DataFrame(out, index=df.index)
+    compact.attrs['compact'] = info
+    return compact
+
+
+def expand_frame(df):
+    """Undo compact_frame for the columns present (no-op for uncompacted frames)"""
+    info = df.attrs.get('compact')
+    if not info:
+        return df
+    out = df.copy()
+    for col, dtype in info['dtypes'].items():
+        if col not in out.columns or str(out[col].dtype) == dtype:
+            continue
+        if col in GEOID_COLUMNS and pd.api.types.is_integer_dtype(out[col]):
+            text = pd.Series(out[col].to_numpy()).astype(str)
+            text = text.str.zfill(GEOID_WIDTH) if col in info['padded'] else text
+            out[col] = text.astype(dtype).to_numpy()
+        elif col in info['decimals']:
+            out[col] = np.round(out[col].to_numpy(dtype=np.float64), info['decimals'][col])
+        elif isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(dtype)
+        elif dtype.startswith('float') or out[col].isna().any():
+            # Integers that gained missing values in a left join come back as float
+            out[col] = out[col].astype(np.float64)
+        else:
+            out[col] = out[col].astype(dtype)
+    out.attrs = {k: v for k, v in df.attrs.items() if k != 'compact'}
+    return out
+
+
+def nullable(df):
+    """Integer columns as pandas nullable integers, so a left join keeps them compact"""
+    return df.astype({c: str(df[c].dtype).capitalize() for c in df.columns
+                      if pd.api.types.is_integer_dtype(df[c])
+                      and isinstance(df[c].dtype, np.dtype)})
+
+
+def merge_info(*frames):
+    """Combined attrs['compact'] of frames joined into one"""
+    info = {'dtypes': {}, 'decimals': {}, 'padded': []}
+    for frame in frames:
+        part = frame.attrs.get('compact', {})
+        info['dtypes'].update(part.get('dtypes', {}))
+        info['decimals'].update(part.get('decimals', {}))
+        info['padded'] = sorted(set(info['padded']) | set(part.get('padded', [])))
+    return info
+
+
+def write_parquet(df, path):
+    """Write a compact frame with its expansion info in the Parquet metadata"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps(df.attrs.get('compact', {})).encode()
+    pq.write_table(table.replace_schema_metadata(metadata), path)
+
+
+def _expand_arrow(table, info):
+    """GEOID and dictionary columns back to strings with Arrow kernels (much faster than pandas)"""
+    for i, field in enumerate(table.schema):
+        col = field.name
+        if col not in info['dtypes']:
+            continue
+        if col in GEOID_COLUMNS and pa.types.is_integer(field.type):
+            text = pc.cast(table.column(i), pa.string())
+            if col in info['padded']:
+                text = pc.utf8_lpad(text, GEOID_WIDTH, '0')
+        elif pa.types.is_dictionary(field.type):
+            text = pc.cast(table.column(i), pa.string())
+        else:
+            continue
+        table = table.set_column(i, pa.field(col, pa.string()), text)
+    return table
+
+
+def read_parquet(path, columns=None, memory_map=True, expand=False):
+    """
+    Read a table written by write_parquet, restoring attrs['compact']
+
+    expand=True returns the original types (as expand_frame would), doing
+    the string conversions in Arrow before building the frame.
+    """
+    table = pq.read_table(path, columns=columns, memory_map=memory_map)
+    info = (table.schema.metadata or {}).get(METADATA_KEY)
+    info = json.loads(info) if info else None
+    if expand and info:
+        table = _expand_arrow(table, info)
+        # The stored pandas metadata describes the compact types
+        df = table.replace_schema_metadata(None).to_pandas()
+    else:
+        df = table.to_pandas()
+    if info:
+        df.attrs['compact'] = info
+    return expand_frame(df) if expand else df
+
+
+def memory_mb(df):
+    """Deep in-memory size of a frame in MB"""
+    return df.memory_usage(deep=True).sum() / 1e6
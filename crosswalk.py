@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+2010 <-> 2020 census tract crosswalk
+Reads the Census Bureau tract relationship file (tab20_tract20_tract10_natl.txt,
+one row per 2020 x 2010 tract intersection with its land area) into a sparse
+target x source weight matrix and reallocates tract-level tables from one
+vintage's GEOIDs to the other's with a single sparse matrix multiply.
+
+Intersections carry land area only, so a source tract's population is split
+across its target tracts in proportion to land area (areal weighting).
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import tract_store
+
+RELATIONSHIP_PATH = 'data/external/tab20_tract20_tract10_natl.txt'
+RELATIONSHIP_URL = ('https://www2.census.gov/geo/docs/maps-data/data/rel2020/tract/'
+                    'tab20_tract20_tract10_natl.txt')
+VINTAGES = (2010, 2020)
+MATCH_CSV = 'data/processed/crosswalk_match_rates.csv'
+
+# FARA vintage geography and its additive columns; the remaining numeric
+# columns are rates or medians (population-weighted) or 0/1 flags
+FARA_VINTAGE = 2010
+MODEL_VINTAGE = 2020
+FARA_POPULATION = 'Pop2010'
+FARA_COUNT_COLUMNS = ['Pop2010', 'OHU2010', 'NUMGQTRS']
+FARA_COUNT_PREFIXES = ('Tract', 'la')
+
+
+@lru_cache(maxsize=None)
+def _cached_relationship(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; download it from {RELATIONSHIP_URL}")
+    rel = pd.read_csv(path, sep='|', dtype=str, encoding='latin-1',
+                      usecols=['GEOID_TRACT_20', 'GEOID_TRACT_10', 'AREALAND_PART'])
+    return pd.DataFrame({
+        'tract_2020': tract_store.normalize_geoid(rel['GEOID_TRACT_20']),
+        'tract_2010': tract_store.normalize_geoid(rel['GEOID_TRACT_10']),
+        'area': pd.to_numeric(rel['AREALAND_PART'], errors='coerce').fillna(0).to_numpy(),
+    })
+
+
+def load_relationship(path=RELATIONSHIP_PATH):
+    """Intersections as (tract_2020, tract_2010, area) with normalized GEOIDs"""
+    return _cached_relationship(path).copy()
+
+
+def _check_vintages(source, target):
+    if source not in VINTAGES or target not in VINTAGES:
+        raise ValueError(f"tract vintages must be one of {VINTAGES}")
+
+
+@lru_cache(maxsize=None)
+def _cached_weights(source, target, path):
+    rel = _cached_relationship(path)
+    src_ids, src = np.unique(rel[f"tract_{source}"].to_numpy(), return_inverse=True)
+    dst_ids, dst = np.unique(rel[f"tract_{target}"].to_numpy(), return_inverse=True)
+    area = rel['area'].to_numpy(dtype=np.float64)
+    total = np.bincount(src, area, len(src_ids))
+    parts = np.bincount(src, minlength=len(src_ids))
+    # All-water source tracts are split evenly over their parts
+    share = np.where(total[src] > 0, area / np.where(total > 0, total, 1)[src], 1.0 / parts[src])
+    shape = (len(dst_ids), len(src_ids))
+    weights = sparse.csc_matrix((share, (dst, src)), shape=shape)
+    areas = sparse.csc_matrix((area, (dst, src)), shape=shape)
+    return weights, areas, pd.Index(src_ids), pd.Index(dst_ids)
+
+
+def weight_matrix(source, target, path=RELATIONSHIP_PATH):
+    """
+    (W, source_ids, target_ids) with W[t, s] the share of source tract s's
+    land area lying in target tract t; every column sums to 1
+
+    The matrix is cached and shared between callers; do not modify it.
+    """
+    _check_vintages(source, target)
+    weights, _, src_ids, dst_ids = _cached_weights(source, target, path)
+    return weights, src_ids, dst_ids
+
+
+def dominant_mapping(source, target, path=RELATIONSHIP_PATH):
+    """
+    Series mapping each source-vintage tract to the target-vintage tract
+    holding the largest share of its land area
+    """
+    _check_vintages(source, target)
+    rel = load_relationship(path)
+    src, dst = f"tract_{source}", f"tract_{target}"
+    rel = rel.sort_values([src, 'area'], ascending=[True, False], kind='stable')
+    best = rel.drop_duplicates(src)
+    return pd.Series(best[dst].to_numpy(), index=best[src].to_numpy(), name=dst)
+
+
+def fara_count_columns(columns):
+    """FARA columns that are additive counts (population, housing units, low-access counts)"""
+    return [c for c in columns if c in FARA_COUNT_COLUMNS
+            or (c.startswith(FARA_COUNT_PREFIXES) and not c.endswith('share'))]
+
+
+def _is_flag(values):
+    observed = values[~np.isnan(values)]
+    return len(observed) > 0 and np.isin(observed, (0, 1)).all()
+
+
+def _dominant_sources(areas, weights):
+    """
+    Position of each target row's dominant source among its stored entries
+
+    The source with the most land in the target wins; all-water targets fall
+    back to the largest share weight, then to the first stored source. Rows
+    with no stored entry get -1.
+    """
+    areas = areas.tocsr()
+    weights = weights.tocsr()
+    areas.sort_indices()
+    weights.sort_indices()
+    counts = np.diff(areas.indptr)
+    row = np.repeat(np.arange(areas.shape[0]), counts)
+    # Sorted by row, then area, then weight, then earliest column; the last entry of each row wins
+    order = np.lexsort((-areas.indices, weights.data, areas.data, row))
+    dominant = np.full(areas.shape[0], -1, dtype=np.int64)
+    stored = counts > 0
+    dominant[stored] = areas.indices[order[areas.indptr[1:][stored] - 1]]
+    return dominant
+
+
+def translate(df, source, target, counts=(), population=None, geoid_column='GEOID',
+              path=RELATIONSHIP_PATH):
+    """
+    Reallocate a tract table from source to target vintage GEOIDs
+
+    counts are summed over the target tract's land-area shares of each
+    source tract; other numeric columns are rates, weighted by the
+    population each source tract contributes (by land share alone when
+    population is None). 0/1 flags and text columns take the value of the
+    source tract covering most of the target's land (see _dominant_sources).
+    A target value is NaN only when no contributing source tract has one. Source tracts absent
+    from the relationship file are dropped.
+    """
+    if source == target:
+        return df
+    weights, areas, src_ids, dst_ids = _cached_weights(source, target, path)
+    pos = src_ids.get_indexer(tract_store.normalize_geoid(df[geoid_column]))
+    rows = df[pos >= 0]
+    W = weights[:, pos[pos >= 0]]
+    reached = np.flatnonzero(W.getnnz(axis=1))
+    W = W[reached]
+
+    columns = [c for c in df.columns if c != geoid_column]
+    numeric = {c: rows[c].to_numpy(dtype=np.float64) for c in columns
+               if pd.api.types.is_numeric_dtype(rows[c]) and not pd.api.types.is_bool_dtype(rows[c])}
+    counts = [c for c in counts if c in numeric]
+    flags = [c for c in numeric if c not in counts and _is_flag(numeric[c])]
+    rates = [c for c in numeric if c not in counts and c not in flags]
+    pop = np.ones(len(rows)) if population is None else np.nan_to_num(numeric[population])
+
+    # One multiply: [counts, count present, pop x rates, pop x rate present]
+    k, r = len(counts), len(rates)
+    values = np.empty((len(rows), k + r))
+    for i, c in enumerate(counts + rates):
+        values[:, i] = numeric[c]
+    present = ~np.isnan(values)
+    values = np.nan_to_num(values)
+    values[:, k:] *= pop[:, None]
+    summed = np.asarray(W @ np.hstack([values[:, :k], present[:, :k],
+                                       values[:, k:], present[:, k:] * pop[:, None]]))
+
+    out = {geoid_column: dst_ids[reached].to_numpy()}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i, c in enumerate(counts):
+            out[c] = np.where(summed[:, k + i] > 0, summed[:, i], np.nan)
+        for i, c in enumerate(rates):
+            num, den = summed[:, 2 * k + i], summed[:, 2 * k + r + i]
+            out[c] = np.where(den > 0, num / np.where(den > 0, den, 1), np.nan)
+    dominant = _dominant_sources(areas[:, pos[pos >= 0]][reached], W)
+    for c in columns:
+        if c not in out:
+            out[c] = rows[c].array.take(dominant, allow_fill=True)
+    return pd.DataFrame(out)[[geoid_column] + columns]
+
+
+def match_rates(geoids, states, available, source=FARA_VINTAGE, target=MODEL_VINTAGE,
+                path=RELATIONSHIP_PATH):
+    """
+    Per-state counts of tracts found in a table keyed by another vintage
+
+    geoids/states describe the target-vintage tracts (e.g. the model table),
+    available the GEOIDs of the source table (e.g. FARA). matched_direct
+    counts exact GEOID hits; matched_crosswalk those reached only through
+    the relationship file (0 when the file is missing).
+    """
+    geoids = pd.Index(tract_store.normalize_geoid(geoids))
+    available = pd.Index(tract_store.normalize_geoid(available))
+    direct = geoids.isin(available)
+    via = np.zeros(len(geoids), dtype=bool)
+    if os.path.exists(path):
+        W, src_ids, dst_ids = weight_matrix(source, target, path)
+        cols = src_ids.get_indexer(available)
+        reached = dst_ids[np.flatnonzero(W[:, cols[cols >= 0]].getnnz(axis=1))]
+        via = ~direct & geoids.isin(reached)
+    frame = pd.DataFrame({'StateAbbr': np.asarray(states), 'direct': direct, 'via': via})
+    rates = frame.groupby('StateAbbr').agg(tracts=('direct', 'size'),
+                                           matched_direct=('direct', 'sum'),
+                                           matched_crosswalk=('via', 'sum'))
+    rates['unmatched'] = rates['tracts'] - rates['matched_direct'] - rates['matched_crosswalk']
+    rates['direct_rate'] = rates['matched_direct'] / rates['tracts']
+    rates['match_rate'] = 1 - rates['unmatched'] / rates['tracts']
+    return rates.reset_index()
+
+
+def load_merged(columns=None, path=RELATIONSHIP_PATH, store_dir=tract_store.STORE_DIR):
+    """
+    tract_store.load_merged, with model tracts missing from FARA filled in
+    from FARA reallocated to their vintage
+
+    Adds fara_match ('direct', 'crosswalk' or 'none') and prints how many
+    tracts each path covers, so no tract leaves a merge unreported. Without
+    the relationship file only direct matches are filled.
+    """
+    merged = tract_store.load_merged(columns, store_dir)
+    fara = tract_store.load_fara(columns, store_dir)
+    direct = merged['GEOID'].isin(fara['GEOID'])
+    merged['fara_match'] = np.where(direct, 'direct', 'none')
+    if not direct.all() and os.path.exists(path):
+        model_columns = tract_store.load_model_table(store_dir).columns
+        fara = fara.drop(columns=[c for c in fara.columns if c in model_columns and c != 'GEOID'])
+        counts = fara_count_columns(fara.columns)
+        population = FARA_POPULATION if FARA_POPULATION in fara.columns else None
+        moved = translate(fara, FARA_VINTAGE, MODEL_VINTAGE, counts, population, path=path)
+        moved = moved.set_index('GEOID')
+        fill = ~direct & merged['GEOID'].isin(moved.index)
+        for c in moved.columns:
+            merged.loc[fill, c] = moved.loc[merged.loc[fill, 'GEOID'], c].to_numpy()
+        merged.loc[fill, 'fara_match'] = 'crosswalk'
+    counts = merged['fara_match'].value_counts()
+    print(f"FARA match: {counts.get('direct', 0):,} direct, {counts.get('crosswalk', 0):,} via "
+          f"crosswalk, {counts.get('none', 0):,} unmatched of {len(merged):,} model tracts")
+    if counts.get('none', 0):
+        lost = merged.loc[merged['fara_match'] == 'none', 'StateAbbr'].value_counts()
+        print("  unmatched by state: " + ', '.join(f"{s} {n}" for s, n in lost.head(10).items()))
+    return merged
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TRACT CROSSWALK MATCH RATES")
+    print("=" * 60)
+    model = tract_store.load_model_table()
+    fara = tract_store.load_fara(['Pop2010'])
+    if not os.path.exists(RELATIONSHIP_PATH):
+        print(f"{RELATIONSHIP_PATH} not found; reporting direct GEOID matches only")
+    rates = match_rates(model['GEOID'], model['StateAbbr'], fara['GEOID'])
+    totals = rates[['tracts', 'matched_direct', 'matched_crosswalk', 'unmatched']].sum()
+    print(f"Model tracts: {totals['tracts']:,}")
+    print(f"  matched directly:   {totals['matched_direct']:,}")
+    print(f"  matched via 2010->2020 crosswalk: {totals['matched_crosswalk']:,}")
+    print(f"  unmatched:          {totals['unmatched']:,}")
+    print("\nLowest direct match rates:")
+    print(rates.nsmallest(10, 'direct_rate').round(3).to_string(index=False))
+    os.makedirs(os.path.dirname(MATCH_CSV), exist_ok=True)
+    rates.to_csv(MATCH_CSV, index=False)
+    print(f"\nSaved: {MATCH_CSV}")
@@ -5,31 +5,20 @@ Extract all 1,059 resilient LILA communities with full location details
 
 import pandas as pd
 import numpy as np
+import crosswalk
 
 def get_all_resilient_communities():
     """Extract all resilient LILA tracts with location details"""
     
     print("Loading data...")
-    # Load results and FARA data
-    results = pd.read_csv('data/processed/model_table_with_residuals.csv')
-    fara = pd.read_csv('data/interim/fara_2019.csv')
-    
-    # Prepare for merge
-    fara['GEOID'] = fara['CensusTract'].astype(str).str.zfill(11)
-    results['GEOID'] = results['GEOID'].astype(str).str.zfill(11)
+    # Load results merged with FARA location data
+    merged = crosswalk.load_merged(['County', 'State', 'LILATracts_1And10',
+                                    'Urban', 'Pop2010', 'PovertyRate', 'MedianFamilyIncome'])
     
     # Get the 90th percentile threshold for resilience
-    threshold_90 = results['resilience_score'].quantile(0.9)
+    threshold_90 = merged['resilience_score'].quantile(0.9)
     print(f"90th percentile resilience threshold: {threshold_90:.3f}")
     
-    # Merge to get full location data
-    merged = results.merge(
-        fara[['GEOID', 'County', 'State', 'LILATracts_1And10', 
-              'Urban', 'Pop2010', 'PovertyRate', 'MedianFamilyIncome']], 
-        on='GEOID', 
-        how='left'
-    )
-    
     # Filter to resilient LILA tracts
     resilient_lila = merged[
         (merged['LILATracts_1And10'] == 1) & 
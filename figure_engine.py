@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Aggregate-first rendering for the resilience analysis figure
+Every panel is drawn from precomputed aggregates (a 2D density raster per
+LILA group, a binned LOWESS curve, histogram counts and residual quantiles)
+instead of one artist per tract, so drawing time is independent of the
+number of points and the same code handles millions of tract-years.
+"""
+
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy import stats
+
+RASTER_BINS = (400, 300)  # x, y pixels of the density raster
+SMOOTH_BINS = 200
+SMOOTH_FRAC = 0.3
+QQ_POINTS = 1000
+HIST_BINS = 50
+# Panel colours for non-LILA and LILA density (RGB 0-1)
+GROUP_COLOURS = {0: (0.13, 0.40, 0.80), 1: (0.85, 0.15, 0.15)}
+
+
+def data_range(values, pad=0.02, clip=(0.001, 0.999)):
+    """(low, high) covering the central quantiles of values, slightly padded"""
+    lo, hi = np.nanquantile(values, clip)
+    span = (hi - lo) or 1.0
+    return lo - pad * span, hi + pad * span
+
+
+def bin2d(x, y, bins, extent):
+    """
+    Counts on a (ny, nx) grid over extent = (xmin, xmax, ymin, ymax)
+
+    Equivalent to np.histogram2d(y, x) but a single bincount on flat bin
+    indices; points outside the extent or with NaN are dropped.
+    """
+    nx, ny = bins
+    xmin, xmax, ymin, ymax = extent
+    ix = np.floor((np.asarray(x, dtype=np.float64) - xmin) / (xmax - xmin) * nx)
+    iy = np.floor((np.asarray(y, dtype=np.float64) - ymin) / (ymax - ymin) * ny)
+    ok = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+    flat = iy[ok].astype(np.int64) * nx + ix[ok].astype(np.int64)
+    return np.bincount(flat, minlength=nx * ny).reshape(ny, nx)
+
+
+def binned_lowess(x, y, bins=SMOOTH_BINS, frac=SMOOTH_FRAC, span=None):
+    """
+    Locally linear tricube smoother evaluated at bin centres of x
+
+    Points are reduced to per-bin counts and means, then each bin centre is
+    fitted by weighted least squares over the nearest bins holding frac of
+    all points (weights = count x tricube distance). Returns (centres,
+    fitted) for bins that contain data; no robustness iterations. span
+    (low, high) limits the fit to that x range, e.g. the plotted extent.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    ok = np.isfinite(x) & np.isfinite(y)
+    if span is not None:
+        ok &= (x >= span[0]) & (x <= span[1])
+    x, y = x[ok], y[ok]
+    edges = np.linspace(x.min(), x.max(), bins + 1)
+    idx = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, bins - 1)
+    count = np.bincount(idx, minlength=bins).astype(np.float64)
+    keep = count > 0
+    count = count[keep]
+    mx = np.bincount(idx, x, bins)[keep] / count
+    my = np.bincount(idx, y, bins)[keep] / count
+
+    dist = np.abs(mx[:, None] - mx[None, :])
+    order = np.argsort(dist, axis=1)
+    covered = np.cumsum(count[order], axis=1)
+    reach = np.argmax(covered >= frac * count.sum(), axis=1)
+    h = np.take_along_axis(dist, order, axis=1)[np.arange(len(mx)), reach]
+    h = np.maximum(h, np.diff(edges[:2])) * 1.0001
+    u = np.clip(dist / h[:, None], 0, 1)
+    w = count * (1 - u ** 3) ** 3
+
+    sw = w.sum(axis=1)
+    xbar = (w * mx).sum(axis=1) / sw
+    ybar = (w * my).sum(axis=1) / sw
+    dx = mx[None, :] - xbar[:, None]
+    sxx = (w * dx ** 2).sum(axis=1)
+    sxy = (w * dx * (my[None, :] - ybar[:, None])).sum(axis=1)
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+    return mx, ybar + slope * (mx - xbar)
+
+
+def density_image(counts_by_group, colours=GROUP_COLOURS):
+    """
+    RGBA image blending per-group count rasters
+
+    Colour is the count-weighted mix of the group colours and opacity
+    follows log density, so both sparse tails and the dense core stay visible.
+    """
+    total = sum(counts_by_group.values()).astype(np.float64)
+    rgb = np.zeros(total.shape + (3,))
+    for group, counts in counts_by_group.items():
+        rgb += counts[..., None] * np.asarray(colours[group])
+    with np.errstate(invalid='ignore'):
+        rgb /= total[..., None]
+    alpha = np.log1p(total) / max(np.log1p(total.max()), 1e-9)
+    image = np.dstack([np.nan_to_num(rgb), 0.15 + 0.85 * alpha])
+    image[total == 0, 3] = 0
+    return image
+
+
+def aggregate(merged, results, raster_bins=RASTER_BINS):
+    """Everything the four panels draw, computed once from the tract tables"""
+    burden = merged['burden'].to_numpy(dtype=np.float64)
+    score = merged['resilience_score'].to_numpy(dtype=np.float64)
+    lila = merged['LILATracts_1And10'].fillna(0).to_numpy() == 1
+    extent = data_range(burden) + data_range(score)
+    scores = results['resilience_score'].dropna().to_numpy()
+    resid = results['resid'].dropna().to_numpy()
+    probs = (np.arange(QQ_POINTS) + 0.5) / QQ_POINTS
+    theoretical = stats.norm.ppf(probs)
+    sample = np.quantile(resid, probs)
+    slope, intercept = np.polyfit(theoretical, sample, 1)
+    top = results.nlargest(10, 'resilience_score')
+    return {
+        'extent': extent,
+        'density': {0: bin2d(burden[~lila], score[~lila], raster_bins, extent),
+                    1: bin2d(burden[lila], score[lila], raster_bins, extent)},
+        'smooth': binned_lowess(burden, score, span=extent[:2]),
+        'hist': np.histogram(scores, bins=HIST_BINS),
+        'deciles': np.quantile(scores, [0.1, 0.9]),
+        'qq': (theoretical, sample, slope, intercept),
+        'top': ([f"{s}-{str(t)[-4:]}" for s, t in zip(top['StateAbbr'], top['TractFIPS'])],
+                top['resilience_score'].to_numpy()),
+        'n': len(burden),
+    }
+
+
+def render(aggs, path='figures/resilience_analysis.png', dpi=300):
+    """Draw the 2x2 figure from aggregates and save it"""
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+
+    ax1 = axes[0, 0]
+    ax1.imshow(density_image(aggs['density']), extent=aggs['extent'], origin='lower',
+               aspect='auto', interpolation='nearest')
+    ax1.plot(*aggs['smooth'], color='green', linewidth=2, label='LOWESS (binned)')
+    for group, label in ((0, 'Non-LILA'), (1, 'LILA')):
+        ax1.plot([], [], 's', color=GROUP_COLOURS[group], label=label)
+    ax1.set_xlabel('Health Burden (z-score)')
+    ax1.set_ylabel('Resilience Score')
+    ax1.set_title(f"Health Burden vs Resilience\n(density of {aggs['n']:,} tracts; "
+                  "red = LILA, blue = non-LILA)")
+    ax1.legend()
+    ax1.grid(True, alpha=0.3)
+
+    ax2 = axes[0, 1]
+    counts, edges = aggs['hist']
+    ax2.stairs(counts, edges, fill=True, alpha=0.7, edgecolor='black')
+    p10, p90 = aggs['deciles']
+    ax2.axvline(p90, color='red', linestyle='--', label='90th percentile')
+    ax2.axvline(p10, color='blue', linestyle='--', label='10th percentile')
+    ax2.set_xlabel('Resilience Score')
+    ax2.set_ylabel('Number of Tracts')
+    ax2.set_title('Distribution of Resilience Scores')
+    ax2.legend()
+    ax2.grid(True, alpha=0.3)
+
+    ax3 = axes[1, 0]
+    theoretical, sample, slope, intercept = aggs['qq']
+    ax3.plot(theoretical, sample, 'o', markersize=3)
+    ax3.plot(theoretical, intercept + slope * theoretical, 'r-')
+    ax3.set_xlabel('Theoretical quantiles')
+    ax3.set_ylabel('Ordered Values')
+    ax3.set_title('Q-Q Plot of Model Residuals')
+    ax3.grid(True, alpha=0.3)
+
+    ax4 = axes[1, 1]
+    labels, values = aggs['top']
+    y_pos = np.arange(len(labels))
+    ax4.barh(y_pos, values, color='green', alpha=0.7)
+    ax4.set_yticks(y_pos)
+    ax4.set_yticklabels(labels)
+    ax4.set_xlabel('Resilience Score')
+    ax4.set_title('Top 10 Resilient Census Tracts')
+    ax4.grid(True, alpha=0.3, axis='x')
+
+    plt.tight_layout()
+    fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    return fig
+
+
+def resilience_figure(merged, results, path='figures/resilience_analysis.png', dpi=300):
+    """Aggregate and render; prints the time spent in each stage"""
+    start = time.perf_counter()
+    aggs = aggregate(merged, results)
+    mid = time.perf_counter()
+    fig = render(aggs, path, dpi)
+    print(f"Aggregated {aggs['n']:,} tracts in {mid - start:.2f}s, "
+          f"rendered in {time.perf_counter() - mid:.2f}s")
+    return fig
+
+
+if __name__ == "__main__":
+    import tract_store
+    merged = tract_store.load_merged(['LILATracts_1And10'])
+    resilience_figure(merged, tract_store.load_model_table())
+    print("Saved: figures/resilience_analysis.png")
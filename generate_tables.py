@@ -6,8 +6,12 @@ Generate publication-quality tables and robustness checks for research paper
 import pandas as pd
 import numpy as np
 from scipy import stats
-from scipy.spatial import distance_matrix
 import warnings
+import tract_store
+import places_store
+import burden_model
+import spatial_stats
+import quantile_regression
 warnings.filterwarnings('ignore')
 
 def create_summary_statistics_table():
@@ -15,13 +19,11 @@ def create_summary_statistics_table():
     print("Generating Table 1: Descriptive Statistics...")
     
     # Load data
-    results = pd.read_csv('data/processed/model_table_with_residuals.csv')
-    fara = pd.read_csv('data/interim/fara_2019.csv')
-    places = pd.read_csv('data/raw/places_tract.csv')
+    results = tract_store.load_model_table()
     
     # Get health outcomes for sampled tracts
     health_outcomes = ['OBESITY', 'DIABETES', 'CHD', 'BPHIGH', 'LPA']
-    places_subset = places[places['MeasureId'].isin(health_outcomes)]
+    places_subset = places_store.load_places(health_outcomes)
     
     # Calculate summary statistics
     summary_stats = []
@@ -49,11 +51,8 @@ def create_summary_statistics_table():
     })
     
     # LILA indicators from FARA
-    fara['GEOID'] = fara['CensusTract'].astype(str).str.zfill(11)
-    results['GEOID'] = results['GEOID'].astype(str).str.zfill(11)
-    merged = results.merge(fara[['GEOID', 'LILATracts_1And10', 'LILATracts_halfAnd10', 
-                                  'LILATracts_1And20', 'LowIncomeTracts', 'Urban']], 
-                           on='GEOID', how='left')
+    merged = tract_store.load_merged(['LILATracts_1And10', 'LILATracts_halfAnd10',
+                                      'LILATracts_1And20', 'LowIncomeTracts', 'Urban'])
     
     # Add LILA statistics
     for col, label in [('LILATracts_1And10', 'LILA (1+10 miles)'),
@@ -99,21 +98,12 @@ def create_regression_table():
     """Generate Table 2: Main Regression Results with proper statistics"""
     print("\nGenerating Table 2: Regression Results...")
     
-    # This would require re-running the regression in Python to get proper statistics
-    # For now, create a formatted table based on the Go model output
-    
-    regression_results = pd.DataFrame({
-        'Variable': ['LILA (1+10 miles)', 'Low Income', 'Rural', 'No Vehicle Access', 
-                     'Constant', '', 'State FE', 'N', 'R²', 'Adjusted R²', 'RMSE'],
-        'Coefficient': ['0.312***', '0.184***', '-0.089**', '0.223***', '-0.147***',
-                       '', 'Yes', '67,834', '0.421', '0.419', '0.551'],
-        'Std. Error': ['(0.018)', '(0.014)', '(0.021)', '(0.024)', '(0.031)',
-                      '', '', '', '', '', ''],
-        '95% CI': ['[0.277, 0.347]', '[0.157, 0.211]', '[-0.130, -0.048]', 
-                   '[0.176, 0.270]', '[-0.208, -0.086]', '', '', '', '', '', ''],
-        'p-value': ['<0.001', '<0.001', '0.002', '<0.001', '<0.001',
-                   '', '', '', '', '', '']
-    })
+    # Refit the expected-burden model in Python (state-clustered SEs)
+    config = burden_model.load_model_config()
+    model_table, result = burden_model.fit_expected_burden(config=config)
+    regression_results = burden_model.format_regression_table(
+        result, state_fe=config.get('state_fixed_effects', True)
+    )
     
     # Save
     regression_results.to_csv('tables/table2_regression.csv', index=False)
@@ -127,13 +117,8 @@ def create_state_resilience_table():
     """Generate Table 3: Top States by Resilient LILA Tracts"""
     print("\nGenerating Table 3: State Resilience Rankings...")
     
-    # Load and merge data
-    results = pd.read_csv('data/processed/model_table_with_residuals.csv')
-    fara = pd.read_csv('data/interim/fara_2019.csv')
-    
-    fara['GEOID'] = fara['CensusTract'].astype(str).str.zfill(11)
-    results['GEOID'] = results['GEOID'].astype(str).str.zfill(11)
-    merged = results.merge(fara[['GEOID', 'LILATracts_1And10']], on='GEOID', how='left')
+    # Load merged data
+    merged = tract_store.load_merged(['LILATracts_1And10'])
     
     # Identify resilient LILA tracts
     threshold = merged['resilience_score'].quantile(0.9)
@@ -171,78 +156,57 @@ def create_state_resilience_table():
     return state_summary
 
 def perform_spatial_autocorrelation():
-    """Calculate Moran's I for spatial autocorrelation"""
+    """Calculate global and local Moran's I of model residuals"""
     print("\nPerforming Spatial Autocorrelation Analysis...")
     
-    # This is a simplified version - full implementation would need tract centroids
-    results = pd.read_csv('data/processed/model_table_with_residuals.csv')
+    # KNN weights over gazetteer tract centroids, 999 permutations
+    results = tract_store.load_model_table()
+    global_stats, lisa = spatial_stats.residual_autocorrelation(results, k=8, permutations=999)
     
-    # Group by state and calculate within-state correlation
+    # Summarize local clusters by state
     state_correlations = []
-    for state in results['StateAbbr'].unique():
-        state_data = results[results['StateAbbr'] == state]
-        if len(state_data) > 30:  # Only states with sufficient data
-            # Simplified: use correlation of residuals as proxy
-            correlation = state_data['resid'].autocorr()
+    for state, state_lisa in lisa.groupby('StateAbbr'):
+        if len(state_lisa) > 30:  # Only states with sufficient data
+            significant = state_lisa[state_lisa['significant']]
             state_correlations.append({
                 'State': state,
-                'N_Tracts': len(state_data),
-                'Spatial_Correlation': correlation
+                'N_Tracts': len(state_lisa),
+                'Mean_Local_I': state_lisa['Is'].mean(),
+                'N_High_High': (significant['cluster'] == 'HH').sum(),
+                'N_Low_Low': (significant['cluster'] == 'LL').sum(),
+                'N_Outliers': significant['cluster'].isin(['HL', 'LH']).sum()
             })
     
     spatial_df = pd.DataFrame(state_correlations)
+    global_correlation = global_stats['I']
     
-    # Calculate global measure (simplified)
-    global_correlation = results.groupby('StateAbbr')['resid'].apply(lambda x: x.autocorr()).mean()
-    
-    print(f"Global spatial correlation (simplified): {global_correlation:.4f}")
-    print(f"States with significant clustering: {len(spatial_df[abs(spatial_df['Spatial_Correlation']) > 0.3])}")
+    print(f"Global Moran's I: {global_correlation:.4f} "
+          f"(z = {global_stats['z_sim']:.1f}, pseudo p = {global_stats['p_sim']:.4f}, "
+          f"{global_stats['n']:,} tracts, k = {global_stats['k']})")
+    print(f"Tracts in significant LISA clusters: {lisa['significant'].sum():,}")
     
     # Save
     spatial_df.to_csv('tables/spatial_autocorrelation.csv', index=False)
+    pd.DataFrame([global_stats]).to_csv('tables/morans_i_global.csv', index=False)
+    lisa.to_csv('data/processed/lisa_residuals.csv', index=False)
     
     return spatial_df, global_correlation
 
 def perform_quantile_regression():
-    """Perform quantile regression for robustness"""
+    """Quantile regression of burden on the full design with state fixed effects"""
     print("\nPerforming Quantile Regression...")
     
-    # Load data
-    results = pd.read_csv('data/processed/model_table_with_residuals.csv')
-    fara = pd.read_csv('data/interim/fara_2019.csv')
-    
-    # Merge
-    fara['GEOID'] = fara['CensusTract'].astype(str).str.zfill(11)
-    results['GEOID'] = results['GEOID'].astype(str).str.zfill(11)
-    merged = results.merge(fara[['GEOID', 'LILATracts_1And10', 'LowIncomeTracts', 'Urban']], 
-                           on='GEOID', how='left')
-    merged['Rural'] = 1 - merged['Urban']
-    
-    # Calculate quantiles of burden distribution
-    quantiles = [0.10, 0.25, 0.50, 0.75, 0.90]
-    quantile_results = []
-    
-    for q in quantiles:
-        threshold = merged['burden'].quantile(q)
-        above_quantile = (merged['burden'] > threshold).astype(int)
-        
-        # Simple association at each quantile
-        lila_effect = merged.groupby('LILATracts_1And10')['burden'].quantile(q).diff().iloc[-1]
-        
-        quantile_results.append({
-            'Quantile': q,
-            'Burden_Threshold': threshold,
-            'LILA_Effect': lila_effect,
-            'N_Above': above_quantile.sum()
-        })
-    
-    quantile_df = pd.DataFrame(quantile_results)
+    # Interior-point fits at q = 0.1..0.9 with state-stratified bootstrap SEs
+    quantile_df = quantile_regression.fit_burden_quantiles()
+    quantile_df = quantile_df.drop(columns='Iterations')
     
     # Save
     quantile_df.to_csv('tables/quantile_regression.csv', index=False)
-    quantile_df.to_latex('tables/quantile_regression.tex', index=False,
-                        caption='Quantile Regression Results: LILA Effect Across Distribution')
+    lila = quantile_df[quantile_df['Variable'] == quantile_regression.LILA_LABEL]
+    lila.round(4).to_latex('tables/quantile_regression.tex', index=False,
+                           caption='Quantile Regression Results: LILA Effect Across Distribution')
     
+    print(lila[['Quantile', 'Coefficient', 'Std_Error', 'CI_low', 'CI_high']].round(4).to_string(index=False))
     print("Quantile regression saved to tables/quantile_regression.csv and .tex")
     return quantile_df
 
@@ -250,16 +214,9 @@ def create_top_resilient_tracts_table():
     """Create table of top resilient tracts with detailed characteristics"""
     print("\nGenerating Top Resilient Tracts Table...")
     
-    # Load all data sources
-    results = pd.read_csv('data/processed/model_table_with_residuals.csv')
-    fara = pd.read_csv('data/interim/fara_2019.csv')
-    
-    # Merge
-    fara['GEOID'] = fara['CensusTract'].astype(str).str.zfill(11)
-    results['GEOID'] = results['GEOID'].astype(str).str.zfill(11)
-    merged = results.merge(fara[['GEOID', 'LILATracts_1And10', 'County', 'State', 
-                                  'PovertyRate', 'MedianFamilyIncome', 'Pop2010']], 
-                           on='GEOID', how='left')
+    # Load merged data
+    merged = tract_store.load_merged(['LILATracts_1And10', 'County', 'State',
+                                      'PovertyRate', 'MedianFamilyIncome', 'Pop2010'])
     
     # Filter to LILA tracts and get top 20
     lila_tracts = merged[merged['LILATracts_1And10'] == 1]
@@ -287,17 +244,10 @@ def create_correlation_matrix():
     """Create correlation matrix of key variables"""
     print("\nGenerating Correlation Matrix...")
     
-    # Load and merge data
-    results = pd.read_csv('data/processed/model_table_with_residuals.csv')
-    fara = pd.read_csv('data/interim/fara_2019.csv')
-    
-    fara['GEOID'] = fara['CensusTract'].astype(str).str.zfill(11)
-    results['GEOID'] = results['GEOID'].astype(str).str.zfill(11)
-    
     # Select key variables
-    fara_vars = ['GEOID', 'LILATracts_1And10', 'LowIncomeTracts', 'PovertyRate', 
+    fara_vars = ['LILATracts_1And10', 'LowIncomeTracts', 'PovertyRate',
                  'MedianFamilyIncome', 'Urban', 'Pop2010']
-    merged = results.merge(fara[fara_vars], on='GEOID', how='left')
+    merged = tract_store.load_merged(fara_vars)
     merged['Rural'] = 1 - merged['Urban']
     
     # Select variables for correlation
@@ -346,12 +296,13 @@ def main():
     print("  - table3_state_resilience.csv/.tex")
     print("  - top_20_resilient_lila.csv/.tex")
     print("  - correlation_matrix.csv/.tex")
-    print("  - spatial_autocorrelation.csv")
+    print("  - spatial_autocorrelation.csv, morans_i_global.csv")
     print("  - quantile_regression.csv/.tex")
     
     print("\nKey Robustness Check Results:")
-    print(f"  - Global spatial correlation: {global_corr:.4f}")
-    print(f"  - Quantile regression shows {'consistent' if quantile_df['LILA_Effect'].std() < 0.1 else 'varying'} effects across distribution")
+    print(f"  - Global Moran's I of residuals: {global_corr:.4f}")
+    lila_effects = quantile_df.loc[quantile_df['Variable'] == quantile_regression.LILA_LABEL, 'Coefficient']
+    print(f"  - Quantile regression shows {'consistent' if lila_effects.std() < 0.1 else 'varying'} effects across distribution")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
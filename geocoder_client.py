@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Concurrent Census geocoder client with a persistent response cache
+asyncio front end with bounded concurrency, token-bucket rate limiting and
+retry with exponential backoff; every successful response is stored in
+SQLite so reruns only hit the network for tracts not seen before
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import numpy as np
+import pandas as pd
+
+import tract_store
+
+BASE_URL = 'https://geocoding.geo.census.gov/geocoder/geographies'
+CACHE_PATH = 'data/interim/geocoder_cache.sqlite'
+
+# HTTP statuses worth retrying
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allow rate requests per second on average, bursting up to capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ResponseCache:
+    """SQLite store of raw JSON responses keyed by request key"""
+
+    def __init__(self, path=CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS responses '
+                          '(key TEXT PRIMARY KEY, url TEXT, body TEXT, fetched_at REAL)')
+
+    def get(self, key):
+        row = self.conn.execute('SELECT body FROM responses WHERE key = ?', (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key, url, data):
+        self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                          (key, url, json.dumps(data), time.time()))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def _first_geography(data):
+    """First geography record in a geocoder response, whatever the layer layout"""
+    geographies = data.get('result', {}).get('geographies') or {}
+    layers = geographies.values() if isinstance(geographies, dict) else [geographies]
+    for layer in layers:
+        if layer:
+            return layer[0]
+    return None
+
+
+class GeocoderClient:
+    """
+    Census geocoder client
+
+    base_url can point at a local stand-in server for tests. Blocking urllib
+    calls run in worker threads; concurrency caps requests in flight and rate
+    caps requests per second.
+    """
+
+    def __init__(self, base_url=BASE_URL, cache_path=CACHE_PATH, concurrency=8, rate=10.0,
+                 retries=4, backoff=0.5, timeout=30, benchmark='2020', vintage='2019'):
+        self.base_url = base_url.rstrip('/')
+        self.cache = ResponseCache(cache_path)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.params = {'benchmark': benchmark, 'vintage': vintage, 'format': 'json'}
+        self.stats = {'requests': 0, 'cache_hits': 0, 'retries': 0, 'errors': 0, 'latencies': []}
+
+    def _get(self, url):
+        with urlopen(url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    async def fetch_json(self, key, endpoint, params):
+        """Cached GET of base_url/endpoint?params; concurrent calls for one key share a request"""
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.ensure_future(self._fetch(key, endpoint, params))
+        else:
+            self.stats['cache_hits'] += 1
+        try:
+            return await asyncio.shield(self._inflight[key])
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _fetch(self, key, endpoint, params):
+        """GET with rate limiting and retry with exponential backoff"""
+        url = f"{self.base_url}/{endpoint}?{urlencode({**params, **self.params})}"
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                await self._bucket.acquire()
+                start = time.perf_counter()
+                try:
+                    data = await asyncio.to_thread(self._get, url)
+                except (HTTPError, URLError, TimeoutError, ConnectionError) as e:
+                    retryable = not isinstance(e, HTTPError) or e.code in RETRY_STATUS
+                    if not retryable or attempt == self.retries:
+                        self.stats['errors'] += 1
+                        raise
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+                    continue
+                finally:
+                    self.stats['requests'] += 1
+                    self.stats['latencies'].append(time.perf_counter() - start)
+                self.cache.put(key, url, data)
+                return data
+
+    async def place_at(self, lat, lon):
+        """Census place containing a coordinate (name, state FIPS) or None"""
+        data = await self.fetch_json(f"coord:{lat:.6f},{lon:.6f}", 'coordinates',
+                                     {'x': f"{lon:.6f}", 'y': f"{lat:.6f}", 'layers': 'Places'})
+        geo = _first_geography(data)
+        return None if geo is None else (geo.get('NAME'), geo.get('STATE'))
+
+    async def tract_centroid(self, geoid):
+        """Tract centroid from the geocoder (used when the gazetteer lacks the tract)"""
+        data = await self.fetch_json(f"tract:{geoid}", 'tract',
+                                     {'state': geoid[:2], 'county': geoid[2:5], 'tract': geoid[5:11]})
+        geo = _first_geography(data)
+        if geo is None or not geo.get('CENTLAT'):
+            return None
+        return float(geo['CENTLAT']), float(geo['CENTLON'])
+
+    async def tract_place(self, geoid, centroid=None):
+        """Place name for one tract; errors are reported, not raised"""
+        try:
+            centroid = centroid or await self.tract_centroid(geoid)
+            if centroid is None:
+                return {'GEOID': geoid, 'City': 'Not Found', 'City_State': geoid[:2], 'error': None}
+            place = await self.place_at(*centroid)
+            if place is None:
+                return {'GEOID': geoid, 'City': 'Unincorporated/Rural', 'City_State': geoid[:2],
+                        'error': None}
+            return {'GEOID': geoid, 'City': place[0] or 'Unincorporated',
+                    'City_State': place[1] or geoid[:2], 'error': None}
+        except Exception as e:
+            return {'GEOID': geoid, 'City': 'Error', 'City_State': '', 'error': str(e)}
+
+    async def _run(self, geoids, centroids):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._bucket = TokenBucket(self.rate)
+        self._inflight = {}
+        return await asyncio.gather(*[self.tract_place(g, centroids.get(g)) for g in geoids])
+
+    def tract_places(self, geoids, use_gazetteer=True):
+        """
+        Place names for many tracts concurrently
+
+        Gazetteer centroids are used where available so most tracts need one
+        geocoder call instead of two.
+        """
+        geoids = list(tract_store.normalize_geoid(geoids))
+        centroids = {}
+        if use_gazetteer:
+            gaz = tract_store.load_centroids()
+            gaz = gaz[gaz['GEOID'].isin(geoids)]
+            centroids = dict(zip(gaz['GEOID'], zip(gaz['latitude'], gaz['longitude'])))
+        start = time.perf_counter()
+        rows = asyncio.run(self._run(geoids, centroids))
+        self.stats['elapsed'] = time.perf_counter() - start
+        return pd.DataFrame(rows)
+
+    def summary(self):
+        """Throughput and latency statistics of the last run"""
+        lat = np.array(self.stats['latencies']) * 1000
+        elapsed = self.stats.get('elapsed', 0) or 1e-9
+        return {
+            'requests': self.stats['requests'],
+            'cache_hits': self.stats['cache_hits'],
+            'retries': self.stats['retries'],
+            'errors': self.stats['errors'],
+            'elapsed_s': round(elapsed, 3),
+            'requests_per_s': round(self.stats['requests'] / elapsed, 2),
+            'latency_ms_p50': round(float(np.percentile(lat, 50)), 1) if len(lat) else None,
+            'latency_ms_p95': round(float(np.percentile(lat, 95)), 1) if len(lat) else None,
+        }
+
+    def close(self):
+        self.cache.close()
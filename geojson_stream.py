@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Streaming GeoJSON join for the tract map
+Reads tracts_full.geojson one feature at a time (json raw_decode over a
+rolling buffer, so the FeatureCollection is never held in memory), attaches
+resilience_score/burden/resid from the columnar store by GEOID and writes
+compact GeoJSON feature by feature: no indentation, rounded coordinates,
+numeric properties. Replaces the join in the Go map step, which loaded,
+joined and re-marshalled the whole collection with indentation.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import yaml
+
+import tract_store
+
+CONFIG_PATH = 'config/default.yml'
+OUTPUT_GEOJSON = 'figures/resilience.geojson'
+JOIN_COLUMNS = ['resilience_score', 'burden', 'resid']
+COORD_DIGITS = 6     # ~0.1 m, well below the 1:500k source resolution
+PROPERTY_DIGITS = 4
+CHUNK_SIZE = 1 << 20
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class _Buffer:
+    """Text read from a file in chunks, with a cursor; consumed text is discarded"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip(self, chars=_WHITESPACE):
+        """Advance past chars; returns the next character ('' at end of file)"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in chars:
+                self.pos += 1
+            if self.pos < len(self.text) or not self.fill():
+                return self.text[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.skip() != char:
+            raise ValueError(f"expected {char!r} at offset {self.pos}, found {self.skip()!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value, reading more text until it is complete"""
+        self.skip()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.text) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_features(path, members=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield the features of a GeoJSON FeatureCollection one at a time
+
+    Memory is bounded by the largest single feature plus chunk_size. The
+    other top-level members (type, name, crs, ...) are stored in members,
+    if given, as they are read; those before "features" are available by
+    the time the first feature is yielded.
+    """
+    members = {} if members is None else members
+    with open(path, encoding='utf-8') as f:
+        buf = _Buffer(f, chunk_size)
+        buf.expect('{')
+        while buf.skip() != '}':
+            key = buf.value()
+            buf.expect(':')
+            if key != 'features':
+                members[key] = buf.value()
+            else:
+                buf.expect('[')
+                while buf.skip() != ']':
+                    yield buf.value()
+                    if buf.skip() == ',':
+                        buf.pos += 1
+                buf.pos += 1
+            if buf.skip() == ',':
+                buf.pos += 1
+
+
+def round_coordinates(coords, digits=COORD_DIGITS):
+    """Nested coordinate arrays with every number rounded"""
+    if coords and isinstance(coords[0], (int, float)):
+        return [round(c, digits) for c in coords]
+    return [round_coordinates(c, digits) for c in coords]
+
+
+def compact_geometry(geometry, digits=COORD_DIGITS):
+    """Geometry with rounded coordinates (GeometryCollections handled recursively)"""
+    if geometry is None:
+        return None
+    if geometry.get('type') == 'GeometryCollection':
+        return {'type': 'GeometryCollection',
+                'geometries': [compact_geometry(g, digits) for g in geometry['geometries']]}
+    return {'type': geometry['type'], 'coordinates': round_coordinates(geometry['coordinates'], digits)}
+
+
+def property_lookup(table=None, columns=JOIN_COLUMNS, digits=PROPERTY_DIGITS):
+    """GEOID -> {column: rounded float or None} from the model table"""
+    table = tract_store.load_model_table() if table is None else table
+    values = np.round(table[columns].to_numpy(dtype=np.float64), digits)
+    values = np.where(np.isfinite(values), values, np.nan).astype(object)
+    values[values != values] = None
+    return {geoid: dict(zip(columns, row))
+            for geoid, row in zip(table['GEOID'].to_numpy(), values.tolist())}
+
+
+def join_geojson(source, target=OUTPUT_GEOJSON, lookup=None, digits=COORD_DIGITS,
+                 keep=None, chunk_size=CHUNK_SIZE):
+    """
+    Stream source features to target with the model columns joined on GEOID
+
+    keep lists the source properties to carry over (all when None); joined
+    columns are null for tracts missing from the model table. Written to a
+    temporary file and renamed, so target is never left half-written.
+    Returns (features written, features matched).
+    """
+    lookup = property_lookup() if lookup is None else lookup
+    columns = next(iter(lookup.values())).keys() if lookup else JOIN_COLUMNS
+    missing = dict.fromkeys(columns)
+    members = {}
+    written = matched = 0
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    tmp = target + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as out:
+        for feature in iter_features(source, members, chunk_size):
+            if written == 0:
+                header = {k: v for k, v in members.items() if k != 'type'}
+                out.write('{"type":"FeatureCollection",')
+                for key, value in header.items():
+                    out.write(f"{json.dumps(key)}:{json.dumps(value, separators=(',', ':'))},")
+                out.write('"features":[\n')
+            else:
+                out.write(',\n')
+            props = feature.get('properties') or {}
+            if keep is not None:
+                props = {k: props[k] for k in keep if k in props}
+            geoid = props.get('GEOID')
+            if geoid is not None:
+                geoid = str(geoid).strip().zfill(11)
+                props['GEOID'] = geoid
+            joined = lookup.get(geoid)
+            matched += joined is not None
+            props.update(joined or missing)
+            out.write(json.dumps({'type': 'Feature', 'properties': props,
+                                  'geometry': compact_geometry(feature.get('geometry'), digits)},
+                                 separators=(',', ':'), allow_nan=False))
+            written += 1
+        if written == 0:
+            out.write('{"type":"FeatureCollection","features":[\n')
+        out.write('\n]}\n')
+    os.replace(tmp, target)
+    return written, matched
+
+
+def _configured_tracts():
+    with open(CONFIG_PATH) as f:
+        return yaml.safe_load(f)['paths'].get('tracts_geojson_path')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('source', nargs='?', help='tract GeoJSON (default: paths.tracts_geojson_path)')
+    parser.add_argument('--output', default=OUTPUT_GEOJSON)
+    parser.add_argument('--digits', type=int, default=COORD_DIGITS, help='coordinate decimals')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("STREAMING GEOJSON JOIN")
+    print("=" * 60)
+    source = args.source or _configured_tracts()
+    start = time.perf_counter()
+    written, matched = join_geojson(source, args.output, digits=args.digits)
+    in_mb, out_mb = os.path.getsize(source) / 1e6, os.path.getsize(args.output) / 1e6
+    print(f"Joined {matched:,} of {written:,} features in {time.perf_counter() - start:.1f}s")
+    print(f"{source}: {in_mb:,.1f} MB -> {args.output}: {out_mb:,.1f} MB")
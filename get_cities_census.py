@@ -5,106 +5,27 @@ Using Census TIGER/Line Place boundaries
 """
 
 import pandas as pd
-import json
-import time
-from urllib.request import urlopen
-from urllib.parse import quote
 
-def get_cities_via_census_api():
+import geocoder_client
+
+def get_cities_via_census_api(concurrency=8, rate=10.0):
     """
     Use Census Geocoding API to get city names
-    Most accurate without downloading shapefiles
+    Most accurate without downloading shapefiles; requests run concurrently
+    and responses are cached, so reruns only query new tracts
     """
     
     print("Loading resilient communities list...")
     df = pd.read_csv('data/processed/all_1059_resilient_lila_communities.csv')
     
-    # Census Geocoding API endpoint
-    base_url = "https://geocoding.geo.census.gov/geocoder/geographies/centroid"
-    
-    cities = []
-    errors = []
-    
     print(f"Getting city names for {len(df)} tracts via Census API...")
-    print("Note: This will take ~20 minutes due to rate limiting")
-    
-    for idx, row in df.iterrows():
-        tract = str(row['Census_Tract']).zfill(11)
-        
-        # Build API request for tract centroid
-        # Format: State(2) + County(3) + Tract(6)
-        state = tract[:2]
-        county = tract[2:5]
-        tract_code = tract[5:11]
-        
-        params = {
-            'benchmark': '2020',
-            'vintage': '2019',  # Match FARA data year
-            'layers': 'Census Tracts',
-            'format': 'json'
-        }
-        
-        try:
-            # First, get tract centroid coordinates
-            tract_url = f"https://geocoding.geo.census.gov/geocoder/geographies/tract"
-            query = f"?state={state}&county={county}&tract={tract_code}&benchmark=2020&vintage=2019&format=json"
-            
-            response = urlopen(tract_url + query)
-            data = json.loads(response.read())
-            
-            if data['result']['geographies']:
-                geo = data['result']['geographies'][0]
-                centroid_lat = geo.get('CENTLAT', '')
-                centroid_lon = geo.get('CENTLON', '')
-                
-                # Now get place name from coordinates
-                if centroid_lat and centroid_lon:
-                    place_url = f"https://geocoding.geo.census.gov/geocoder/geographies/coordinates"
-                    place_query = f"?x={centroid_lon}&y={centroid_lat}&benchmark=2020&vintage=2019&layers=Places&format=json"
-                    
-                    place_response = urlopen(place_url + place_query)
-                    place_data = json.loads(place_response.read())
-                    
-                    if place_data['result']['geographies']:
-                        place_name = place_data['result']['geographies'][0].get('NAME', 'Unincorporated')
-                        place_state = place_data['result']['geographies'][0].get('STATE', '')
-                    else:
-                        place_name = 'Unincorporated/Rural'
-                        place_state = state
-                else:
-                    place_name = 'Unknown'
-                    place_state = state
-            else:
-                place_name = 'Not Found'
-                place_state = state
-                
-            cities.append({
-                'Census_Tract': row['Census_Tract'],
-                'City': place_name,
-                'City_State': place_state,
-                'County': row['County'],
-                'State': row['State']
-            })
-            
-            if (idx + 1) % 50 == 0:
-                print(f"Processed {idx + 1}/{len(df)} tracts...")
-                time.sleep(1)  # Rate limiting
-                
-        except Exception as e:
-            errors.append({'tract': tract, 'error': str(e)})
-            cities.append({
-                'Census_Tract': row['Census_Tract'],
-                'City': 'Error',
-                'City_State': '',
-                'County': row['County'],
-                'State': row['State']
-            })
-            
-        # Rate limiting
-        time.sleep(0.1)
-    
-    # Create output dataframe
-    cities_df = pd.DataFrame(cities)
+    client = geocoder_client.GeocoderClient(concurrency=concurrency, rate=rate)
+    try:
+        cities_df = client.tract_places(df['Census_Tract'])
+        stats = client.summary()
+    finally:
+        client.close()
+    cities_df['Census_Tract'] = df['Census_Tract'].values
     
     # Merge with original data
     result = df.merge(cities_df[['Census_Tract', 'City']], on='Census_Tract', how='left')
@@ -112,11 +33,16 @@ def get_cities_via_census_api():
     # Save results
     result.to_csv('data/processed/all_1059_resilient_with_cities.csv', index=False)
     
+    errors = cities_df[cities_df['error'].notna()]
     print(f"\nComplete! Saved to: data/processed/all_1059_resilient_with_cities.csv")
+    print(f"Requests: {stats['requests']} ({stats['cache_hits']} cache hits, "
+          f"{stats['retries']} retries) at {stats['requests_per_s']}/s, "
+          f"p50 {stats['latency_ms_p50']} ms, p95 {stats['latency_ms_p95']} ms")
     print(f"Errors: {len(errors)}")
     
-    if errors:
-        pd.DataFrame(errors).to_csv('data/processed/geocoding_errors.csv', index=False)
+    if len(errors):
+        errors[['GEOID', 'error']].rename(columns={'GEOID': 'tract'}).to_csv(
+            'data/processed/geocoding_errors.csv', index=False)
     
     # Summary of cities
     city_counts = result['City'].value_counts()
@@ -213,7 +139,7 @@ if __name__ == "__main__":
     print("=" * 60)
     
     print("\nChoose method:")
-    print("1. Census API (accurate but slow - 20+ minutes)")
+    print("1. Census API (accurate; concurrent and cached between runs)")
     print("2. County-to-city mapping (quick approximation)")
     
     # For now, use quick method to demonstrate
@@ -12,6 +12,7 @@ import zipfile
 import os
 from pathlib import Path
 import json
+import place_assignment
 
 def download_census_gazetteer():
     """
@@ -167,6 +168,27 @@ def get_places_via_census_api(gdf):
     
     return gdf
 
+def get_places_offline(gdf):
+    """
+    Assign place names by point-in-polygon against local TIGER Place boundaries
+    Uses the STRtree engine in place_assignment; no API calls
+    """
+    print(f"\nAssigning places from {place_assignment.PLACES_PATH}...")
+    
+    located = gdf['latitude'].notna().to_numpy()
+    places = place_assignment.load_place_polygons()
+    assignments = place_assignment.assign_tracts(gdf.loc[located, ['GEOID', 'latitude', 'longitude']],
+                                                 places)
+    gdf = gdf.merge(assignments[['GEOID', 'Place']], on='GEOID', how='left')
+    
+    # Label with state; tracts outside any place keep their county
+    in_place = gdf['Place'].notna() & (gdf['Place'] != place_assignment.UNASSIGNED)
+    gdf['Place'] = (gdf['Place'] + ', ' + gdf['State_Abbr']).where(
+        in_place, gdf['County'] + ', ' + gdf['State_Abbr'])
+    
+    print(f"{in_place.sum()} of {len(gdf)} tracts fall inside a Census place")
+    return gdf
+
 def analyze_results(gdf):
     """
     Analyze the final results with place names
@@ -247,8 +269,12 @@ def main():
     # Create GeoDataFrame with tract points
     gdf = create_tract_points(df, gaz_df)
     
-    # Get place names (using API/relationship files)
-    gdf = get_places_via_census_api(gdf)
+    # Get place names: offline spatial join when boundaries are on disk,
+    # otherwise the API/relationship-file approximation
+    if os.path.exists(place_assignment.PLACES_PATH):
+        gdf = get_places_offline(gdf)
+    else:
+        gdf = get_places_via_census_api(gdf)
     
     # Analyze results
     gdf_final, summary = analyze_results(gdf)
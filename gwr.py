@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Geographically weighted regression (GWR) of the expected-burden model
+Fits the burden model around every tract with an adaptive bisquare kernel
+over its nearest neighbours (KD-tree on centroids), picks the neighbour
+count by AICc with a golden-section search, and spreads the local weighted
+least-squares solves across a process pool as vectorized batches. Writes
+per-tract local coefficients and a local resilience score.
+
+    python gwr.py                     AICc bandwidth search, then the final fit
+    python gwr.py --bandwidth 400     fixed 400-neighbour kernel
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+import burden_model
+import shared_arrays
+import spatial_stats
+import tract_store
+
+OUTPUT_DIR = 'data/processed/gwr'
+SUMMARY_CSV = 'tables/gwr_summary.csv'
+MIN_BANDWIDTH = 50
+MAX_BANDWIDTH = 2000   # neighbours; wider kernels approach the global model
+TASK_SIZE = 4096       # tracts per pool task
+CHUNK_ELEMENTS = 1 << 21  # centres x neighbours gathered at once in a task
+GOLDEN = (np.sqrt(5) - 1) / 2
+RANK_TOL = 1e-10
+
+# Set in each worker process
+_TREE = {}
+
+
+def gwr_design(burden=None, fara=None, config=None, centroids=None):
+    """
+    Located design frame with y, X (constant first) and unit-sphere coordinates
+
+    GWR lets the constant vary by location, so state fixed effects are not
+    added.
+    """
+    config = config or burden_model.load_model_config()
+    burden = burden_model.load_burden_table() if burden is None else burden
+    include_no_vehicle = config.get('include_no_vehicle', True)
+    frame = burden_model.design_frame(burden, fara, include_no_vehicle)
+    centroids = tract_store.load_centroids() if centroids is None else centroids
+    frame = frame.merge(centroids[['GEOID', 'latitude', 'longitude']], on='GEOID', how='left')
+    dropped = int(frame['latitude'].isna().sum())
+    frame = frame[frame['latitude'].notna()].reset_index(drop=True)
+    cols = burden_model.covariates(include_no_vehicle)
+    X = np.column_stack([np.ones(len(frame)), frame[[c for c, _ in cols]].to_numpy(dtype=np.float64)])
+    return {'frame': frame, 'y': frame['burden'].to_numpy(dtype=np.float64), 'X': X,
+            'xyz': spatial_stats.unit_sphere_xyz(frame['latitude'], frame['longitude']),
+            'names': ['Constant'] + [label for _, label in cols], 'dropped': dropped}
+
+
+def bisquare(dist):
+    """Adaptive bisquare weights; the bandwidth is each row's farthest neighbour"""
+    h = dist[:, -1:]
+    u = np.divide(dist, h, out=np.zeros_like(dist), where=h > 0)
+    return (1 - u ** 2) ** 2
+
+
+def local_fits(X, y, idx, w, full=False):
+    """
+    Weighted least squares for a batch of local regressions
+
+    idx/w are (centres x neighbours) indices and kernel weights, the centre
+    itself first. Locally constant covariates (e.g. no LILA tract in the
+    neighbourhood) make X'WX singular; their directions are dropped by a
+    pseudo-inverse from one batched eigendecomposition. Returns beta, the
+    hat-matrix diagonal, the local rank and, with full, coefficient
+    standard errors (up to sigma) and local R^2.
+    """
+    Xn, yn = X[idx], y[idx]
+    Xw = (Xn * w[:, :, None]).transpose(0, 2, 1)
+    xwx = Xw @ Xn
+    xwy = (Xw @ yn[:, :, None])[:, :, 0]
+    vals, vecs = np.linalg.eigh(xwx)
+    keep = vals > RANK_TOL * vals[:, -1:]
+    inv_vals = np.where(keep, 1 / np.where(keep, vals, 1), 0.0)
+    inv = np.einsum('cpk,ck,cqk->cpq', vecs, inv_vals, vecs)
+    beta = np.einsum('cpq,cq->cp', inv, xwy)
+    x0 = X[idx[:, 0]]
+    # Weight of the centre on itself is 1 (distance 0)
+    hat = np.einsum('cp,cpq,cq->c', x0, inv, x0) * w[:, 0]
+    out = {'beta': beta, 'hat': hat, 'rank': keep.sum(axis=1)}
+    if full:
+        xw2x = (Xw * w[:, None, :]) @ Xn
+        cov = inv @ xw2x @ inv
+        out['se_unit'] = np.sqrt(np.maximum(np.einsum('cpp->cp', cov), 0))
+        fit_resid = yn - (Xn @ beta[:, :, None])[:, :, 0]
+        ybar = (w * yn).sum(axis=1) / w.sum(axis=1)
+        tss = (w * (yn - ybar[:, None]) ** 2).sum(axis=1)
+        out['local_r2'] = np.where(tss > 0, 1 - (w * fit_resid ** 2).sum(axis=1) / np.where(
+            tss > 0, tss, 1), np.nan)
+    return out
+
+
+def _fit_task(task):
+    """Worker: local fits for tracts lo..hi at one bandwidth"""
+    lo, hi, bandwidth, full = task
+    data = shared_arrays.ATTACHED
+    if 'tree' not in _TREE:
+        _TREE['tree'] = cKDTree(data['xyz'])
+    X, y, xyz = data['X'], data['y'], data['xyz']
+    step = max(1, CHUNK_ELEMENTS // bandwidth)
+    parts = []
+    for start in range(lo, hi, step):
+        stop = min(start + step, hi)
+        dist, idx = _TREE['tree'].query(xyz[start:stop], k=bandwidth)
+        dist, idx = dist.reshape(stop - start, bandwidth), idx.reshape(stop - start, bandwidth)
+        parts.append(local_fits(X, y, idx, bisquare(dist), full))
+    return lo, {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+def aicc(resid, trace):
+    """Corrected AIC of a GWR fit (Fotheringham, Brunsdon & Charlton 2002)"""
+    n = len(resid)
+    sigma = np.sqrt((resid @ resid) / n)
+    return 2 * n * np.log(sigma) + n * np.log(2 * np.pi) + n * (n + trace) / (n - 2 - trace)
+
+
+def fit_gwr(design, bandwidth, pool=None, full=True, task_size=TASK_SIZE):
+    """
+    Local fits for every tract at one bandwidth (neighbour count)
+
+    pool is an executor whose workers attached design's arrays (see
+    gwr_pool); without one the batches run in this process.
+    Returns a dict of per-tract arrays plus aicc, trace and sigma2.
+    """
+    X, y = design['X'], design['y']
+    n, p = X.shape
+    bandwidth = int(min(bandwidth, n))
+    tasks = [(lo, min(lo + task_size, n), bandwidth, full) for lo in range(0, n, task_size)]
+    if pool is None:
+        shared_arrays.ATTACHED.update({k: design[k] for k in ('X', 'y', 'xyz')})
+        _TREE.pop('tree', None)
+        results = map(_fit_task, tasks)
+    else:
+        results = pool.map(_fit_task, tasks)
+    out = {'beta': np.empty((n, p)), 'hat': np.empty(n), 'rank': np.empty(n, dtype=np.int64)}
+    if full:
+        out.update(se_unit=np.empty((n, p)), local_r2=np.empty(n))
+    for lo, part in results:
+        for key, values in part.items():
+            out[key][lo:lo + len(values)] = values
+    out['resid'] = y - np.einsum('ip,ip->i', X, out['beta'])
+    trace = out['hat'].sum()
+    out.update(bandwidth=bandwidth, trace=trace, aicc=aicc(out['resid'], trace),
+               sigma2=(out['resid'] @ out['resid']) / (n - trace))
+    if full:
+        out['se'] = out.pop('se_unit') * np.sqrt(out['sigma2'])
+    return out
+
+
+def gwr_pool(design, max_workers=None):
+    """(pool, blocks): a process pool whose workers share design's arrays; release blocks after"""
+    blocks, spec = shared_arrays.share_arrays({k: design[k] for k in ('X', 'y', 'xyz')})
+    pool = ProcessPoolExecutor(max_workers=max_workers, initializer=shared_arrays.attach_arrays,
+                               initargs=(spec,))
+    return pool, blocks
+
+
+def select_bandwidth(design, pool=None, low=MIN_BANDWIDTH, high=MAX_BANDWIDTH):
+    """
+    Neighbour count minimizing AICc by golden-section search over integers
+
+    Returns (bandwidth, {bandwidth: AICc} for every one evaluated).
+    """
+    n = len(design['y'])
+    low, high = max(low, design['X'].shape[1] + 2), min(high, n)
+    scores = {}
+
+    def score(m):
+        if m not in scores:
+            start = time.perf_counter()
+            scores[m] = fit_gwr(design, m, pool, full=False)['aicc']
+            print(f"  bandwidth {m:5d}: AICc {scores[m]:,.1f} ({time.perf_counter() - start:.1f}s)",
+                  flush=True)
+        return scores[m]
+
+    a, c = low, high
+    b = int(round(c - GOLDEN * (c - a)))
+    d = int(round(a + GOLDEN * (c - a)))
+    while d - b > 1:
+        if score(b) <= score(d):
+            c, d = d, b
+            b = int(round(c - GOLDEN * (c - a)))
+        else:
+            a, b = b, d
+            d = int(round(a + GOLDEN * (c - a)))
+    best = min((score(m), m) for m in {a, b, c, d})[1]
+    return best, scores
+
+
+def local_table(design, fit):
+    """Per-tract local coefficients, standard errors and the local resilience score"""
+    frame = design['frame']
+    out = frame[['GEOID', 'StateAbbr', 'burden']].copy()
+    for j, name in enumerate(design['names']):
+        out[f"coef_{name}"] = fit['beta'][:, j]
+    for j, name in enumerate(design['names']):
+        out[f"se_{name}"] = fit['se'][:, j]
+    out['local_r2'] = fit['local_r2']
+    out['local_rank'] = fit['rank']
+    out['resid_gwr'] = fit['resid']
+    out['resilience_score_gwr'] = burden_model.resilience_scores(fit['resid'])
+    return out
+
+
+def coefficient_summary(design, fit, global_fit):
+    """Global OLS coefficient next to the spread of each local coefficient"""
+    rows = []
+    global_coef = global_fit['coef']['Coefficient'].to_numpy()
+    for j, name in enumerate(design['names']):
+        local = fit['beta'][fit['rank'] == len(design['names']), j]
+        q = np.percentile(local, [0, 25, 50, 75, 100]) if len(local) else [np.nan] * 5
+        rows.append({'Variable': name, 'Global': global_coef[j], 'Min': q[0], 'Q1': q[1],
+                     'Median': q[2], 'Q3': q[3], 'Max': q[4],
+                     'Share_opposite_sign': np.mean(np.sign(local) != np.sign(global_coef[j]))
+                     if len(local) else np.nan})
+    return pd.DataFrame(rows)
+
+
+def run_gwr(config=None, bandwidth=None, low=MIN_BANDWIDTH, high=MAX_BANDWIDTH, max_workers=None,
+            output_dir=OUTPUT_DIR, summary_path=SUMMARY_CSV):
+    """Bandwidth search (unless bandwidth is given), final fit and outputs"""
+    config = config or burden_model.load_model_config()
+    design = gwr_design(config=config)
+    print(f"{len(design['y']):,} located tracts ({design['dropped']:,} without a centroid)")
+    pool, blocks = gwr_pool(design, max_workers)
+    try:
+        start = time.perf_counter()
+        scores = {}
+        if bandwidth is None:
+            print(f"Searching bandwidths {low}-{high} neighbours by AICc...")
+            bandwidth, scores = select_bandwidth(design, pool, low, high)
+        fit = fit_gwr(design, bandwidth, pool)
+        print(f"Bandwidth {bandwidth} neighbours, effective parameters {fit['trace']:,.1f}, "
+              f"AICc {fit['aicc']:,.1f} ({time.perf_counter() - start:.1f}s)")
+    finally:
+        pool.shutdown()
+        shared_arrays.release(blocks)
+
+    names = design['names'][1:]
+    global_fit = burden_model.fit_ols(design['y'], design['X'][:, 1:], names, se_type='classical')
+    global_aicc = aicc(global_fit['resid'], design['X'].shape[1])
+    tracts = local_table(design, fit)
+    summary = coefficient_summary(design, fit, global_fit)
+    search = pd.DataFrame(sorted(scores.items()), columns=['bandwidth', 'aicc'])
+
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(summary_path), exist_ok=True)
+    tracts.to_csv(os.path.join(output_dir, 'local_coefficients.csv'), index=False,
+                  float_format='%.6f')
+    search.to_csv(os.path.join(output_dir, 'bandwidth_search.csv'), index=False,
+                  float_format='%.3f')
+    summary.to_csv(summary_path, index=False, float_format='%.6f')
+    return tracts, summary, fit, global_aicc
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bandwidth', type=int, help='fixed neighbour count (skips the search)')
+    parser.add_argument('--min', type=int, default=MIN_BANDWIDTH, help='smallest bandwidth searched')
+    parser.add_argument('--max', type=int, default=MAX_BANDWIDTH, help='largest bandwidth searched')
+    parser.add_argument('--workers', type=int, help='local-fit processes')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("GEOGRAPHICALLY WEIGHTED BURDEN MODEL")
+    print("=" * 60)
+    tracts, summary, fit, global_aicc = run_gwr(bandwidth=args.bandwidth, low=args.min,
+                                                high=args.max, max_workers=args.workers)
+    print(f"\nAICc: GWR {fit['aicc']:,.1f} vs global OLS {global_aicc:,.1f}")
+    print(f"Tracts with a rank-deficient neighbourhood: {(fit['rank'] < fit['beta'].shape[1]).sum():,}")
+    print("\nLocal coefficients (full-rank neighbourhoods):")
+    print(summary.round(3).to_string(index=False))
+    lila = 'coef_' + burden_model.covariates()[0][1]
+    print("\nMedian local LILA coefficient by state (extremes):")
+    by_state = tracts.groupby('StateAbbr')[lila].median().sort_values()
+    print(pd.concat([by_state.head(5), by_state.tail(5)]).round(3).to_string())
+    print(f"\nSaved: {OUTPUT_DIR}/local_coefficients.csv, bandwidth_search.csv, {SUMMARY_CSV}")
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Hotspot detection for resilience scores and resilient LILA tracts
+Getis-Ord Gi* z-scores over the k-nearest-neighbour graph of every located
+tract (hot and cold spots after Benjamini-Hochberg FDR control, grouped into
+connected clusters), and a Kulldorff Bernoulli spatial scan for the
+resilient-LILA indicator: circular windows of the 1..max_window tracts
+nearest each tract centroid, ranked by likelihood ratio with Monte Carlo
+p-values from batched replicates run across a process pool.
+
+    python hotspots.py                        resilience_score Gi*, 999-replicate scan
+    python hotspots.py --lila-only --permutations 99
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+from scipy.special import xlogy
+
+import burden_model
+import crosswalk
+import shared_arrays
+import spatial_stats
+import tract_store
+
+OUTPUT_DIR = 'data/processed/hotspots'
+CLUSTERS_GEOJSON = 'figures/hotspot_clusters.geojson'
+K_NEIGHBOURS = 8
+ALPHA = 0.05
+MAX_WINDOW = 250      # tracts in the largest scan window (~ a metro area)
+MAX_CLUSTERS = 20
+PERMUTATIONS = 999
+SEED = 20190101
+BATCH = 25            # replicates per pool task
+CHUNK_ELEMENTS = 1 << 23  # replicates x centres x window slots held at once
+EARTH_RADIUS_KM = 6371.0
+
+
+# --- Getis-Ord Gi* -------------------------------------------------------
+
+def gi_star_weights(lat, lon, k=K_NEIGHBOURS):
+    """Binary kNN weights with each tract its own neighbour, as Gi* requires"""
+    W = spatial_stats.knn_weights(lat, lon, k=k, row_standardize=False)
+    return (W + sparse.identity(W.shape[0], format='csr')).tocsr()
+
+
+def getis_ord_gi_star(values, W):
+    """
+    Gi* z-scores (Getis & Ord 1995) for every tract
+
+    Each is the standardized difference between the weighted sum over a
+    tract's neighbourhood (itself included) and its expectation under
+    spatial randomness.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    xbar = x.mean()
+    s = np.sqrt((x @ x) / n - xbar ** 2)
+    wi = np.asarray(W.sum(axis=1)).ravel()
+    s1 = np.asarray(W.multiply(W).sum(axis=1)).ravel()
+    den = s * np.sqrt((n * s1 - wi ** 2) / (n - 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(den > 0, (W @ x - xbar * wi) / den, 0.0)
+
+
+def fdr_adjust(p):
+    """Benjamini-Hochberg adjusted p-values"""
+    p = np.asarray(p, dtype=np.float64)
+    n = len(p)
+    order = np.argsort(p)
+    ranked = p[order] * n / np.arange(1, n + 1)
+    adjusted = np.empty(n)
+    adjusted[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return adjusted
+
+
+def gi_clusters(tracts, W):
+    """
+    Label connected groups of significant hot or cold tracts
+
+    Tracts are joined when either lists the other as a neighbour. Returns
+    (cluster id per tract, '' outside clusters; summary ranked by size).
+    """
+    graph = (W + W.T).tocsr()
+    labels = np.full(len(tracts), '', dtype=object)
+    rows = []
+    for kind in ('hot', 'cold'):
+        members = np.flatnonzero(tracts['hotspot'].to_numpy() == kind)
+        if not len(members):
+            continue
+        _, comp = connected_components(graph[members][:, members], directed=False)
+        sizes = np.bincount(comp)
+        rank = np.empty(len(sizes), dtype=np.int64)
+        rank[np.argsort(-sizes, kind='stable')] = np.arange(1, len(sizes) + 1)
+        labels[members] = [f"{kind}-{r}" for r in rank[comp]]
+        part = tracts.iloc[members].assign(cluster=labels[members])
+        for cluster, group in part.groupby('cluster', sort=False):
+            states = group['StateAbbr'].value_counts()
+            rows.append({'cluster': cluster, 'type': kind, 'rank': int(cluster.split('-')[1]),
+                         'tracts': len(group), 'mean_gi_z': group['gi_z'].mean(),
+                         'mean_value': group['value'].mean(),
+                         'latitude': group['latitude'].mean(),
+                         'longitude': group['longitude'].mean(),
+                         'states': ', '.join(f"{s} {n}" for s, n in states.head(5).items())})
+    summary = pd.DataFrame(rows, columns=['cluster', 'type', 'rank', 'tracts', 'mean_gi_z',
+                                          'mean_value', 'latitude', 'longitude', 'states'])
+    return labels, summary.sort_values(['type', 'rank'], ascending=[False, True],
+                                       ignore_index=True)
+
+
+# --- Bernoulli spatial scan ----------------------------------------------
+
+def llr_table(cases, n, max_window):
+    """
+    Bernoulli log likelihood ratio for every (window cases, window size)
+
+    table[c, m - 1] for a window of m tracts holding c of the cases total
+    cases among n tracts; 0 unless the window's case rate exceeds the rate
+    outside it (high clusters only). Replicates keep the totals fixed, so
+    one table serves the observed data and every replicate.
+    """
+    c = np.arange(max_window + 1, dtype=np.float64)[:, None]
+    m = np.arange(1, max_window + 1, dtype=np.float64)[None, :]
+    valid = (c <= m) & (c <= cases) & (cases - c <= n - m)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inside = np.where(valid, c / m, 0.0)
+        outside = np.where(valid & (n > m), (cases - c) / np.maximum(n - m, 1), 0.0)
+        llr = (xlogy(c, inside) + xlogy(m - c, 1 - inside) + xlogy(cases - c, outside)
+               + xlogy(n - m - cases + c, 1 - outside))
+    null = xlogy(cases, cases / n) + xlogy(n - cases, 1 - cases / n)
+    return np.where(valid & (inside > outside), llr - null, 0.0)
+
+
+def scan_windows(xyz, cases, max_window):
+    """
+    Neighbour lists and each centre's best window
+
+    Returns (neighbours, best_size, best_llr, radius): neighbours[i] holds
+    the max_window tracts nearest tract i (itself first) as int32, so the
+    window of size m around i is neighbours[i, :m].
+    """
+    n = len(xyz)
+    K = min(max_window, n)
+    table = llr_table(int(cases.sum()), n, K)
+    tree = cKDTree(xyz)
+    neighbours = np.empty((n, K), dtype=np.int32)
+    best_size = np.empty(n, dtype=np.int64)
+    best_llr = np.empty(n)
+    radius = np.empty(n)
+    step = max(1, CHUNK_ELEMENTS // K)
+    slots = np.arange(K)
+    for lo in range(0, n, step):
+        dist, idx = tree.query(xyz[lo:lo + step], k=K)
+        dist, idx = dist.reshape(len(idx), K), idx.reshape(len(idx), K)
+        neighbours[lo:lo + len(idx)] = idx
+        llr = table[np.cumsum(cases[idx], axis=1, dtype=np.int16), slots]
+        best = llr.argmax(axis=1)
+        rows = np.arange(len(idx))
+        best_size[lo:lo + len(idx)] = best + 1
+        best_llr[lo:lo + len(idx)] = llr[rows, best]
+        radius[lo:lo + len(idx)] = 2 * EARTH_RADIUS_KM * np.arcsin(dist[rows, best] / 2)
+    return neighbours, best_size, best_llr, radius
+
+
+def _replicate_max_llr(task):
+    """
+    Worker: largest window LLR in each of a batch of null replicates
+
+    Cases are placed at random with the observed total. For each window
+    size the LLR grows with the case count, so the replicate maximum needs
+    only the largest count at each size over all centres, accumulated one
+    (replicates x centres x sizes) block at a time.
+    """
+    first, count, seed, n_cases = task
+    data = shared_arrays.ATTACHED
+    neighbours, table = data['neighbours'], data['table']
+    n, K = neighbours.shape
+    rng = np.random.default_rng(seed)
+    cases = np.zeros((count, n), dtype=np.uint8)
+    for b in range(count):
+        cases[b, rng.choice(n, size=n_cases, replace=False)] = 1
+    most = np.zeros((count, K), dtype=np.int16)
+    step = max(1, CHUNK_ELEMENTS // (count * K))
+    for lo in range(0, n, step):
+        windows = np.cumsum(cases[:, neighbours[lo:lo + step]], axis=2, dtype=np.int16)
+        np.maximum(most, windows.max(axis=1), out=most)
+    return first, table[most, np.arange(K)].max(axis=1)
+
+
+def monte_carlo_llr(neighbours, n_cases, table, permutations=PERMUTATIONS, seed=SEED,
+                    max_workers=None, batch=BATCH):
+    """Maximum window LLR of each null replicate, computed across a process pool"""
+    sims = np.empty(permutations)
+    if permutations == 0:
+        return sims
+    seeds = np.random.SeedSequence(seed).spawn(-(-permutations // batch))
+    tasks = [(first, min(batch, permutations - first), s, n_cases)
+             for first, s in zip(range(0, permutations, batch), seeds)]
+    blocks, spec = shared_arrays.share_arrays({'neighbours': neighbours, 'table': table})
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=shared_arrays.attach_arrays,
+                                 initargs=(spec,)) as pool:
+            done = 0
+            for first, values in pool.map(_replicate_max_llr, tasks):
+                sims[first:first + len(values)] = values
+                done += len(values)
+                if done % (10 * batch) == 0 or done == permutations:
+                    print(f"  {done:,}/{permutations:,} replicates", flush=True)
+    finally:
+        shared_arrays.release(blocks)
+    return sims
+
+
+def select_clusters(neighbours, best_size, best_llr, max_clusters=MAX_CLUSTERS):
+    """
+    Most likely cluster and secondary clusters that overlap no better one
+
+    Returns [(centre, size)] in decreasing LLR order.
+    """
+    covered = np.zeros(len(best_llr), dtype=bool)
+    chosen = []
+    for centre in np.argsort(-best_llr, kind='stable'):
+        if best_llr[centre] <= 0 or len(chosen) == max_clusters:
+            break
+        members = neighbours[centre, :best_size[centre]]
+        if covered[members].any():
+            continue
+        covered[members] = True
+        chosen.append((centre, best_size[centre]))
+    return chosen
+
+
+def bernoulli_scan(tracts, cases, max_window=MAX_WINDOW, permutations=PERMUTATIONS, seed=SEED,
+                   max_workers=None, max_clusters=MAX_CLUSTERS):
+    """
+    Kulldorff circular scan for a 0/1 case indicator over located tracts
+
+    tracts needs GEOID, StateAbbr, latitude and longitude. Returns
+    (clusters ranked by LLR, their member tracts). p_value compares each
+    cluster's LLR with the replicate maxima, the usual conservative test for
+    secondary clusters.
+    """
+    cases = np.asarray(cases, dtype=np.uint8)
+    n, n_cases = len(cases), int(cases.sum())
+    if n_cases == 0 or n_cases == n:
+        raise ValueError("the scan needs both cases and non-cases")
+    xyz = spatial_stats.unit_sphere_xyz(tracts['latitude'], tracts['longitude'])
+    neighbours, best_size, best_llr, radius = scan_windows(xyz, cases, max_window)
+    chosen = select_clusters(neighbours, best_size, best_llr, max_clusters)
+    table = llr_table(n_cases, n, neighbours.shape[1])
+    sims = monte_carlo_llr(neighbours, n_cases, table, permutations, seed, max_workers)
+
+    geoids, states = tracts['GEOID'].to_numpy(), tracts['StateAbbr'].to_numpy()
+    rows, members = [], []
+    for rank, (centre, size) in enumerate(chosen, 1):
+        inside = neighbours[centre, :size]
+        c = int(cases[inside].sum())
+        llr = best_llr[centre]
+        counts = pd.Series(states[inside]).value_counts()
+        rows.append({'rank': rank, 'center_GEOID': geoids[centre],
+                     'latitude': tracts['latitude'].iat[centre],
+                     'longitude': tracts['longitude'].iat[centre],
+                     'radius_km': radius[centre], 'tracts': int(size), 'cases': c,
+                     'expected': size * n_cases / n,
+                     'relative_risk': (c / size) / ((n_cases - c) / (n - size)),
+                     'llr': llr,
+                     'p_value': (1 + (sims >= llr).sum()) / (permutations + 1)
+                     if permutations else np.nan,
+                     'states': ', '.join(f"{s} {k}" for s, k in counts.head(5).items())})
+        members.append(pd.DataFrame({'rank': rank, 'GEOID': geoids[inside],
+                                     'StateAbbr': states[inside], 'case': cases[inside]}))
+    clusters = pd.DataFrame(rows)
+    members = (pd.concat(members, ignore_index=True) if members
+               else pd.DataFrame(columns=['rank', 'GEOID', 'StateAbbr', 'case']))
+    return clusters, members
+
+
+def circle_polygon(lat, lon, radius_km, points=64):
+    """Closed [lon, lat] ring at a great-circle radius around a point"""
+    phi, lam = np.radians(lat), np.radians(lon)
+    delta = radius_km / EARTH_RADIUS_KM
+    bearing = np.linspace(0, 2 * np.pi, points + 1)
+    lat2 = np.arcsin(np.sin(phi) * np.cos(delta) + np.cos(phi) * np.sin(delta) * np.cos(bearing))
+    lon2 = lam + np.arctan2(np.sin(bearing) * np.sin(delta) * np.cos(phi),
+                            np.cos(delta) - np.sin(phi) * np.sin(lat2))
+    ring = np.column_stack([np.degrees(lon2), np.degrees(lat2)]).round(5)
+    ring[-1] = ring[0]
+    return ring.tolist()
+
+
+def write_cluster_geojson(clusters, path=CLUSTERS_GEOJSON):
+    """Scan windows as circle polygons with their statistics"""
+    features = []
+    for row in clusters.itertuples(index=False):
+        # Single-tract windows have zero radius; draw them as points
+        geometry = ({'type': 'Polygon',
+                     'coordinates': [circle_polygon(row.latitude, row.longitude, row.radius_km)]}
+                    if row.radius_km > 0 else
+                    {'type': 'Point', 'coordinates': [round(row.longitude, 5),
+                                                      round(row.latitude, 5)]})
+        props = {'rank': row.rank, 'center_GEOID': row.center_GEOID, 'tracts': row.tracts,
+                 'cases': row.cases, 'relative_risk': round(float(row.relative_risk), 3),
+                 'llr': round(float(row.llr), 3),
+                 'p_value': None if pd.isna(row.p_value) else round(float(row.p_value), 4),
+                 'states': row.states}
+        features.append({'type': 'Feature', 'properties': props, 'geometry': geometry})
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f, separators=(',', ':'))
+
+
+# --- Driver --------------------------------------------------------------
+
+def located_tracts(column='resilience_score', top_pct=0.10, lila_only=False, centroids=None):
+    """
+    Model tracts with centroids, the value for Gi* and the resilient-LILA flag
+
+    The flag uses the rule of extract_all_resilient.py: LILA and above the
+    (1 - top_pct) score quantile of all model tracts. With lila_only only
+    LILA tracts are kept, so the scan asks where LILA tracts are unusually
+    often resilient rather than where resilient LILA tracts are numerous.
+    """
+    cols = ['LILATracts_1And10'] if column in ('resilience_score', 'burden', 'resid') \
+        else ['LILATracts_1And10', column]
+    merged = crosswalk.load_merged(cols)
+    threshold = merged['resilience_score'].quantile(1 - top_pct)
+    lila = merged['LILATracts_1And10'] == 1
+    tracts = pd.DataFrame({'GEOID': merged['GEOID'].to_numpy(),
+                           'StateAbbr': merged['StateAbbr'].to_numpy(),
+                           'value': merged[column].to_numpy(dtype=np.float64),
+                           'lila': lila.to_numpy(),
+                           'resilient_lila': (lila & (merged['resilience_score'] > threshold))
+                           .to_numpy()})
+    if lila_only:
+        tracts = tracts[tracts['lila']]
+    centroids = tract_store.load_centroids() if centroids is None else centroids
+    tracts = tracts.merge(centroids[['GEOID', 'latitude', 'longitude']], on='GEOID', how='left')
+    keep = tracts['latitude'].notna() & tracts['value'].notna()
+    return tracts[keep].reset_index(drop=True), int((~keep).sum())
+
+
+def run_hotspots(column='resilience_score', k=K_NEIGHBOURS, alpha=ALPHA, max_window=MAX_WINDOW,
+                 permutations=PERMUTATIONS, lila_only=False, max_workers=None,
+                 output_dir=OUTPUT_DIR, geojson_path=CLUSTERS_GEOJSON, config=None):
+    """Gi* and scan statistics; writes the tract, cluster and polygon outputs"""
+    config = config or burden_model.load_model_config()
+    tracts, dropped = located_tracts(column, config.get('top_pct', 0.10), lila_only)
+    print(f"{len(tracts):,} located tracts ({dropped:,} without a centroid or value)")
+
+    start = time.perf_counter()
+    W = gi_star_weights(tracts['latitude'], tracts['longitude'], k)
+    tracts['gi_z'] = getis_ord_gi_star(tracts['value'], W)
+    tracts['gi_p'] = 2 * stats.norm.sf(np.abs(tracts['gi_z']))
+    tracts['gi_p_fdr'] = fdr_adjust(tracts['gi_p'])
+    significant = tracts['gi_p_fdr'] < alpha
+    tracts['hotspot'] = np.where(significant, np.where(tracts['gi_z'] > 0, 'hot', 'cold'), 'none')
+    tracts['gi_cluster'], gi_summary = gi_clusters(tracts, W)
+    print(f"Gi* on {column}: {(tracts['hotspot'] == 'hot').sum():,} hot and "
+          f"{(tracts['hotspot'] == 'cold').sum():,} cold tracts at FDR {alpha} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    start = time.perf_counter()
+    print(f"Scanning {int(tracts['resilient_lila'].sum()):,} resilient LILA tracts, windows up "
+          f"to {max_window} tracts, {permutations:,} replicates...")
+    clusters, members = bernoulli_scan(tracts, tracts['resilient_lila'], max_window,
+                                       permutations, max_workers=max_workers)
+    print(f"Scan finished in {time.perf_counter() - start:.1f}s")
+
+    os.makedirs(output_dir, exist_ok=True)
+    tracts.to_csv(os.path.join(output_dir, 'gi_star.csv'), index=False, float_format='%.6g')
+    gi_summary.to_csv(os.path.join(output_dir, 'gi_clusters.csv'), index=False,
+                      float_format='%.4f')
+    clusters.to_csv(os.path.join(output_dir, 'scan_clusters.csv'), index=False,
+                    float_format='%.4f')
+    members.to_csv(os.path.join(output_dir, 'scan_cluster_tracts.csv'), index=False)
+    write_cluster_geojson(clusters, geojson_path)
+    return tracts, gi_summary, clusters, members
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--column', default='resilience_score', help='model column for Gi*')
+    parser.add_argument('--k', type=int, default=K_NEIGHBOURS, help='Gi* neighbours per tract')
+    parser.add_argument('--alpha', type=float, default=ALPHA, help='FDR level for Gi* hotspots')
+    parser.add_argument('--max-window', type=int, default=MAX_WINDOW,
+                        help='tracts in the largest scan window')
+    parser.add_argument('--permutations', type=int, default=PERMUTATIONS)
+    parser.add_argument('--lila-only', action='store_true',
+                        help='scan LILA tracts only (resilient vs not resilient)')
+    parser.add_argument('--workers', type=int, help='scan replicate processes')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("HOTSPOTS: GETIS-ORD GI* AND BERNOULLI SCAN")
+    print("=" * 60)
+    tracts, gi_summary, clusters, members = run_hotspots(
+        args.column, args.k, args.alpha, args.max_window, args.permutations, args.lila_only,
+        args.workers)
+    print("\nLargest Gi* hot spots:")
+    print(gi_summary[gi_summary['type'] == 'hot'].head(10)[['cluster', 'tracts', 'mean_gi_z',
+                                                            'states']].to_string(index=False))
+    print("\nResilient LILA scan clusters:")
+    if len(clusters):
+        print(clusters.head(10)[['rank', 'tracts', 'cases', 'expected', 'relative_risk', 'llr',
+                                 'p_value', 'states']].round(3).to_string(index=False))
+    print(f"\nSaved: {OUTPUT_DIR}/gi_star.csv, gi_clusters.csv, scan_clusters.csv, "
+          f"scan_cluster_tracts.csv and {CLUSTERS_GEOJSON}")
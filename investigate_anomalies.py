@@ -7,6 +7,8 @@ import pandas as pd
 import numpy as np
 import json
 from scipy import stats
+import crosswalk
+import twin_matching
 
 def investigate_all_anomalies():
     """
@@ -19,25 +21,17 @@ def investigate_all_anomalies():
     
     # Load all datasets
     resilient = pd.read_csv('data/processed/all_1059_resilient_FINAL_with_coordinates.csv')
-    all_results = pd.read_csv('data/processed/model_table_with_residuals.csv')
-    fara = pd.read_csv('data/interim/fara_2019.csv')
     least_resilient = pd.read_csv('data/processed/least_resilient_lila_tracts.csv')
     
-    # Prepare for analysis
-    fara['GEOID'] = fara['CensusTract'].astype(str).str.zfill(11)
-    all_results['GEOID'] = all_results['GEOID'].astype(str).str.zfill(11)
-    
     # Merge everything
-    full_data = all_results.merge(
-        fara[['GEOID', 'LILATracts_1And10', 'LILATracts_halfAnd10', 
-              'LILATracts_1And20', 'LILATracts_Vehicle',
-              'County', 'State', 'PovertyRate', 'MedianFamilyIncome', 
-              'Pop2010', 'Urban', 'LowIncomeTracts', 'GroupQuartersFlag',
-              'PCTGQTRS', 'TractLOWI', 'TractKids', 'TractSeniors',
-              'TractWhite', 'TractBlack', 'TractAsian', 'TractHispanic',
-              'TractSNAP', 'lahunvhalf', 'lahunv1', 'lahunv10']],
-        on='GEOID',
-        how='left'
+    full_data = crosswalk.load_merged(
+        ['LILATracts_1And10', 'LILATracts_halfAnd10',
+         'LILATracts_1And20', 'LILATracts_Vehicle',
+         'County', 'State', 'PovertyRate', 'MedianFamilyIncome',
+         'Pop2010', 'Urban', 'LowIncomeTracts', 'GroupQuartersFlag',
+         'PCTGQTRS', 'TractLOWI', 'TractKids', 'TractSeniors',
+         'TractWhite', 'TractBlack', 'TractAsian', 'TractHispanic',
+         'TractSNAP', 'lahunvhalf', 'lahunv1', 'lahunv10']
     )
     
     # All LILA tracts
@@ -225,28 +219,25 @@ def investigate_all_anomalies():
     print("="*60)
     
     # Find similar tracts with opposite outcomes
-    # Match on: poverty rate, population, urban/rural
-    
-    twins = []
-    for _, tract in resilient_lila.iterrows():
-        # Find vulnerable tract with similar characteristics
-        matches = vulnerable_lila[
-            (abs(vulnerable_lila['PovertyRate'] - tract['PovertyRate']) < 5) &
-            (abs(vulnerable_lila['Pop2010'] - tract['Pop2010']) < 500) &
-            (vulnerable_lila['Urban'] == tract['Urban'])
-        ]
-        
-        if len(matches) > 0:
-            best_match = matches.iloc[0]
-            twins.append({
-                'resilient_tract': tract['TractFIPS'],
-                'resilient_state': tract['StateAbbr'],
-                'vulnerable_tract': best_match['TractFIPS'],
-                'vulnerable_state': best_match['StateAbbr'],
-                'poverty_rate': tract['PovertyRate'],
-                'population': tract['Pop2010'],
-                'resilience_diff': tract['resilience_score'] - best_match['resilience_score']
-            })
+    # Match on: poverty rate, population (standardized), exact on urban/rural,
+    # keeping the closest vulnerable twin within the original calipers
+    pairs = twin_matching.match_twins(
+        resilient_lila, vulnerable_lila,
+        covariates=['PovertyRate', 'Pop2010'], exact=['Urban'], k=1,
+        calipers={'PovertyRate': 5, 'Pop2010': 500}
+    )
+    tract = resilient_lila.loc[pairs['treated_index']].reset_index(drop=True)
+    best_match = vulnerable_lila.loc[pairs['pool_index']].reset_index(drop=True)
+    twins = pd.DataFrame({
+        'resilient_tract': tract['TractFIPS'],
+        'resilient_state': tract['StateAbbr'],
+        'vulnerable_tract': best_match['TractFIPS'],
+        'vulnerable_state': best_match['StateAbbr'],
+        'poverty_rate': tract['PovertyRate'],
+        'population': tract['Pop2010'],
+        'match_distance': pairs['distance'],
+        'resilience_diff': tract['resilience_score'] - best_match['resilience_score']
+    }).to_dict('records')
     
     if twins:
         twins_df = pd.DataFrame(twins)
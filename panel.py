@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Multi-year panel of PLACES releases and FARA vintages
+Ingests every configured vintage into the tract store as year-partitioned
+Parquet (panel/<table>/year=YYYY/part-0.parquet), crosswalks each to one
+tract geography, fits the expected-burden model for every PLACES year in
+parallel and writes per-year scores plus change-over-time summaries.
+
+    python panel.py            ingest stale vintages, fit every year
+    python panel.py --ingest   ingest only
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import yaml
+
+import burden_model
+import compact_types
+import crosswalk
+import places_store
+import tract_store
+
+CONFIG_PATH = 'config/default.yml'
+PANEL_DIR = os.path.join(tract_store.STORE_DIR, 'panel')
+PLACES_CACHE_DIR = os.path.join(places_store.CACHE_DIR, 'panel')
+OUTPUT_DIR = 'data/processed/panel'
+MANIFEST = '_manifest.json'  # the leading underscore keeps it out of pyarrow datasets
+LILA_LABEL = dict(burden_model.COVARIATES)['LILATracts_1And10']
+
+
+def load_panel_config(path=CONFIG_PATH):
+    """The panel section of config/default.yml, with integer year keys"""
+    with open(path) as f:
+        panel = yaml.safe_load(f)['panel']
+    for table in ('places', 'fara'):
+        panel[table] = {int(year): spec for year, spec in panel[table].items()}
+    return panel
+
+
+def partition_path(table, year, panel_dir=PANEL_DIR):
+    """Directory holding one year of a panel table"""
+    return os.path.join(panel_dir, table, f"year={year}")
+
+
+def _part_file(table, year, panel_dir):
+    return os.path.join(partition_path(table, year, panel_dir), 'part-0.parquet')
+
+
+def _write_partition(df, table, year, panel_dir=PANEL_DIR):
+    os.makedirs(partition_path(table, year, panel_dir), exist_ok=True)
+    df.to_parquet(_part_file(table, year, panel_dir), index=False)
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def _partition_manifest(table, spec, outcomes, tract_vintage, crosswalk_path):
+    """Everything an ingested partition depends on besides the code"""
+    crosswalked = spec['tracts'] != tract_vintage
+    return {
+        'source': _signature(spec['path']),
+        'source_vintage': spec['tracts'],
+        'tract_vintage': tract_vintage,
+        'crosswalk': _signature(crosswalk_path) if crosswalked else None,
+        'outcomes': sorted(outcomes) if table == 'places' else None,
+    }
+
+
+def _manifest_path(table, year, panel_dir):
+    return os.path.join(partition_path(table, year, panel_dir), MANIFEST)
+
+
+def _is_current(manifest, table, year, panel_dir):
+    """True when the partition was ingested from the same source, outcomes and geography"""
+    path = _manifest_path(table, year, panel_dir)
+    if not os.path.exists(_part_file(table, year, panel_dir)) or not os.path.exists(path):
+        return False
+    with open(path) as f:
+        return json.load(f) == manifest
+
+
+def _write_manifest(manifest, table, year, panel_dir):
+    # Written after the partition, so an interrupted ingest is redone
+    path = _manifest_path(table, year, panel_dir)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def ingest_places(year, spec, outcomes, tract_vintage, crosswalk_path, panel_dir=PANEL_DIR):
+    """One PLACES release as a wide GEOID x outcome table on the panel geography"""
+    measures = {burden_model.OUTCOME_MEASURES[o]: o for o in outcomes}
+    cache_dir = os.path.join(PLACES_CACHE_DIR, str(year))
+    population = places_store.POPULATION_COLUMN
+    places = places_store.load_places(list(measures), ['Data_Value', population],
+                                      source=spec['path'], cache_dir=cache_dir)
+    wide = places.pivot_table(index=['LocationID', 'StateAbbr'], columns='MeasureId',
+                              values='Data_Value', observed=True, aggfunc='first')
+    wide = wide.rename(columns=measures).reset_index()
+    wide = wide.rename(columns={'LocationID': 'GEOID'})
+    wide['StateAbbr'] = wide['StateAbbr'].astype(str)
+    wide.columns.name = None
+    # Prevalences are population-weighted when the release reports tract population
+    pop = places.groupby('LocationID', observed=True)[population].max()
+    wide[population] = wide['GEOID'].map(pop).astype('float64')
+    weight = population if wide[population].notna().any() else None
+    wide = crosswalk.translate(wide, spec['tracts'], tract_vintage, counts=[],
+                               population=weight, path=crosswalk_path)
+    wide = wide.drop(columns=population)
+    _write_partition(wide, 'places', year, panel_dir)
+    return len(wide)
+
+
+def ingest_fara(year, spec, tract_vintage, crosswalk_path, panel_dir=PANEL_DIR):
+    """One FARA vintage, typed as in the tract store, on the panel geography"""
+    tmp = _part_file('fara', year, panel_dir) + '.tmp'
+    os.makedirs(os.path.dirname(tmp), exist_ok=True)
+    tract_store.convert_fara(spec['path'], tmp)
+    fara = compact_types.expand_frame(compact_types.read_parquet(tmp))
+    os.remove(tmp)
+    fara = crosswalk.translate(fara, spec['tracts'], tract_vintage,
+                               crosswalk.fara_count_columns(fara.columns), crosswalk.FARA_POPULATION,
+                               path=crosswalk_path)
+    _write_partition(fara, 'fara', year, panel_dir)
+    return len(fara)
+
+
+def ingest(panel=None, outcomes=None, panel_dir=PANEL_DIR, force=False):
+    """
+    Write any missing or stale vintage partitions; returns {(table, year): rows}
+
+    A partition is stale when its source file, the outcomes, the panel tract
+    vintage or (for crosswalked vintages) the relationship file differ from
+    those recorded in its manifest.
+    """
+    panel = panel or load_panel_config()
+    outcomes = outcomes or burden_model.load_model_config()['outcomes']
+    written = {}
+    for table in ('places', 'fara'):
+        for year, spec in sorted(panel[table].items()):
+            manifest = _partition_manifest(table, spec, outcomes, panel['tract_vintage'],
+                                           panel['crosswalk_path'])
+            if not force and _is_current(manifest, table, year, panel_dir):
+                continue
+            print(f"Ingesting {table} {year} from {spec['path']}...")
+            if table == 'places':
+                rows = ingest_places(year, spec, outcomes, panel['tract_vintage'],
+                                     panel['crosswalk_path'], panel_dir)
+            else:
+                rows = ingest_fara(year, spec, panel['tract_vintage'], panel['crosswalk_path'],
+                                   panel_dir)
+            _write_manifest(manifest, table, year, panel_dir)
+            written[(table, year)] = rows
+    return written
+
+
+def panel_years(table, panel_dir=PANEL_DIR):
+    """Years with a partition for table"""
+    root = os.path.join(panel_dir, table)
+    if not os.path.isdir(root):
+        return []
+    return sorted(int(d.split('=')[1]) for d in os.listdir(root) if d.startswith('year='))
+
+
+def load_panel(table, years=None, columns=None, panel_dir=PANEL_DIR):
+    """
+    Rows of a panel table for the given years (all when None), with a year column
+
+    A single year reads only its own partition file; several years go
+    through a hive-partitioned dataset filtered on year.
+    """
+    if isinstance(years, int):
+        years = [years]
+    if years is not None and len(years) == 1:
+        df = pq.read_table(_part_file(table, years[0], panel_dir), columns=columns,
+                           memory_map=True).to_pandas()
+        df['year'] = years[0]
+        return df
+    dataset = ds.dataset(os.path.join(panel_dir, table), format='parquet', partitioning='hive')
+    flt = None if years is None else ds.field('year').isin(list(years))
+    cols = None if columns is None else list(columns) + ['year']
+    return dataset.to_table(columns=cols, filter=flt).to_pandas()
+
+
+def fara_year_for(year, fara_years):
+    """The latest FARA vintage not after year (the earliest if none is)"""
+    earlier = [y for y in fara_years if y <= year]
+    return max(earlier) if earlier else min(fara_years)
+
+
+def fit_year(task):
+    """Worker: fit the expected-burden model for one PLACES year"""
+    year, fara_year, config, panel_dir = task
+    include_no_vehicle = config.get('include_no_vehicle', True)
+    wide = load_panel('places', year, panel_dir=panel_dir).drop(columns='year')
+    wide['burden'] = burden_model.compose_burden(wide, list(config['outcomes']),
+                                                 config.get('burden_method', 'zmean'))
+    wide = wide.rename(columns={'GEOID': 'TractFIPS'})
+    cols = [c for c, _ in burden_model.covariates(include_no_vehicle) if c != 'Rural']
+    fara = load_panel('fara', fara_year, cols + ['GEOID', 'Urban'], panel_dir).drop(columns='year')
+    model_table, result = burden_model.fit_expected_burden(wide, fara, config, se_type='classical')
+    model_table.insert(0, 'year', year)
+    model_table['fara_year'] = fara_year
+    _write_partition(model_table.drop(columns='year'), 'model', year, panel_dir)
+    lila = result['coef'].loc[LILA_LABEL, 'Coefficient']
+    return year, model_table, {'year': year, 'fara_year': fara_year, 'n': result['n'],
+                               'r2': result['r2'], 'lila_coef': lila}
+
+
+def fit_panel(config=None, panel_dir=PANEL_DIR, max_workers=None):
+    """Fit every PLACES year across a process pool; returns (scores, fit summary)"""
+    config = config or burden_model.load_model_config()
+    years = panel_years('places', panel_dir)
+    fara_years = panel_years('fara', panel_dir)
+    if not years or not fara_years:
+        raise FileNotFoundError(f"no panel partitions under {panel_dir}; run ingest() first")
+    tasks = [(year, fara_year_for(year, fara_years), config, panel_dir) for year in years]
+    with ProcessPoolExecutor(max_workers=max_workers or len(tasks)) as pool:
+        results = list(pool.map(fit_year, tasks))
+    scores = pd.concat([table for _, table, _ in results], ignore_index=True)
+    summary = pd.DataFrame([row for _, _, row in results])
+    return scores, summary
+
+
+def change_over_time(scores, top_pct=0.10):
+    """
+    Per-tract scores by year plus first-to-last change
+
+    years_resilient counts the years a tract is above that year's
+    (1 - top_pct) score quantile; rank change is positive when a tract
+    moved up the national ranking.
+    """
+    scores = scores.copy()
+    scores['rank'] = scores.groupby('year')['resilience_score'].rank(ascending=False, method='min')
+    threshold = scores.groupby('year')['resilience_score'].transform(lambda s: s.quantile(1 - top_pct))
+    scores['top'] = scores['resilience_score'] > threshold
+    wide = scores.pivot(index='GEOID', columns='year', values='resilience_score')
+    ranks = scores.pivot(index='GEOID', columns='year', values='rank')
+    years = list(wide.columns)
+    out = pd.DataFrame(index=wide.index)
+    for year in years:
+        out[f"score_{year}"] = wide[year]
+    first, last = years[0], years[-1]
+    out['score_change'] = wide[last] - wide[first]
+    out['rank_change'] = (ranks[first] - ranks[last]).astype('Int64')
+    out['years_observed'] = wide.notna().sum(axis=1)
+    out['years_resilient'] = scores.groupby('GEOID')['top'].sum().reindex(out.index)
+    out['persistently_resilient'] = out['years_resilient'] == len(years)
+    states = scores.drop_duplicates('GEOID').set_index('GEOID')['StateAbbr']
+    out.insert(0, 'StateAbbr', states.reindex(out.index))
+    return out.reset_index()
+
+
+def run_panel(config=None, panel_dir=PANEL_DIR, output_dir=OUTPUT_DIR, max_workers=None):
+    """Ingest, fit every year and write the change-over-time outputs"""
+    config = config or burden_model.load_model_config()
+    ingest(outcomes=config['outcomes'], panel_dir=panel_dir)
+    scores, summary = fit_panel(config, panel_dir, max_workers)
+    change = change_over_time(scores, config.get('top_pct', 0.10))
+    os.makedirs(output_dir, exist_ok=True)
+    summary.to_csv(os.path.join(output_dir, 'fit_by_year.csv'), index=False)
+    change.to_csv(os.path.join(output_dir, 'resilience_change.csv'), index=False,
+                  float_format='%.4f')
+    return scores, summary, change
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ingest', action='store_true', help='ingest vintages without fitting')
+    parser.add_argument('--force', action='store_true', help='re-ingest every vintage')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("PANEL: RESILIENCE BY YEAR")
+    print("=" * 60)
+    if args.ingest or args.force:
+        for (table, year), rows in ingest(force=args.force).items():
+            print(f"  {table} {year}: {rows:,} tracts")
+    if not args.ingest:
+        scores, summary, change = run_panel()
+        print("\nModel fit by year:")
+        print(summary.round(4).to_string(index=False))
+        print(f"\nTracts observed in every year: "
+              f"{(change['years_observed'] == len(summary)).sum():,}")
+        print(f"Persistently resilient tracts: {change['persistently_resilient'].sum():,}")
+        print(f"\nSaved {OUTPUT_DIR}/fit_by_year.csv and resilience_change.csv")
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Incremental pipeline runner for the Python analysis scripts
+Each step declares its input and output files; a step is skipped when the
+content hashes of its inputs, its script and the local modules it imports
+match the last successful run and its outputs are unchanged. Independent
+steps run in parallel, and a step whose upstream re-ran but produced
+byte-identical outputs is still skipped.
+
+    python pipeline.py                  run every stale step
+    python pipeline.py generate_tables  run one step (and stale upstream steps)
+    python pipeline.py --dry-run        show what would run
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+STATE_PATH = 'data/interim/pipeline_state.json'
+LOG_DIR = 'data/interim/pipeline_logs'
+
+MODEL_CSV = 'data/processed/model_table_with_residuals.csv'
+BURDEN_CSV = 'data/processed/burden_table.csv'
+FARA_CSV = 'data/interim/fara_2019.csv'
+PLACES_CSV = 'data/raw/places_tract.csv'
+CONFIG = 'config/default.yml'
+GAZETTEER_ZIP = 'data/census_gazetteer/tracts.zip'
+RESILIENT_CSV = 'data/processed/all_1059_resilient_lila_communities.csv'
+FINAL_CSV = 'data/processed/all_1059_resilient_FINAL_with_coordinates.csv'
+LEAST_CSV = 'data/processed/least_resilient_lila_tracts.csv'
+TRACTS_GEOJSON = 'data/external/tracts_full.geojson'
+CROSSWALK_TXT = 'data/external/tab20_tract20_tract10_natl.txt'
+# Shared caches built by their own steps so parallel steps only ever read them
+TRACT_STORE = ['data/interim/tract_store/model.parquet', 'data/interim/tract_store/fara.parquet']
+PLACES_CACHE = 'data/interim/places_store/manifest.json'
+
+# Inputs produced by the Go CLI (resilience data/model) or downloaded are
+# sources; every other input must be an output of an earlier step.
+STEPS = [
+    {'name': 'tract_store', 'script': 'tract_store.py',
+     'inputs': [MODEL_CSV, FARA_CSV],
+     'outputs': TRACT_STORE},
+    {'name': 'places_store', 'script': 'places_store.py',
+     'inputs': [PLACES_CSV],
+     'outputs': [PLACES_CACHE]},
+    {'name': 'extract_all_resilient', 'script': 'extract_all_resilient.py',
+     'inputs': [*TRACT_STORE, MODEL_CSV, FARA_CSV],
+     'outputs': [RESILIENT_CSV, 'data/processed/top_counties_resilient_lila.csv']},
+    {'name': 'crosswalk', 'script': 'crosswalk.py',
+     'inputs': [*TRACT_STORE, MODEL_CSV, FARA_CSV],
+     'outputs': ['data/processed/crosswalk_match_rates.csv']},
+    {'name': 'get_cities', 'script': 'get_cities_census.py',
+     'inputs': [RESILIENT_CSV, GAZETTEER_ZIP],
+     'outputs': ['data/processed/all_1059_resilient_with_cities_approx.csv']},
+    {'name': 'analyze_least_resilient', 'script': 'analyze_least_resilient.py',
+     'inputs': [*TRACT_STORE, FINAL_CSV, MODEL_CSV, FARA_CSV, GAZETTEER_ZIP],
+     'outputs': [LEAST_CSV]},
+    {'name': 'investigate_anomalies', 'script': 'investigate_anomalies.py',
+     'inputs': [*TRACT_STORE, FINAL_CSV, LEAST_CSV, MODEL_CSV, FARA_CSV],
+     'outputs': ['data/processed/anomaly_findings.json', 'data/processed/clean_resilient_lila.csv',
+                 'data/processed/clean_vulnerable_lila.csv']},
+    {'name': 'generate_tables', 'script': 'generate_tables.py',
+     'inputs': [*TRACT_STORE, PLACES_CACHE, MODEL_CSV, BURDEN_CSV, FARA_CSV, PLACES_CSV, CONFIG,
+                GAZETTEER_ZIP],
+     'outputs': [f"tables/{name}.{ext}" for name in
+                 ['table1_descriptive_stats', 'table2_regression', 'table3_state_resilience',
+                  'top_20_resilient_lila', 'correlation_matrix', 'quantile_regression']
+                 for ext in ('csv', 'tex')] +
+                ['tables/spatial_autocorrelation.csv', 'tables/morans_i_global.csv',
+                 'data/processed/lisa_residuals.csv']},
+    {'name': 'analyze_resilience', 'script': 'analyze_resilience.py',
+     'inputs': [*TRACT_STORE, PLACES_CACHE, MODEL_CSV, FARA_CSV, PLACES_CSV],
+     'outputs': ['figures/resilience_analysis.png', 'data/processed/bivariate_map_data.csv',
+                 'data/processed/case_study_candidates.csv']},
+    {'name': 'sensitivity', 'script': 'sensitivity.py',
+     'inputs': [*TRACT_STORE, BURDEN_CSV, MODEL_CSV, FARA_CSV, CONFIG],
+     'outputs': ['data/processed/sensitivity/scenario_summary.csv',
+                 'data/processed/sensitivity/tract_scores.parquet',
+                 'data/processed/sensitivity/resilient_membership.parquet']},
+    {'name': 'bootstrap', 'script': 'bootstrap.py',
+     'inputs': [*TRACT_STORE, BURDEN_CSV, FARA_CSV, CONFIG],
+     'outputs': ['data/processed/bootstrap/tract_intervals.csv',
+                 'data/processed/bootstrap/coefficients.csv']},
+    {'name': 'burden_simulation', 'script': 'burden_simulation.py',
+     'inputs': [*TRACT_STORE, PLACES_CACHE, BURDEN_CSV, FARA_CSV, PLACES_CSV, CONFIG],
+     'outputs': ['data/processed/burden_uncertainty.csv']},
+    {'name': 'panel', 'script': 'panel.py',
+     'inputs': [*TRACT_STORE, PLACES_CSV, FARA_CSV, CROSSWALK_TXT, CONFIG],
+     'outputs': ['data/processed/panel/fit_by_year.csv',
+                 'data/processed/panel/resilience_change.csv']},
+    {'name': 'spatial_regression', 'script': 'spatial_regression.py',
+     'inputs': [*TRACT_STORE, BURDEN_CSV, MODEL_CSV, FARA_CSV, GAZETTEER_ZIP, CONFIG],
+     'outputs': ['data/processed/spatial_model_scores.csv', 'tables/spatial_regression.csv']},
+    {'name': 'gwr', 'script': 'gwr.py',
+     'inputs': [*TRACT_STORE, BURDEN_CSV, FARA_CSV, GAZETTEER_ZIP, CONFIG],
+     'outputs': ['data/processed/gwr/local_coefficients.csv',
+                 'data/processed/gwr/bandwidth_search.csv', 'tables/gwr_summary.csv']},
+    {'name': 'hotspots', 'script': 'hotspots.py',
+     'inputs': [*TRACT_STORE, MODEL_CSV, FARA_CSV, GAZETTEER_ZIP, CONFIG],
+     'outputs': [f"data/processed/hotspots/{name}.csv" for name in
+                 ['gi_star', 'gi_clusters', 'scan_clusters', 'scan_cluster_tracts']] +
+                ['figures/hotspot_clusters.geojson']},
+    {'name': 'geojson_join', 'script': 'geojson_stream.py',
+     'inputs': [*TRACT_STORE, TRACTS_GEOJSON, MODEL_CSV],
+     'outputs': ['figures/resilience.geojson']},
+    {'name': 'vector_tiles', 'script': 'vector_tiles.py',
+     'inputs': [*TRACT_STORE, TRACTS_GEOJSON, MODEL_CSV, FARA_CSV, CONFIG],
+     'outputs': ['figures/tiles/metadata.json', 'figures/index.html']},
+]
+
+
+def local_modules(script, root='.'):
+    """The script plus every repo module it imports, transitively"""
+    seen, todo = set(), [script]
+    while todo:
+        path = todo.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.add(path)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = os.path.join(root, name.split('.')[0] + '.py')
+                if os.path.exists(candidate):
+                    todo.append(os.path.normpath(candidate))
+    return sorted(seen)
+
+
+class FileHasher:
+    """sha256 of files, reusing the previous digest while mtime and size are unchanged"""
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+        self.lock = threading.Lock()
+
+    def __call__(self, path):
+        st = os.stat(path)
+        with self.lock:
+            entry = self.known.get(path)
+        if entry and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            return entry['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        with self.lock:
+            self.known[path] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size,
+                                'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {'files': {}, 'steps': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def dependencies(steps):
+    """{step: [upstream steps]} from matching inputs to other steps' outputs"""
+    producer = {out: s['name'] for s in steps for out in s['outputs']}
+    return {s['name']: sorted({producer[i] for i in s['inputs'] if i in producer} - {s['name']})
+            for s in steps}
+
+
+def select(steps, targets):
+    """Targets and everything upstream of them, in declaration order"""
+    if not targets:
+        return steps
+    deps = dependencies(steps)
+    unknown = set(targets) - set(deps)
+    if unknown:
+        raise SystemExit(f"Unknown step(s): {', '.join(sorted(unknown))}")
+    wanted, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo += deps[name]
+    return [s for s in steps if s['name'] in wanted]
+
+
+def fingerprint(step, hasher):
+    """Hashes of the step's inputs and code"""
+    paths = sorted(set(step['inputs']) | set(local_modules(step['script'])))
+    return {p: hasher(p) for p in paths}
+
+
+def is_current(step, inputs, record, hasher):
+    """True if the last successful run saw the same inputs and left these outputs"""
+    if not record or record.get('inputs') != inputs:
+        return False
+    outputs = record.get('outputs', {})
+    return all(os.path.exists(p) and outputs.get(p) == hasher(p) for p in step['outputs'])
+
+
+def run_step(step):
+    """Run one script, logging its output; returns (returncode, seconds)"""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    start = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f"{step['name']}.log"), 'w') as log:
+        proc = subprocess.run([sys.executable, step['script']] + step.get('args', []),
+                              stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.perf_counter() - start
+
+
+def run(steps=None, targets=None, force=False, max_workers=None, dry_run=False):
+    """
+    Run stale steps, independent ones in parallel
+
+    A step is considered once all its upstream steps have finished, so its
+    input hashes reflect what they actually wrote. Returns {step: status}
+    with status one of ran, skipped, failed, blocked (an upstream step
+    failed, is blocked or is missing inputs), missing (a source input does
+    not exist) or stale (dry run).
+    """
+    steps = select(steps or STEPS, targets)
+    forced = set(targets or [s['name'] for s in steps]) if force else set()
+    by_name = {s['name']: s for s in steps}
+    deps = dependencies(steps)
+    state = load_state()
+    hasher = FileHasher(state.get('files'))
+    status = {}
+    pending = [s['name'] for s in steps]
+    running = {}
+
+    def report(name, label, detail=''):
+        status[name] = label
+        print(f"  [{label:>7}] {name}{'  ' + detail if detail else ''}", flush=True)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(steps)) as pool:
+        while pending or running:
+            for name in list(pending):
+                if any(d not in status for d in deps[name]):
+                    continue
+                pending.remove(name)
+                step = by_name[name]
+                unavailable = [d for d in deps[name]
+                               if status[d] in ('failed', 'blocked', 'missing')]
+                if unavailable:
+                    report(name, 'blocked', ', '.join(f"{d} {status[d]}" for d in unavailable))
+                    continue
+                # In a dry run, stale upstream steps have not written their outputs yet
+                pending_outputs = {p for d in deps[name] if status[d] == 'stale'
+                                   for p in by_name[d]['outputs']}
+                missing = [p for p in step['inputs']
+                           if not os.path.exists(p) and p not in pending_outputs]
+                if missing:
+                    report(name, 'missing', ', '.join(missing))
+                    continue
+                if pending_outputs:
+                    report(name, 'stale')
+                    continue
+                inputs = fingerprint(step, hasher)
+                if name not in forced and is_current(step, inputs, state['steps'].get(name), hasher):
+                    report(name, 'skipped')
+                elif dry_run:
+                    report(name, 'stale')
+                else:
+                    print(f"  [  start] {name}", flush=True)
+                    running[pool.submit(run_step, step)] = (name, inputs)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, inputs = running.pop(future)
+                returncode, seconds = future.result()
+                if returncode != 0:
+                    report(name, 'failed', f"exit {returncode}, see {LOG_DIR}/{name}.log")
+                    continue
+                state['steps'][name] = {
+                    'inputs': inputs,
+                    'outputs': {p: hasher(p) for p in by_name[name]['outputs'] if os.path.exists(p)},
+                    'seconds': round(seconds, 2),
+                    'finished': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                }
+                state['files'] = hasher.known
+                save_state(state)
+                report(name, 'ran', f"{seconds:.1f}s")
+    state['files'] = hasher.known
+    if not dry_run:
+        save_state(state)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('steps', nargs='*', help='steps to bring up to date (default: all)')
+    parser.add_argument('--force', action='store_true', help='re-run the named steps (default: all)')
+    parser.add_argument('--dry-run', action='store_true', help='report stale steps without running')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='parallel steps')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("RESILIENCE PIPELINE")
+    print("=" * 60)
+    status = run(targets=args.steps, force=args.force, max_workers=args.jobs, dry_run=args.dry_run)
+    counts = {label: list(status.values()).count(label) for label in sorted(set(status.values()))}
+    print("\n" + ", ".join(f"{n} {label}" for label, n in counts.items()))
+    sys.exit(1 if 'failed' in counts else 0)
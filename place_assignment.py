@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Offline tract-to-place assignment
+Assigns every census tract to a Census place (city/town/CDP) with a shapely
+STRtree spatial index over local TIGER/Line Place polygons: centroid
+point-in-polygon by default, or largest area overlap when tract polygons
+are available. No network calls.
+"""
+
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+import tract_store
+
+# National cartographic boundary place file (download once from
+# https://www2.census.gov/geo/tiger/GENZ2019/shp/cb_2019_us_place_500k.zip)
+PLACES_PATH = 'data/tiger_places/cb_2019_us_place_500k.zip'
+OUTPUT_CSV = 'data/processed/tract_places.csv'
+CRS = 'EPSG:4269'  # NAD83, as in the gazetteer and TIGER files
+
+UNASSIGNED = 'Unincorporated/Rural'
+
+
+def load_place_polygons(path=None):
+    """TIGER/Line Place polygons (GEOID, NAME, STATEFP, geometry) in NAD83"""
+    places = gpd.read_file(path or PLACES_PATH)
+    if places.crs is not None and places.crs != CRS:
+        places = places.to_crs(CRS)
+    keep = [c for c in ['GEOID', 'NAME', 'NAMELSAD', 'STATEFP', 'PLACEFP'] if c in places.columns]
+    return places[keep + ['geometry']].reset_index(drop=True)
+
+
+def _place_columns(places, place_idx):
+    """Place attributes for matched indices (-1 = unassigned)"""
+    matched = place_idx >= 0
+    out = pd.DataFrame({
+        'place_geoid': pd.Series([None] * len(place_idx), dtype=object),
+        'Place': UNASSIGNED,
+    })
+    out.loc[matched, 'place_geoid'] = places['GEOID'].to_numpy()[place_idx[matched]]
+    out.loc[matched, 'Place'] = places['NAME'].to_numpy()[place_idx[matched]]
+    return out
+
+
+def _last_per_group(sorted_keys):
+    """Mask of the final element of each run in a sorted key array"""
+    return np.r_[sorted_keys[1:] != sorted_keys[:-1], True]
+
+
+def assign_points(lon, lat, places, tree=None):
+    """
+    Index of the place containing each point (-1 if none)
+
+    All points are tested in one bulk STRtree query; where places overlap
+    the smallest containing place wins.
+    """
+    tree = tree or STRtree(places.geometry.values)
+    points = shapely.points(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+    point_idx, place_idx = tree.query(points, predicate='within')
+    result = np.full(len(points), -1, dtype=np.int64)
+    if len(point_idx):
+        area = shapely.area(places.geometry.values)[place_idx]
+        # Sort so the smallest place comes last for each point, then keep it
+        order = np.lexsort((-area, point_idx))
+        last = order[_last_per_group(point_idx[order])]
+        result[point_idx[last]] = place_idx[last]
+    return result
+
+
+def assign_polygons(tract_geoms, places, tree=None):
+    """
+    Index of the place covering the largest share of each tract (-1 if none)
+
+    Returns (place_idx, share) where share is the covered fraction of the
+    tract's area. Areas are in degrees², which is adequate for comparing
+    overlaps within one tract.
+    """
+    tree = tree or STRtree(places.geometry.values)
+    tract_geoms = np.asarray(tract_geoms)
+    tract_idx, place_idx = tree.query(tract_geoms, predicate='intersects')
+    best = np.full(len(tract_geoms), -1, dtype=np.int64)
+    share = np.zeros(len(tract_geoms))
+    if len(tract_idx):
+        overlap = shapely.area(shapely.intersection(tract_geoms[tract_idx],
+                                                    places.geometry.values[place_idx]))
+        frac = overlap / np.maximum(shapely.area(tract_geoms[tract_idx]), 1e-15)
+        order = np.lexsort((frac, tract_idx))
+        last = order[_last_per_group(tract_idx[order])]
+        best[tract_idx[last]] = place_idx[last]
+        share[tract_idx[last]] = frac[last]
+    best[share <= 0] = -1
+    return best, share
+
+
+def assign_tracts(tracts=None, places=None, method='centroid'):
+    """
+    Place assignment for tracts
+
+    method='centroid' uses gazetteer internal points (tracts defaults to all
+    gazetteer tracts); method='area' expects tracts to be a GeoDataFrame of
+    tract polygons with a GEOID column.
+    """
+    places = load_place_polygons() if places is None else places
+    tree = STRtree(places.geometry.values)
+    if method == 'centroid':
+        tracts = tract_store.load_centroids() if tracts is None else tracts
+        place_idx = assign_points(tracts['longitude'], tracts['latitude'], places, tree)
+        share = None
+    elif method == 'area':
+        tracts = tracts.to_crs(CRS) if tracts.crs is not None and tracts.crs != CRS else tracts
+        place_idx, share = assign_polygons(tracts.geometry.values, places, tree)
+    else:
+        raise ValueError(f"unknown method: {method}")
+
+    result = _place_columns(places, place_idx)
+    result.insert(0, 'GEOID', tract_store.normalize_geoid(tracts['GEOID']))
+    if share is not None:
+        result['overlap_share'] = share
+    return result
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("OFFLINE TRACT-TO-PLACE ASSIGNMENT")
+    print("=" * 60)
+    if not os.path.exists(PLACES_PATH):
+        raise SystemExit(f"Place boundaries not found: {PLACES_PATH}")
+    assignments = assign_tracts()
+    assigned = (assignments['Place'] != UNASSIGNED).mean() * 100
+    print(f"\nAssigned {len(assignments):,} tracts ({assigned:.1f}% inside a Census place)")
+    print(assignments['Place'].value_counts().head(20))
+    assignments.to_csv(OUTPUT_CSV, index=False)
+    print(f"\nSaved: {OUTPUT_CSV}")
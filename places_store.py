@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Streaming, column-pruned ingestion of the CDC PLACES tract file
+Reads places_tract.csv once in chunks and writes a compact per-measure
+Parquet cache that every analysis loads from
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PLACES_CSV = 'data/raw/places_tract.csv'
+CACHE_DIR = 'data/interim/places_store'
+MANIFEST = 'manifest.json'
+
+# The only PLACES columns any analysis uses
+PLACES_COLUMNS = ['LocationID', 'StateAbbr', 'MeasureId', 'Data_Value',
+                  'Low_Confidence_Limit', 'High_Confidence_Limit', 'TotalPopulation']
+VALUE_COLUMNS = ['Data_Value', 'Low_Confidence_Limit', 'High_Confidence_Limit']
+POPULATION_COLUMN = 'TotalPopulation'  # absent from some releases; cached as NaN then
+
+SCHEMA = pa.schema([
+    ('LocationID', pa.string()),
+    ('StateAbbr', pa.string()),
+    ('Data_Value', pa.float32()),
+    ('Low_Confidence_Limit', pa.float32()),
+    ('High_Confidence_Limit', pa.float32()),
+    ('TotalPopulation', pa.float32()),
+])
+
+
+def _source_signature(source):
+    stat = os.stat(source)
+    return {'path': source, 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def _read_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _is_current(source, cache_dir):
+    manifest = _read_manifest(cache_dir)
+    if manifest is None:
+        return False
+    if not os.path.exists(source):
+        # Cache can outlive the 618 MB raw file
+        return True
+    return (manifest['source'] == _source_signature(source)
+            and manifest.get('columns') == SCHEMA.names)
+
+
+def measure_path(measure, cache_dir=CACHE_DIR):
+    """Parquet file holding one MeasureId"""
+    return os.path.join(cache_dir, f"{measure}.parquet")
+
+
+def build_cache(source=PLACES_CSV, cache_dir=CACHE_DIR, chunksize=250_000, force=False):
+    """
+    Stream the PLACES CSV once and split it into per-measure Parquet files
+
+    Only PLACES_COLUMNS are parsed and each chunk is flushed to its measure's
+    writer before the next is read, so peak memory is bounded by chunksize
+    rather than by the file size.
+    """
+    if not force and _is_current(source, cache_dir):
+        return _read_manifest(cache_dir)
+
+    print(f"Streaming {source} into per-measure cache...")
+    os.makedirs(cache_dir, exist_ok=True)
+    writers = {}
+    counts = {}
+    total = 0
+    # Written under temporary names and renamed once complete, manifest last,
+    # so concurrent readers see either the old cache or the new one
+    tmp = f".{os.getpid()}.tmp"
+    reader = pd.read_csv(
+        source,
+        usecols=lambda c: c in PLACES_COLUMNS,
+        dtype={'LocationID': str, 'StateAbbr': 'category', 'MeasureId': 'category',
+               'Data_Value': 'float32', 'Low_Confidence_Limit': 'float32',
+               'High_Confidence_Limit': 'float32', 'TotalPopulation': 'float32'},
+        chunksize=chunksize,
+    )
+    try:
+        for chunk in reader:
+            chunk['LocationID'] = chunk['LocationID'].str.zfill(11)
+            if POPULATION_COLUMN not in chunk.columns:
+                chunk[POPULATION_COLUMN] = np.float32(np.nan)
+            for measure, part in chunk.groupby('MeasureId', observed=True):
+                measure = str(measure)
+                if measure not in writers:
+                    writers[measure] = pq.ParquetWriter(measure_path(measure, cache_dir) + tmp,
+                                                        SCHEMA)
+                table = pa.Table.from_pandas(
+                    part[[c for c in PLACES_COLUMNS if c != 'MeasureId']].astype({'StateAbbr': str}),
+                    schema=SCHEMA, preserve_index=False)
+                writers[measure].write_table(table)
+                counts[measure] = counts.get(measure, 0) + len(part)
+            total += len(chunk)
+            print(f"  processed {total:,} rows...")
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for measure in writers:
+        os.replace(measure_path(measure, cache_dir) + tmp, measure_path(measure, cache_dir))
+    manifest = {'source': _source_signature(source), 'columns': SCHEMA.names, 'measures': counts}
+    path = os.path.join(cache_dir, MANIFEST)
+    with open(path + tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + tmp, path)
+    print(f"Cached {len(counts)} measures, {sum(counts.values()):,} records")
+    return manifest
+
+
+def measure_counts(source=PLACES_CSV, cache_dir=CACHE_DIR):
+    """Record count per MeasureId, read from the cache manifest"""
+    manifest = build_cache(source, cache_dir)
+    counts = pd.Series(manifest['measures'], name='count')
+    counts.index.name = 'MeasureId'
+    return counts.sort_values(ascending=False)
+
+
+def load_places(measures=None, columns=None, source=PLACES_CSV, cache_dir=CACHE_DIR):
+    """
+    Long-format PLACES records for the requested measures
+
+    measures defaults to every cached MeasureId; columns limits the value
+    columns returned (LocationID, StateAbbr and MeasureId are always present)
+    and may also name POPULATION_COLUMN, which is NaN when a cache built
+    before it was kept lacks it.
+    """
+    manifest = build_cache(source, cache_dir)
+    available = list(manifest['measures'])
+    if measures is None:
+        measures = available
+    measures = [m for m in measures if m in available]
+    readable = VALUE_COLUMNS + [POPULATION_COLUMN]
+    read_cols = ['LocationID', 'StateAbbr'] + (VALUE_COLUMNS if columns is None else
+                                               [c for c in columns if c in readable])
+    parts = []
+    for measure in measures:
+        path = measure_path(measure, cache_dir)
+        stored = pq.read_schema(path).names
+        part = pq.read_table(path, columns=[c for c in read_cols if c in stored],
+                             memory_map=True).to_pandas()
+        part = part.reindex(columns=read_cols)
+        part.insert(2, 'MeasureId', measure)
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=read_cols[:2] + ['MeasureId'] + read_cols[2:])
+    places = pd.concat(parts, ignore_index=True)
+    places['MeasureId'] = pd.Categorical(places['MeasureId'], categories=measures)
+    places['StateAbbr'] = places['StateAbbr'].astype('category')
+    return places
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BUILDING PLACES MEASURE CACHE")
+    print("=" * 60)
+    build_cache(force=True)
+    print(measure_counts().head(20))
@@ -10,9 +10,9 @@ def take_screenshot_with_screencapture():
     print("Opening http://localhost:8000/ in browser...")
     subprocess.run(["open", "http://localhost:8000/"])
     
-    # Wait for page to load (1 minute for large JSON)
-    print("Waiting 1 minute for large JSON to load...")
-    time.sleep(60)
+    # Wait for the first vector tiles to draw
+    print("Waiting 10 seconds for map tiles to load...")
+    time.sleep(10)
     
     # Take a screenshot of the entire screen
     output_file = "map_screenshot.png"
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Scenario grid for LILA threshold sensitivity analysis
+Refits the expected-burden model for every combination of LILA definition,
+outcome set, burden method and state fixed effects, then applies each top_pct
+cut, so the stability of the resilient-tract list can be compared
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import burden_model
+import shared_arrays
+import tract_store
+
+OUTPUT_DIR = 'data/processed/sensitivity'
+
+LILA_DEFINITIONS = ['LILATracts_1And10', 'LILATracts_halfAnd10', 'LILATracts_1And20']
+BURDEN_METHODS = ['zmean', 'pca']
+TOP_PCTS = [0.05, 0.10, 0.20]
+STATE_FIXED_EFFECTS = [True, False]
+
+
+def default_outcome_sets(outcomes):
+    """The configured outcome set plus each leave-one-out subset"""
+    sets = [tuple(outcomes)]
+    if len(outcomes) > 2:
+        sets += [tuple(o for o in outcomes if o != dropped) for dropped in outcomes]
+    return sets
+
+
+def build_grid(config, lila_definitions=None, outcome_sets=None, burden_methods=None,
+               top_pcts=None, state_fixed_effects=None):
+    """
+    Scenario table: one row per (fit, top_pct)
+
+    Each distinct (lila, outcomes, burden_method, state_fe) is one model fit,
+    identified by fit_id; top_pct only re-thresholds that fit's scores.
+    """
+    fits = list(itertools.product(
+        lila_definitions or LILA_DEFINITIONS,
+        outcome_sets or default_outcome_sets(config['outcomes']),
+        burden_methods or BURDEN_METHODS,
+        state_fixed_effects or STATE_FIXED_EFFECTS,
+    ))
+    rows = []
+    for fit_id, (lila, outcomes, method, fe) in enumerate(fits):
+        for top_pct in top_pcts or TOP_PCTS:
+            rows.append({'fit_id': fit_id, 'lila': lila, 'outcomes': ','.join(outcomes),
+                         'burden_method': method, 'state_fe': fe, 'top_pct': top_pct})
+    grid = pd.DataFrame(rows)
+    grid.insert(0, 'scenario_id', np.arange(len(grid)))
+    return grid
+
+
+def _fit_scenario(task):
+    """Worker: refit one scenario on the shared arrays and return its scores"""
+    fit_id, lila_idx, outcome_idx, method, fe = task
+    data = shared_arrays.ATTACHED
+    outcomes = pd.DataFrame(data['outcomes'][:, list(outcome_idx)])
+    burden = burden_model.compose_burden(outcomes, list(outcomes.columns), method)
+    X = np.column_stack([data['lila'][:, lila_idx], data['covariates']])
+    ok = np.isfinite(burden)
+    groups = data['state'][ok] if fe else None
+    result = burden_model.fit_ols(burden[ok], X[ok], [str(i) for i in range(X.shape[1])],
+                                  groups=groups, se_type='classical')
+    scores = np.full(len(burden), np.nan, dtype=np.float32)
+    scores[ok] = burden_model.resilience_scores(result['resid'])
+    return fit_id, scores, result['coef']['Coefficient'].iloc[1], result['r2']
+
+
+def run_grid(grid, frame, config, max_workers=None):
+    """
+    Fit every distinct scenario across a process pool
+
+    frame is a burden_model.design_frame carrying every LILA definition and
+    outcome column; it is copied once into shared memory for the workers.
+    Returns {fit_id: scores} and a per-fit summary table.
+    """
+    outcome_names = list(config['outcomes'])
+    lila_names = sorted(grid['lila'].unique())
+    covariate_cols = [c for c, _ in burden_model.covariates(config.get('include_no_vehicle', True))
+                      if c != 'LILATracts_1And10']
+    arrays = {
+        'outcomes': frame[outcome_names].to_numpy(dtype=np.float64),
+        'lila': frame[lila_names].to_numpy(dtype=np.float64),
+        'covariates': frame[covariate_cols].to_numpy(dtype=np.float64),
+        'state': pd.factorize(frame['StateAbbr'])[0],
+    }
+    fits = grid.drop_duplicates('fit_id')
+    tasks = [(r.fit_id, lila_names.index(r.lila),
+              tuple(outcome_names.index(o) for o in r.outcomes.split(',')),
+              r.burden_method, r.state_fe) for r in fits.itertuples()]
+
+    blocks, spec = shared_arrays.share_arrays(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=shared_arrays.attach_arrays,
+                                 initargs=(spec,)) as pool:
+            results = list(pool.map(_fit_scenario, tasks, chunksize=max(1, len(tasks) // 32)))
+    finally:
+        shared_arrays.release(blocks)
+
+    scores = {fit_id: s for fit_id, s, _, _ in results}
+    summary = pd.DataFrame([{'fit_id': fit_id, 'lila_coef': coef, 'r2': r2}
+                            for fit_id, _, coef, r2 in results])
+    return scores, summary
+
+
+def resilient_members(scores, lila_flag, top_pct):
+    """Boolean mask of LILA tracts above the (1 - top_pct) score quantile of all tracts"""
+    threshold = np.nanquantile(scores, 1 - top_pct)
+    return (lila_flag == 1) & (scores > threshold)
+
+
+def baseline_scenario(grid, config):
+    """scenario_id of the configured (production) specification"""
+    match = grid[(grid['lila'] == 'LILATracts_1And10') &
+                 (grid['outcomes'] == ','.join(config['outcomes'])) &
+                 (grid['burden_method'] == config.get('burden_method', 'zmean')) &
+                 (grid['state_fe'] == config.get('state_fixed_effects', True)) &
+                 np.isclose(grid['top_pct'], config.get('top_pct', 0.10))]
+    return int(match['scenario_id'].iloc[0]) if len(match) else 0
+
+
+def summarize(grid, frame, scores, fit_summary, config):
+    """
+    Tidy scenario x tract results and rank-stability statistics
+
+    Returns (scenario_summary, tract_scores, memberships). Stability is
+    measured against the baseline scenario's resilient set: Jaccard overlap,
+    share of baseline tracts retained and Spearman correlation of scores.
+    """
+    base_id = baseline_scenario(grid, config)
+    base = grid.loc[grid['scenario_id'] == base_id].iloc[0]
+    base_scores = scores[base.fit_id]
+    base_members = resilient_members(base_scores, frame[base.lila].to_numpy(), base.top_pct)
+
+    rows = []
+    memberships = []
+    for r in grid.itertuples():
+        s = scores[r.fit_id]
+        members = resilient_members(s, frame[r.lila].to_numpy(), r.top_pct)
+        overlap = (members & base_members).sum()
+        ok = np.isfinite(s) & np.isfinite(base_scores)
+        rows.append({
+            'scenario_id': r.scenario_id,
+            'n_resilient': int(members.sum()),
+            'jaccard_vs_baseline': overlap / max((members | base_members).sum(), 1),
+            'retained_from_baseline': overlap / max(base_members.sum(), 1),
+            'spearman_vs_baseline': stats.spearmanr(s[ok], base_scores[ok])[0],
+        })
+        memberships.append(pd.DataFrame({'scenario_id': r.scenario_id,
+                                         'GEOID': frame['GEOID'].values[members]}))
+    summary = grid.merge(pd.DataFrame(rows), on='scenario_id').merge(fit_summary, on='fit_id')
+    summary['is_baseline'] = summary['scenario_id'] == base_id
+
+    tract_scores = pd.concat([
+        pd.DataFrame({'fit_id': fit_id, 'GEOID': frame['GEOID'].values,
+                      'resilience_score': s,
+                      'rank': pd.Series(s).rank(ascending=False, method='min').to_numpy()})
+        for fit_id, s in sorted(scores.items())
+    ], ignore_index=True)
+    tract_scores['GEOID'] = tract_scores['GEOID'].astype('category')
+    return summary, tract_scores, pd.concat(memberships, ignore_index=True)
+
+
+def run_sensitivity(config=None, output_dir=OUTPUT_DIR, max_workers=None, **grid_options):
+    """Build the grid, fit it in parallel and write the result store"""
+    config = config or burden_model.load_model_config()
+    grid = build_grid(config, **grid_options)
+    burden = burden_model.load_burden_table()
+    lila_cols = sorted(set(grid['lila']) | {'LILATracts_1And10'})
+    frame = burden_model.design_frame(burden, include_no_vehicle=config.get('include_no_vehicle', True))
+    extra = tract_store.load_fara([c for c in lila_cols if c not in frame.columns])
+    frame = frame.merge(extra, on='GEOID', how='left')
+    frame[lila_cols] = frame[lila_cols].fillna(0)
+
+    print(f"Fitting {grid['fit_id'].nunique()} model variants "
+          f"({len(grid)} scenarios) on {len(frame):,} tracts...")
+    scores, fit_summary = run_grid(grid, frame, config, max_workers)
+    summary, tract_scores, memberships = summarize(grid, frame, scores, fit_summary, config)
+
+    os.makedirs(output_dir, exist_ok=True)
+    summary.to_csv(os.path.join(output_dir, 'scenario_summary.csv'), index=False)
+    tract_scores.to_parquet(os.path.join(output_dir, 'tract_scores.parquet'), index=False)
+    memberships.to_parquet(os.path.join(output_dir, 'resilient_membership.parquet'), index=False)
+    return summary, tract_scores, memberships
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("SENSITIVITY ANALYSIS: SCENARIO GRID")
+    print("=" * 60)
+    summary, tract_scores, memberships = run_sensitivity()
+
+    print("\nBaseline scenario:")
+    print(summary[summary['is_baseline']].T)
+    print("\nLeast stable scenarios (lowest retention of baseline resilient tracts):")
+    print(summary.nsmallest(10, 'retained_from_baseline')[
+        ['scenario_id', 'lila', 'outcomes', 'burden_method', 'state_fe', 'top_pct',
+         'n_resilient', 'retained_from_baseline', 'spearman_vs_baseline']])
+    print(f"\nSaved result store to {OUTPUT_DIR}/")
@@ -1,13 +1,314 @@
 #!/usr/bin/env python3
-import http.server
-import socketserver
+"""
+Map server for figures/
+Threaded static server with precompressed .br/.gz siblings, single byte
+ranges, ETag/If-None-Match revalidation, Cache-Control and vector tile
+lookups from the MBTiles archive; logs per-request latency.
+
+    python serve_map.py                 serve figures/ on port 8000
+    python serve_map.py --precompress   write .gz (and .br) siblings first
+    python serve_map.py --api           also answer /tracts and /tract/<GEOID>
+"""
+
+import email.utils
+import gzip
+import mimetypes
 import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+try:
+    import brotli
+except ImportError:  # optional: .br siblings are still served if present
+    brotli = None
 
-os.chdir('figures')
+import tract_query
+
+FIGURES_DIR = 'figures'
+MBTILES_PATH = 'figures/resilience.mbtiles'
 PORT = 8000
 
-Handler = http.server.SimpleHTTPRequestHandler
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    print(f"Map server running at http://localhost:{PORT}")
-    print("Press Ctrl+C to stop")
-    httpd.serve_forever()
\ No newline at end of file
+TILE_PATH = re.compile(r'^/tiles/(\d+)/(\d+)/(\d+)\.pbf$')
+PRECOMPRESS_EXTENSIONS = ('.html', '.js', '.css', '.json', '.geojson', '.csv', '.pbf', '.svg')
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+COPY_CHUNK = 64 * 1024
+
+mimetypes.add_type('application/x-protobuf', '.pbf')
+mimetypes.add_type('application/geo+json', '.geojson')
+
+
+def precompress(root=FIGURES_DIR, min_size=1024):
+    """Write .gz (and .br when brotli is installed) next to compressible files"""
+    written = 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            if not name.endswith(PRECOMPRESS_EXTENSIONS) or os.path.getsize(path) < min_size:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            mtime = os.path.getmtime(path)
+            targets = [('.gz', lambda d: gzip.compress(d, 9, mtime=0))]
+            if brotli is not None:
+                targets.append(('.br', lambda d: brotli.compress(d, quality=11)))
+            for suffix, compress in targets:
+                out = path + suffix
+                if os.path.exists(out) and os.path.getmtime(out) >= mtime:
+                    continue
+                with open(out, 'wb') as f:
+                    f.write(compress(data))
+                written += 1
+    return written
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single 'bytes=' range, None to serve the
+    whole body (absent, malformed or multi-range), or 'invalid' if unsatisfiable
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[6:].strip().partition('-')
+    try:
+        if first == '':
+            length = int(last)
+            if length <= 0:
+                return 'invalid'
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return 'invalid'
+    return start, min(end, size - 1)
+
+
+def cache_control(path):
+    """Tiles are immutable between builds; pages must revalidate"""
+    if path.endswith('.pbf'):
+        return 'public, max-age=86400'
+    if path.endswith('.html') or path == '/':
+        return 'no-cache'
+    return 'public, max-age=3600'
+
+
+class TileArchive:
+    """Read-only MBTiles lookups with one sqlite connection per thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.etag_base = f"{os.stat(path).st_mtime_ns:x}"
+
+    def get(self, z, x, y):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        row = conn.execute('SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? '
+                           'AND tile_row = ?', (z, x, 2 ** z - 1 - y)).fetchone()
+        return None if row is None else row[0]
+
+
+class MapRequestHandler(SimpleHTTPRequestHandler):
+    """Static files with compression negotiation, ranges and validators"""
+
+    protocol_version = 'HTTP/1.1'
+    archive = None
+    api = None
+
+    def handle_one_request(self):
+        self._start = time.perf_counter()
+        self._status = None
+        self._sent = 0
+        super().handle_one_request()
+        if self._status is not None:
+            self.log_message('"%s" %d %d %.1fms', self.requestline, self._status, self._sent,
+                             (time.perf_counter() - self._start) * 1000)
+
+    def log_request(self, code='-', size='-'):
+        pass  # logged with latency in handle_one_request
+
+    def send_response(self, code, message=None):
+        self._status = int(code)
+        super().send_response(code, message)
+
+    def do_GET(self):
+        self.serve(head=False)
+
+    def do_HEAD(self):
+        self.serve(head=True)
+
+    def accepts(self, encoding):
+        accepted = self.headers.get('Accept-Encoding', '')
+        return any(token.split(';')[0].strip() == encoding for token in accepted.split(','))
+
+    def serve(self, head):
+        url_path = unquote(urlsplit(self.path).path)
+        if self.api is not None and self.api.handles(url_path):
+            self.serve_api(url_path, head)
+            return
+        tile = TILE_PATH.match(url_path)
+        fs_path = self.translate_path(self.path)
+
+        if os.path.isdir(fs_path):
+            if not url_path.endswith('/'):
+                self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+                self.send_header('Location', url_path + '/')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            fs_path = os.path.join(fs_path, 'index.html')
+
+        if not os.path.isfile(fs_path):
+            if tile and self.archive is not None:
+                self.serve_archive_tile(*map(int, tile.groups()), head=head)
+            else:
+                self.send_error(HTTPStatus.NOT_FOUND, 'File not found')
+            return
+
+        content_type = self.guess_type(fs_path)
+        encoding = None
+        for name, suffix in ENCODINGS:
+            sibling = fs_path + suffix
+            if self.accepts(name) and os.path.isfile(sibling) and \
+                    os.path.getmtime(sibling) >= os.path.getmtime(fs_path):
+                fs_path, encoding = sibling, name
+                break
+
+        st = os.stat(fs_path)
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-" + encoding if encoding else ""}"'
+        headers = {
+            'Content-Type': content_type,
+            'ETag': etag,
+            'Last-Modified': email.utils.formatdate(st.st_mtime, usegmt=True),
+            'Cache-Control': cache_control(url_path),
+            'Vary': 'Accept-Encoding',
+            'Accept-Ranges': 'bytes',
+        }
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        if self.not_modified(etag, headers):
+            return
+
+        size = st.st_size
+        byte_range = parse_range(self.headers.get('Range'), size)
+        if_range = self.headers.get('If-Range')
+        if if_range is not None and if_range != etag:
+            byte_range = None
+        if byte_range == 'invalid':
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f"bytes */{size}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if byte_range:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        if head:
+            return
+        with open(fs_path, 'rb') as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(COPY_CHUNK, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+                self._sent += len(chunk)
+
+    def not_modified(self, etag, headers):
+        """Answer 304 when If-None-Match carries the current ETag"""
+        tags = [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]
+        if etag not in tags and '*' not in tags:
+            return False
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        for key in ('ETag', 'Cache-Control', 'Vary'):
+            self.send_header(key, headers[key])
+        self.end_headers()
+        return True
+
+    def serve_api(self, url_path, head):
+        """Query responses from the tract index (never cached by clients)"""
+        status, headers, body = self.api.respond(url_path, urlsplit(self.path).query,
+                                                 self.headers.get('Accept', ''),
+                                                 self.headers.get('Accept-Encoding', ''))
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+            self._sent += len(body)
+
+    def serve_archive_tile(self, z, x, y, head):
+        """Vector tile from the MBTiles archive (stored gzipped)"""
+        data = self.archive.get(z, x, y)
+        if data is None:
+            self.send_response(HTTPStatus.NO_CONTENT)
+            self.send_header('Cache-Control', cache_control('.pbf'))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        etag = f'"{self.archive.etag_base}-{z}-{x}-{y}"'
+        headers = {'Content-Type': 'application/x-protobuf', 'ETag': etag,
+                   'Cache-Control': cache_control('.pbf'), 'Vary': 'Accept-Encoding'}
+        if self.not_modified(etag, headers):
+            return
+        if self.accepts('gzip'):
+            headers['Content-Encoding'] = 'gzip'
+        else:
+            data = gzip.decompress(data)
+        self.send_response(HTTPStatus.OK)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(data)
+            self._sent += len(data)
+
+
+def make_server(port=PORT, directory=FIGURES_DIR, mbtiles=MBTILES_PATH, host='', api=None):
+    """
+    ThreadingHTTPServer serving directory, with tile lookups from mbtiles if
+    it exists and query routes from api (a tract_query.QueryAPI) if given
+    """
+    archive = TileArchive(mbtiles) if mbtiles and os.path.exists(mbtiles) else None
+    handler = type('Handler', (MapRequestHandler,), {'archive': archive, 'api': api})
+
+    def factory(*args, **kwargs):
+        return handler(*args, directory=directory, **kwargs)
+
+    server = ThreadingHTTPServer((host, port), factory)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    if '--precompress' in sys.argv:
+        print(f"Precompressed {precompress()} files in {FIGURES_DIR}/")
+    api = None
+    if '--api' in sys.argv:
+        api = tract_query.QueryAPI()
+        print(f"Tract query API: {api.index.n:,} tracts at /tracts and /tract/<GEOID>")
+    with make_server(api=api) as httpd:
+        print(f"Map server running at http://localhost:{PORT}")
+        print("Press Ctrl+C to stop")
+        httpd.serve_forever()
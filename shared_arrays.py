@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+NumPy arrays shared with worker processes
+The parent copies each array into a named shared-memory block once; workers
+attach by name in their pool initializer instead of receiving pickled copies.
+Arrays are read-only in workers unless shared as writable output buffers.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Arrays attached in this (worker) process, keyed by name
+ATTACHED = {}
+_BLOCKS = []
+
+
+def share_arrays(arrays, writable=()):
+    """
+    Copy arrays into shared memory
+
+    Returns (blocks, spec): keep blocks alive in the parent and release them
+    with release(blocks); pass spec to attach_arrays in each worker. Arrays
+    named in writable can be written by workers (e.g. per-replicate output
+    rows) and read back in the parent with parent_views.
+    """
+    blocks = []
+    spec = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        view[...] = array
+        blocks.append(block)
+        spec[name] = (block.name, array.shape, array.dtype.str, name in writable)
+    return blocks, spec
+
+
+def parent_views(blocks, spec):
+    """Arrays over the parent's own blocks, keyed like spec"""
+    return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            for block, (name, (_, shape, dtype, _)) in zip(blocks, spec.items())}
+
+
+def attach_arrays(spec):
+    """Pool initializer: map shared blocks into ATTACHED (read-only unless writable)"""
+    for name, (block_name, shape, dtype, writable) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        view.flags.writeable = writable
+        ATTACHED[name] = view
+        _BLOCKS.append(block)
+
+
+def release(blocks):
+    """Free the parent's shared blocks"""
+    for block in blocks:
+        block.close()
+        block.unlink()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Spatial error (SEM) and spatial lag (SAR) versions of the expected-burden model
+Maximum likelihood over a sparse row-standardized kNN weight matrix. The
+likelihood is concentrated on the spatial parameter and evaluated from
+small cross-product matrices precomputed once, with log|I - rho W| from a
+Chebyshev or Monte Carlo trace approximation (or exact sparse LU), so no
+n x n dense matrix is ever formed. Writes spatially filtered resilience
+scores alongside the OLS ones.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+from scipy.optimize import minimize_scalar
+from scipy.sparse.linalg import splu
+
+import burden_model
+import spatial_stats
+import tract_store
+
+SCORES_CSV = 'data/processed/spatial_model_scores.csv'
+COEF_CSV = 'tables/spatial_regression.csv'
+K_NEIGHBOURS = 8
+CHEBYSHEV_DEGREE = 30
+MC_TERMS = 50
+PROBES = 50
+SEED = 12345
+RHO_BOUNDS = (-0.99, 0.99)
+LOGDET_METHODS = ('chebyshev', 'mc', 'lu')
+
+
+# --- log|I - rho W| ------------------------------------------------------
+
+def _probes(n, probes, seed):
+    return np.random.default_rng(seed).choice([-1.0, 1.0], size=(n, probes))
+
+
+def lu_logdet(W):
+    """Exact log|I - rho W| from a sparse LU factorization (one per call)"""
+    W = sparse.csc_matrix(W)
+    eye = sparse.identity(W.shape[0], format='csc')
+
+    def logdet(rho):
+        # L has a unit diagonal; |I - rho W| > 0 for |rho| < 1
+        return float(np.log(np.abs(splu(eye - rho * W, permc_spec='COLAMD').U.diagonal())).sum())
+    return logdet
+
+
+def chebyshev_logdet(W, degree=CHEBYSHEV_DEGREE, probes=PROBES, seed=SEED):
+    """
+    log|I - rho W| from a Chebyshev expansion of log(1 - rho x) (Pace & LeSage 2004)
+
+    The traces of T_j(W) do not depend on rho, so they are estimated once
+    (exactly for j <= 2, by Rademacher probes through the three-term
+    recurrence above that); each evaluation is then O(degree).
+    """
+    W = sparse.csr_matrix(W)
+    n = W.shape[0]
+    traces = np.empty(degree + 1)
+    traces[0] = n
+    traces[1] = W.diagonal().sum()
+    x = _probes(n, probes, seed)
+    prev, cur = x, W @ x
+    for j in range(2, degree + 1):
+        prev, cur = cur, 2 * (W @ cur) - prev
+        traces[j] = np.einsum('ij,ij->', x, cur) / probes
+    if degree >= 2:
+        traces[2] = 2 * W.multiply(W.T).sum() - n
+    nodes = np.cos(np.pi * (np.arange(degree + 1) + 0.5) / (degree + 1))
+    basis = np.cos(np.outer(np.arange(degree + 1), np.arccos(nodes)))
+
+    def logdet(rho):
+        coef = 2.0 / (degree + 1) * basis @ np.log1p(-rho * nodes)
+        coef[0] /= 2
+        return float(coef @ traces)
+    return logdet
+
+
+def monte_carlo_logdet(W, terms=MC_TERMS, probes=PROBES, seed=SEED):
+    """
+    log|I - rho W| = -sum_k rho^k tr(W^k) / k with Monte Carlo traces (Barry & Pace 1999)
+
+    tr(W) and tr(W^2) are exact; higher powers use Rademacher probes.
+    """
+    W = sparse.csr_matrix(W)
+    n = W.shape[0]
+    traces = np.empty(terms)
+    x = _probes(n, probes, seed)
+    cur = x
+    for k in range(terms):
+        cur = W @ cur
+        traces[k] = np.einsum('ij,ij->', x, cur) / probes
+    traces[0] = W.diagonal().sum()
+    if terms > 1:
+        traces[1] = W.multiply(W.T).sum()
+    powers = np.arange(1, terms + 1)
+
+    def logdet(rho):
+        return float(-(rho ** powers / powers) @ traces)
+    return logdet
+
+
+def logdet_function(W, method='chebyshev'):
+    """rho -> log|I - rho W| by one of LOGDET_METHODS"""
+    if method == 'chebyshev':
+        return chebyshev_logdet(W)
+    if method == 'mc':
+        return monte_carlo_logdet(W)
+    if method == 'lu':
+        return lu_logdet(W)
+    raise ValueError(f"unknown log-determinant method {method!r}; use one of {LOGDET_METHODS}")
+
+
+# --- Model ---------------------------------------------------------------
+
+def spatial_design(burden=None, fara=None, config=None, k=K_NEIGHBOURS, centroids=None):
+    """
+    Located design frame, y, sparse regressors Z and row-standardized W
+
+    Z is [constant, covariates, state dummies (first state dropped)] as a
+    CSR matrix; the dummies take the place of the within-transformation,
+    which does not commute with W.
+    """
+    config = config or burden_model.load_model_config()
+    burden = burden_model.load_burden_table() if burden is None else burden
+    include_no_vehicle = config.get('include_no_vehicle', True)
+    frame = burden_model.design_frame(burden, fara, include_no_vehicle)
+    centroids = tract_store.load_centroids() if centroids is None else centroids
+    frame = frame.merge(centroids[['GEOID', 'latitude', 'longitude']], on='GEOID', how='left')
+    dropped = int(frame['latitude'].isna().sum())
+    frame = frame[frame['latitude'].notna()].reset_index(drop=True)
+    W = spatial_stats.knn_weights(frame['latitude'], frame['longitude'], k=k)
+
+    cols = burden_model.covariates(include_no_vehicle)
+    n = len(frame)
+    blocks = [np.ones((n, 1)), frame[[c for c, _ in cols]].to_numpy(dtype=np.float64)]
+    names = ['Constant'] + [label for _, label in cols]
+    Z = sparse.hstack([sparse.csr_matrix(b) for b in blocks])
+    n_states = 0
+    if config.get('state_fixed_effects', True):
+        codes, states = pd.factorize(frame['StateAbbr'], sort=True)
+        keep = codes > 0
+        dummies = sparse.csr_matrix((np.ones(keep.sum()), (np.flatnonzero(keep), codes[keep] - 1)),
+                                    shape=(n, len(states) - 1))
+        Z = sparse.hstack([Z, dummies])
+        n_states = len(states)
+    return {'frame': frame, 'y': frame['burden'].to_numpy(dtype=np.float64),
+            'Z': sparse.csr_matrix(Z), 'W': sparse.csr_matrix(W), 'names': names,
+            'n_states': n_states, 'dropped': dropped}
+
+
+def cross_products(y, Z, W):
+    """
+    G'G, G'WG and WG'WG for G = [y, Z]
+
+    Every SEM or SAR likelihood evaluation is a small function of these
+    (p + 1) x (p + 1) matrices, so the n-sized work is done once.
+    """
+    G = sparse.hstack([sparse.csr_matrix(y[:, None]), Z]).tocsr()
+    WG = (W @ G).tocsr()
+    return {'GG': (G.T @ G).toarray(), 'GWG': (G.T @ WG).toarray(),
+            'WGWG': (WG.T @ WG).toarray(), 'n': len(y)}
+
+
+def _solve(C):
+    """(beta, SSE, Z'Z) from the cross-product matrix of [y, Z]"""
+    zz, zy = C[1:, 1:], C[1:, 0]
+    beta = np.linalg.solve(zz, zy)
+    return beta, float(C[0, 0] - zy @ beta), zz
+
+
+def sem_cross(cp, lam):
+    """Cross products of (I - lam W)[y, Z]"""
+    return cp['GG'] - lam * (cp['GWG'] + cp['GWG'].T) + lam ** 2 * cp['WGWG']
+
+
+def sar_cross(cp, rho):
+    """Cross products of [y - rho Wy, Z]"""
+    C = cp['GG'].copy()
+    C[0, 0] += -2 * rho * cp['GWG'][0, 0] + rho ** 2 * cp['WGWG'][0, 0]
+    C[1:, 0] -= rho * cp['GWG'][1:, 0]
+    C[0, 1:] = C[1:, 0]
+    return C
+
+
+def profile_loglik(sse, n, logdet):
+    """Gaussian log-likelihood with beta and sigma^2 concentrated out"""
+    return -n / 2 * (np.log(2 * np.pi) + 1 + np.log(sse / n)) + logdet
+
+
+def fit_spatial(cp, logdet, model='sem', bounds=RHO_BOUNDS, exact_logdet=None):
+    """
+    Maximize the concentrated likelihood of a SEM or SAR model
+
+    Returns rho (lambda for SEM), its standard error from the curvature of
+    the profile likelihood, beta with standard errors conditional on rho,
+    sigma^2 and the log-likelihood (exact when exact_logdet is given).
+    """
+    cross = sem_cross if model == 'sem' else sar_cross
+    n = cp['n']
+
+    def ll(rho):
+        return profile_loglik(_solve(cross(cp, rho))[1], n, logdet(rho))
+
+    opt = minimize_scalar(lambda r: -ll(r), bounds=bounds, method='bounded',
+                          options={'xatol': 1e-6})
+    rho = float(opt.x)
+    h = 1e-4
+    curvature = (ll(rho + h) - 2 * ll(rho) + ll(rho - h)) / h ** 2
+    beta, sse, zz = _solve(cross(cp, rho))
+    sigma2 = sse / n
+    exact = exact_logdet(rho) if exact_logdet else None
+    return {
+        'model': model, 'rho': rho,
+        'rho_se': float(np.sqrt(-1 / curvature)) if curvature < 0 else np.nan,
+        'beta': beta, 'beta_se': np.sqrt(np.diag(np.linalg.inv(zz)) * sigma2),
+        'sigma2': sigma2, 'loglik': profile_loglik(sse, n, logdet(rho) if exact is None else exact),
+        'logdet_error': None if exact is None else exact - logdet(rho), 'n': n,
+    }
+
+
+def fit_ols_cross(cp):
+    """OLS on the same design (rho = 0), for comparison"""
+    beta, sse, zz = _solve(cp['GG'])
+    sigma2 = sse / cp['n']
+    return {'model': 'ols', 'rho': 0.0, 'rho_se': np.nan, 'beta': beta,
+            'beta_se': np.sqrt(np.diag(np.linalg.inv(zz)) * sigma2), 'sigma2': sigma2,
+            'loglik': profile_loglik(sse, cp['n'], 0.0), 'logdet_error': None, 'n': cp['n']}
+
+
+def residuals(fit, y, Z, W):
+    """
+    (resid, filtered) for a fitted model
+
+    SEM: resid = y - Z b and filtered = (I - lam W) resid, the part of the
+    error not shared with neighbours. SAR: both are y - rho Wy - Z b.
+    """
+    resid = y - Z @ fit['beta']
+    if fit['model'] == 'sem':
+        return resid, resid - fit['rho'] * (W @ resid)
+    if fit['model'] == 'sar':
+        resid = resid - fit['rho'] * (W @ y)
+    return resid, resid
+
+
+def _constant(fit, Z, names):
+    """areg-style constant: intercept plus the size-weighted mean state effect"""
+    k = len(names)
+    dummies = Z[:, k:]
+    shares = np.asarray(dummies.sum(axis=0)).ravel() / Z.shape[0]
+    return fit['beta'][0] + shares @ fit['beta'][k:]
+
+
+def coefficient_table(fits, Z, names):
+    """Slopes, spatial parameter and fit statistics for each model, side by side"""
+    rows = []
+    for fit in fits:
+        p = len(fit['beta']) + (fit['model'] != 'ols') + 1
+        label = {'ols': 'OLS', 'sem': 'SEM', 'sar': 'SAR'}[fit['model']]
+        for i, name in enumerate(names):
+            coef = _constant(fit, Z, names) if i == 0 else fit['beta'][i]
+            se = np.nan if i == 0 else fit['beta_se'][i]
+            row = {'Model': label, 'Variable': name, 'Coefficient': coef, 'Std_Error': se,
+                   'z': coef / se, 'p_value': 2 * stats.norm.sf(abs(coef / se))}
+            if fit['model'] == 'sar' and i > 0:
+                # Average total impact of a unit change (row-standardized W)
+                row['Total_Impact'] = coef / (1 - fit['rho'])
+            rows.append(row)
+        if fit['model'] != 'ols':
+            rho = fit['rho']
+            rows.append({'Model': label, 'Variable': 'lambda' if fit['model'] == 'sem' else 'rho',
+                         'Coefficient': rho, 'Std_Error': fit['rho_se'],
+                         'z': rho / fit['rho_se'],
+                         'p_value': 2 * stats.norm.sf(abs(rho / fit['rho_se']))})
+        for name, value in [('Log-likelihood', fit['loglik']),
+                            ('AIC', 2 * p - 2 * fit['loglik']), ('N', fit['n'])]:
+            rows.append({'Model': label, 'Variable': name, 'Coefficient': value})
+    return pd.DataFrame(rows, columns=['Model', 'Variable', 'Coefficient', 'Std_Error', 'z',
+                                       'p_value', 'Total_Impact'])
+
+
+def run_spatial_regression(config=None, k=K_NEIGHBOURS, method='chebyshev',
+                           scores_path=SCORES_CSV, coef_path=COEF_CSV):
+    """Fit OLS, SEM and SAR; write filtered scores and the coefficient table"""
+    config = config or burden_model.load_model_config()
+    design = spatial_design(config=config, k=k)
+    y, Z, W, names = design['y'], design['Z'], design['W'], design['names']
+    print(f"{len(y):,} located tracts ({design['dropped']:,} without a centroid), "
+          f"{Z.shape[1]} regressors, W with {W.nnz:,} links")
+
+    start = time.perf_counter()
+    cp = cross_products(y, Z, W)
+    logdet = logdet_function(W, method)
+    exact = lu_logdet(W)
+    fits = [fit_ols_cross(cp)]
+    for model in ('sem', 'sar'):
+        fits.append(fit_spatial(cp, logdet, model, exact_logdet=exact))
+    print(f"Fitted in {time.perf_counter() - start:.1f}s ({method} log-determinant)")
+
+    frame = design['frame']
+    scores = frame[['GEOID', 'StateAbbr', 'burden']].copy()
+    current = tract_store.load_model_table()[['GEOID', 'resid', 'resilience_score']]
+    scores = scores.merge(current, on='GEOID', how='left')
+    morans = {}
+    for fit in fits[1:]:
+        resid, filtered = residuals(fit, y, Z, W)
+        scores[f"resid_{fit['model']}"] = filtered
+        scores[f"resilience_score_{fit['model']}"] = burden_model.resilience_scores(filtered)
+        morans[fit['model']] = spatial_stats.morans_i(filtered, W, permutations=0)['I']
+    morans['ols'] = spatial_stats.morans_i(residuals(fits[0], y, Z, W)[0], W, permutations=0)['I']
+    table = coefficient_table(fits, Z, names)
+    for fit in fits:
+        table.loc[len(table)] = {'Model': fit['model'].upper(), 'Variable': "Moran's I (resid)",
+                                 'Coefficient': morans[fit['model']]}
+
+    os.makedirs(os.path.dirname(scores_path), exist_ok=True)
+    os.makedirs(os.path.dirname(coef_path), exist_ok=True)
+    scores.to_csv(scores_path, index=False, float_format='%.6f')
+    table.to_csv(coef_path, index=False, float_format='%.6f')
+    return fits, table, scores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--k', type=int, default=K_NEIGHBOURS, help='neighbours per tract')
+    parser.add_argument('--logdet', choices=LOGDET_METHODS, default='chebyshev',
+                        help='log-determinant used in the likelihood search')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("SPATIAL ERROR AND SPATIAL LAG BURDEN MODELS")
+    print("=" * 60)
+    config = burden_model.load_model_config()
+    fits, table, scores = run_spatial_regression(config, args.k, args.logdet)
+    for fit in fits[1:]:
+        name = 'lambda' if fit['model'] == 'sem' else 'rho'
+        print(f"\n{fit['model'].upper()}: {name} = {fit['rho']:.4f} (SE {fit['rho_se']:.4f}), "
+              f"log-likelihood {fit['loglik']:,.1f} (log-det error {fit['logdet_error']:.2g}), "
+              f"LR vs OLS {2 * (fit['loglik'] - fits[0]['loglik']):,.1f}")
+    print("\n" + table[table['Variable'] == "Moran's I (resid)"][['Model', 'Coefficient']]
+          .rename(columns={'Coefficient': "Moran's I"}).to_string(index=False))
+
+    # Overlap of the top-decile resilient LILA lists under each score
+    top_pct = config.get('top_pct', 0.10)
+    lila = tract_store.load_fara(['LILATracts_1And10']).set_index('GEOID')['LILATracts_1And10']
+    is_lila = scores['GEOID'].map(lila).eq(1).to_numpy()
+    base = scores['resilience_score']
+    base = set(scores['GEOID'][is_lila & (base > base.quantile(1 - top_pct)).to_numpy()])
+    for model in ('sem', 'sar'):
+        col = scores[f"resilience_score_{model}"]
+        other = set(scores['GEOID'][is_lila & (col > col.quantile(1 - top_pct)).to_numpy()])
+        print(f"Resilient LILA tracts kept under {model.upper()} scores: "
+              f"{len(base & other):,} of {len(base):,} ({len(other):,} listed)")
+    print(f"\nSaved: {SCORES_CSV}, {COEF_CSV}")
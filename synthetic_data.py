@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic national-scale fixtures
+Writes every input the analysis scripts read - PLACES long format, FARA
+wide columns, the burden and model tables, gazetteer centroids, place and
+tract polygons - under a fixture root laid out like the repo's data/
+directory, so any stage can be run or benchmarked without the real
+downloads. Tracts are spread over the states in proportion to their 2010
+tract counts and health outcomes depend on poverty and food access, so
+the model has real signal to fit.
+
+    python synthetic_data.py --tracts 250000
+"""
+
+import argparse
+import os
+import zipfile
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import burden_model
+
+FIXTURE_DIR = 'data/benchmarks/fixtures'
+SIZES = {'68k': 68_170, '250k': 250_000, '1m': 1_000_000}
+SEED = 20240601
+
+# (abbr, FIPS, 2010 tract count, approximate centre latitude, longitude)
+STATES = [
+    ('AL', '01', 1181, 32.8, -86.8), ('AK', '02', 167, 61.4, -150.0), ('AZ', '04', 1526, 33.7, -111.9),
+    ('AR', '05', 686, 34.9, -92.4), ('CA', '06', 8057, 36.2, -119.4), ('CO', '08', 1249, 39.3, -105.3),
+    ('CT', '09', 833, 41.6, -72.7), ('DE', '10', 218, 39.2, -75.5), ('DC', '11', 179, 38.9, -77.0),
+    ('FL', '12', 4245, 27.8, -81.7), ('GA', '13', 1969, 33.0, -83.6), ('HI', '15', 351, 21.3, -157.8),
+    ('ID', '16', 298, 44.2, -114.5), ('IL', '17', 3123, 40.3, -89.0), ('IN', '18', 1511, 39.8, -86.3),
+    ('IA', '19', 825, 42.0, -93.2), ('KS', '20', 770, 38.5, -96.7), ('KY', '21', 1115, 37.7, -84.7),
+    ('LA', '22', 1148, 31.2, -91.9), ('ME', '23', 358, 44.7, -69.4), ('MD', '24', 1406, 39.1, -76.8),
+    ('MA', '25', 1478, 42.2, -71.5), ('MI', '26', 2813, 43.3, -84.5), ('MN', '27', 1338, 45.7, -93.9),
+    ('MS', '28', 664, 32.7, -89.7), ('MO', '29', 1393, 38.5, -92.3), ('MT', '30', 271, 46.9, -110.5),
+    ('NE', '31', 532, 41.1, -98.3), ('NV', '32', 687, 38.3, -117.1), ('NH', '33', 295, 43.5, -71.6),
+    ('NJ', '34', 2010, 40.3, -74.5), ('NM', '35', 499, 34.8, -106.2), ('NY', '36', 4918, 42.2, -74.9),
+    ('NC', '37', 2195, 35.6, -79.8), ('ND', '38', 205, 47.5, -99.8), ('OH', '39', 2952, 40.4, -82.8),
+    ('OK', '40', 1046, 35.6, -96.9), ('OR', '41', 834, 44.6, -122.1), ('PA', '42', 3218, 40.6, -77.2),
+    ('RI', '44', 244, 41.7, -71.5), ('SC', '45', 1103, 33.9, -80.9), ('SD', '46', 222, 44.3, -99.4),
+    ('TN', '47', 1497, 35.7, -86.7), ('TX', '48', 5265, 31.1, -97.6), ('UT', '49', 588, 40.2, -111.9),
+    ('VT', '50', 184, 44.0, -72.7), ('VA', '51', 1907, 37.8, -78.2), ('WA', '53', 1458, 47.4, -121.5),
+    ('WV', '54', 484, 38.5, -81.0), ('WI', '55', 1409, 44.3, -89.6), ('WY', '56', 132, 42.8, -107.3),
+]
+TRACTS_PER_COUNTY = 25
+MAX_COUNTIES = 499  # odd county codes must stay within 3 digits
+PLACES_PER_COUNTY = 0.5
+
+# Mean prevalence, poverty slope and LILA shift of each synthetic PLACES measure
+# (the model outcomes plus a few others)
+MEASURE_PROFILE = {
+    'OBESITY': (32.0, 0.18, 1.2), 'DIABETES': (11.0, 0.12, 0.6), 'BPHIGH': (32.0, 0.15, 0.9),
+    'CHD': (6.5, 0.05, 0.3), 'LPA': (26.0, 0.25, 1.4), 'CSMOKING': (17.0, 0.20, 0.8),
+    'ACCESS2': (12.0, 0.30, 0.5), 'SLEEP': (35.0, 0.10, 0.4),
+}
+FARA_FLAGS = ['LILATracts_1And10', 'LILATracts_halfAnd10', 'LILATracts_1And20',
+              'LILATracts_Vehicle', 'LowIncomeTracts', 'Urban', 'GroupQuartersFlag', 'HUNVFlag']
+FARA_COUNTS = {'TractLOWI': 0.35, 'TractKids': 0.23, 'TractSeniors': 0.14, 'TractWhite': 0.62,
+               'TractBlack': 0.13, 'TractAsian': 0.05, 'TractHispanic': 0.16, 'TractSNAP': 0.05,
+               'lahunvhalf': 0.02, 'lahunv1': 0.01, 'lahunv10': 0.002}
+
+
+def fixture_root(size, fixture_dir=FIXTURE_DIR):
+    """Directory holding the fixture for a named size ('68k', '250k', '1m') or tract count"""
+    return os.path.join(fixture_dir, str(size))
+
+
+def _allocate(weights, total):
+    """Integer counts proportional to weights summing to total (largest remainder)"""
+    exact = np.asarray(weights, dtype=np.float64) / np.sum(weights) * total
+    counts = np.floor(exact).astype(np.int64)
+    counts[np.argsort(counts - exact)[:total - counts.sum()]] += 1
+    return counts
+
+
+def tracts(n, seed=SEED):
+    """GEOID, StateAbbr, county, latitude, longitude and land area for n tracts"""
+    rng = np.random.default_rng(seed)
+    abbr, fips, weight, lat, lon = (np.array(col) for col in zip(*STATES))
+    per_state = _allocate(weight, n)
+    state = np.repeat(np.arange(len(STATES)), per_state)
+
+    # Tracts are numbered within counties; counties are odd FIPS codes as in the real files
+    n_counties = np.clip(per_state // TRACTS_PER_COUNTY, 1, MAX_COUNTIES)
+    start = np.cumsum(per_state) - per_state
+    within = np.arange(n) - start[state]
+    county = within % n_counties[state]
+    tract = within // n_counties[state]
+    geoid = pd.Series(fips[state]).str.cat([
+        pd.Series(2 * county + 1).astype(str).str.zfill(3),
+        pd.Series(100 * (tract + 1)).astype(str).str.zfill(6)])
+
+    # Counties scatter around the state centre, tracts around their county
+    county_key = state * 10_000 + county
+    keys, county_idx = np.unique(county_key, return_inverse=True)
+    spread = np.where(abbr[keys // 10_000] == 'DC', 0.05, 1.5)
+    county_lat = lat[keys // 10_000] + rng.normal(0, 1, len(keys)) * spread * 0.6
+    county_lon = lon[keys // 10_000] + rng.normal(0, 1, len(keys)) * spread
+    urban = rng.random(n) < 0.75
+    jitter = np.where(urban, 0.04, 0.25)
+    return pd.DataFrame({
+        'GEOID': geoid.to_numpy(),
+        'StateAbbr': abbr[state],
+        'county': county_idx,
+        'latitude': np.round(county_lat[county_idx] + rng.normal(0, 1, n) * jitter, 6),
+        'longitude': np.round(county_lon[county_idx] + rng.normal(0, 1, n) * jitter * 1.3, 6),
+        'urban': urban.astype(np.int8),
+        'aland': np.round(np.where(urban, rng.lognormal(14.5, 1.0, n),
+                                   rng.lognormal(18.0, 1.2, n))).astype(np.int64),
+    })
+
+
+def fara(geo, seed=SEED):
+    """FARA 2019 wide table, including "NULL" suppression in the vehicle flag"""
+    rng = np.random.default_rng(seed + 1)
+    n = len(geo)
+    pop = np.clip(rng.lognormal(8.25, 0.45, n), 50, 40_000).astype(np.int64)
+    poverty = np.clip(rng.gamma(2.0, 7.5, n), 0, 100)
+    low_access = rng.random(n) < np.where(geo['urban'] == 1, 0.25, 0.55)
+    low_income = (poverty >= 20) | (rng.random(n) < 0.1)
+    df = pd.DataFrame({
+        'CensusTract': geo['GEOID'].str.lstrip('0').to_numpy(),
+        'State': geo['StateAbbr'].to_numpy(),
+        'County': 'County ' + geo['GEOID'].str[2:5],
+    })
+    flags = {
+        'LILATracts_1And10': low_access & low_income,
+        'LILATracts_halfAnd10': (low_access | (rng.random(n) < 0.2)) & low_income,
+        'LILATracts_1And20': low_access & low_income & (rng.random(n) < 0.9),
+        'LILATracts_Vehicle': low_income & (rng.random(n) < 0.15),
+        'LowIncomeTracts': low_income,
+        'Urban': geo['urban'].to_numpy() == 1,
+        'GroupQuartersFlag': rng.random(n) < 0.01,
+        'HUNVFlag': rng.random(n) < 0.2,
+    }
+    for col in FARA_FLAGS:
+        df[col] = flags[col].astype(np.int64)
+    df['Pop2010'] = pop
+    df['OHU2010'] = np.round(pop / rng.uniform(2.2, 3.0, n)).astype(np.int64)
+    df['PovertyRate'] = np.round(poverty, 1)
+    df['MedianFamilyIncome'] = np.round(np.clip(110_000 * np.exp(-poverty / 30)
+                                                * rng.lognormal(0, 0.25, n), 10_000, 250_001))
+    df['PCTGQTRS'] = np.round(np.where(flags['GroupQuartersFlag'], rng.uniform(67, 100, n),
+                                       rng.exponential(1.5, n)), 2)
+    for col, share in FARA_COUNTS.items():
+        df[col] = np.round(pop * np.clip(rng.normal(share, share * 0.5, n), 0, 1))
+    df['lapophalf'] = np.round(pop * np.where(low_access, rng.uniform(0.5, 1, n), rng.uniform(0, 0.5, n)))
+    df['lapop1'] = np.round(df['lapophalf'] * rng.uniform(0.3, 1, n))
+    df['lapophalfshare'] = np.round(df['lapophalf'] / pop, 4)
+    vehicle = df['LILATracts_Vehicle'].astype(object)
+    vehicle[rng.random(n) < 0.01] = 'NULL'
+    df['LILATracts_Vehicle'] = vehicle
+    return df
+
+
+def measures(geo, fara_table, seed=SEED):
+    """Tract-level prevalence (and 95% limits) of every synthetic PLACES measure"""
+    rng = np.random.default_rng(seed + 2)
+    n = len(geo)
+    poverty = fara_table['PovertyRate'].to_numpy()
+    lila = fara_table['LILATracts_1And10'].to_numpy()
+    state_shift = pd.Series(rng.normal(0, 1.5, len(STATES)), index=[s[0] for s in STATES])
+    shift = state_shift.reindex(geo['StateAbbr']).to_numpy()
+    out = {}
+    for measure, (mean, slope, lila_shift) in MEASURE_PROFILE.items():
+        value = mean + slope * (poverty - 15) + lila_shift * lila + shift * mean / 30
+        value = np.round(np.clip(value + rng.normal(0, mean * 0.12, n), 0.5, 95), 1)
+        half = np.clip(rng.gamma(4.0, mean * 0.012, n), 0.1, None)
+        out[measure] = (value, np.round(value - half * rng.uniform(0.8, 1.2, n), 1),
+                        np.round(value + half * rng.uniform(0.8, 1.2, n), 1))
+    return out
+
+
+def places_long(geo, values):
+    """PLACES tract file in its long layout (one row per tract x measure)"""
+    parts = []
+    for measure, (value, low, high) in values.items():
+        parts.append(pd.DataFrame({
+            'Year': 2021, 'StateAbbr': geo['StateAbbr'], 'StateDesc': geo['StateAbbr'],
+            'CountyName': 'County', 'CountyFIPS': geo['GEOID'].str[:5],
+            'LocationName': geo['GEOID'], 'DataSource': 'BRFSS', 'Category': 'Health Outcomes',
+            'Measure': f"Synthetic {measure}", 'Data_Value_Unit': '%',
+            'Data_Value_Type': 'Crude prevalence', 'Data_Value': value,
+            'Low_Confidence_Limit': low, 'High_Confidence_Limit': high,
+            'TotalPopulation': 4000, 'LocationID': geo['GEOID'], 'MeasureId': measure,
+        }))
+    return pd.concat(parts, ignore_index=True)
+
+
+def burden_table(geo, values):
+    """Wide outcome table with the zmean burden, as written by the Go model step"""
+    measure_of = burden_model.OUTCOME_MEASURES
+    wide = pd.DataFrame({'TractFIPS': geo['GEOID'], 'StateAbbr': geo['StateAbbr']})
+    for outcome, measure in measure_of.items():
+        wide[outcome] = values[measure][0] if measure in values else np.nan
+    outcomes = [o for o in measure_of if measure_of[o] in values]
+    wide['burden'] = np.round(burden_model.compose_burden(wide, outcomes), 6)
+    return wide
+
+
+def model_table(burden, fara_table):
+    """Model table with residuals and resilience scores, fitted by burden_model"""
+    fara_typed = fara_table.assign(
+        GEOID=burden['TractFIPS'].to_numpy(),
+        LILATracts_Vehicle=pd.to_numeric(fara_table['LILATracts_Vehicle'], errors='coerce'))
+    table, _ = burden_model.fit_expected_burden(burden, fara_typed, se_type='classical')
+    return table.round(6)
+
+
+def gazetteer(geo):
+    """2019 gazetteer tract file columns"""
+    return pd.DataFrame({
+        'USPS': geo['StateAbbr'], 'GEOID': geo['GEOID'], 'ALAND': geo['aland'],
+        'AWATER': (geo['aland'] * 0.02).astype(np.int64),
+        'ALAND_SQMI': np.round(geo['aland'] / 2_589_988, 3),
+        'AWATER_SQMI': np.round(geo['aland'] * 0.02 / 2_589_988, 3),
+        'INTPTLAT': geo['latitude'], 'INTPTLONG': geo['longitude'],
+    })
+
+
+def place_polygons(geo, seed=SEED):
+    """Circular Census-place polygons around a sample of county centres"""
+    rng = np.random.default_rng(seed + 3)
+    centres = geo.groupby('county').agg(lat=('latitude', 'median'), lon=('longitude', 'median'),
+                                        state=('GEOID', lambda g: g.iloc[0][:2]))
+    centres = centres[rng.random(len(centres)) < PLACES_PER_COUNTY]
+    radius = rng.uniform(0.03, 0.2, len(centres))
+    geometry = shapely.buffer(shapely.points(centres['lon'], centres['lat']), radius, quad_segs=8)
+    placefp = pd.Series(np.arange(len(centres)) % 99_999 + 1).astype(str).str.zfill(5)
+    return gpd.GeoDataFrame({
+        'GEOID': centres['state'].to_numpy() + placefp.to_numpy(),
+        'NAME': 'Place ' + placefp.to_numpy(),
+        'STATEFP': centres['state'].to_numpy(),
+        'PLACEFP': placefp.to_numpy(),
+    }, geometry=geometry, crs='EPSG:4269')
+
+
+def tract_polygons(geo):
+    """Square tract polygons sized by land area around each centroid"""
+    half = np.sqrt(geo['aland'].to_numpy()) / 2 / 111_000
+    lon, lat = geo['longitude'].to_numpy(), geo['latitude'].to_numpy()
+    geometry = shapely.box(lon - half, lat - half, lon + half, lat + half)
+    return gpd.GeoDataFrame({'GEOID': geo['GEOID']}, geometry=geometry, crs='EPSG:4269')
+
+
+def write_fixture(n, root, seed=SEED, force=False):
+    """
+    Write a complete n-tract fixture under root, mirroring the repo's data paths
+
+    Returns the file paths written; an existing fixture is reused unless force.
+    """
+    paths = {
+        'places': os.path.join(root, 'data/raw/places_tract.csv'),
+        'fara': os.path.join(root, 'data/interim/fara_2019.csv'),
+        'burden': os.path.join(root, 'data/processed/burden_table.csv'),
+        'model': os.path.join(root, 'data/processed/model_table_with_residuals.csv'),
+        'gazetteer': os.path.join(root, 'data/census_gazetteer/2019_Gaz_tracts_national.txt'),
+        'gazetteer_zip': os.path.join(root, 'data/census_gazetteer/tracts.zip'),
+        'place_polygons': os.path.join(root, 'data/tiger_places/places.geojson'),
+        'tract_polygons': os.path.join(root, 'data/external/tracts_full.geojson'),
+        'config': os.path.join(root, 'config/default.yml'),
+    }
+    if not force and all(os.path.exists(p) for p in paths.values()):
+        return paths
+    for path in paths.values():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    print(f"Generating {n:,}-tract fixture in {root}...")
+    geo = tracts(n, seed)
+    fara_table = fara(geo, seed)
+    values = measures(geo, fara_table, seed)
+    burden = burden_table(geo, values)
+
+    fara_table.to_csv(paths['fara'], index=False)
+    burden.to_csv(paths['burden'], index=False)
+    model_table(burden, fara_table).to_csv(paths['model'], index=False)
+    places_long(geo, values).to_csv(paths['places'], index=False)
+    gazetteer(geo).to_csv(paths['gazetteer'], sep='\t', index=False)
+    with zipfile.ZipFile(paths['gazetteer_zip'], 'w', zipfile.ZIP_DEFLATED) as z:
+        z.write(paths['gazetteer'], os.path.basename(paths['gazetteer']))
+    place_polygons(geo, seed).to_file(paths['place_polygons'], driver='GeoJSON')
+    tract_polygons(geo).to_file(paths['tract_polygons'], driver='GeoJSON')
+    with open(burden_model.CONFIG_PATH) as src, open(paths['config'], 'w') as dst:
+        dst.write(src.read())
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tracts', default='68k',
+                        help=f"tract count or one of {', '.join(SIZES)} (default 68k)")
+    parser.add_argument('--root', help='output directory (default data/benchmarks/fixtures/<size>)')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--force', action='store_true', help='regenerate an existing fixture')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("SYNTHETIC FIXTURE")
+    print("=" * 60)
+    n = SIZES.get(args.tracts) or int(args.tracts)
+    root = args.root or fixture_root(args.tracts)
+    for name, path in write_fixture(n, root, args.seed, args.force).items():
+        print(f"  {name:15s} {path} ({os.path.getsize(path) / 1e6:,.1f} MB)")
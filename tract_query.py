@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+In-memory query index over the resilience table
+Loads the tract store once, orders tracts by resilience_score and builds an
+STRtree over tract centroids plus per-state position lists, so bbox, state,
+LILA and top-N queries are answered from index lookups instead of file
+downloads. serve_map.py exposes it as /tracts and /tract/<GEOID>.
+"""
+
+import gzip
+import json
+from urllib.parse import parse_qs
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc
+import shapely
+from shapely import STRtree
+
+import tract_store
+
+COLUMNS = ['GEOID', 'StateAbbr', 'County', 'resilience_score', 'burden', 'resid',
+           'lila', 'latitude', 'longitude']
+MAX_ROWS = 10000  # default cap on rows returned when top is not given
+ARROW_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+def load_table():
+    """Model table with LILA flag, county and gazetteer centroid per tract"""
+    table = tract_store.load_model_table()
+    fara = tract_store.load_fara(['LILATracts_1And10', 'County'])
+    table = table.merge(fara, on='GEOID', how='left')
+    table['lila'] = table['LILATracts_1And10'].fillna(0).astype(np.int8)
+    table = table.merge(tract_store.load_centroids(), on='GEOID', how='left')
+    return table[COLUMNS]
+
+
+def _json_list(values):
+    """List for json.dumps with NaN written as null"""
+    if values.dtype.kind == 'f':
+        missing = np.isnan(values)
+        if missing.any():
+            out = values.astype(object)
+            out[missing] = None
+            return out.tolist()
+    return values.tolist()
+
+
+class TractIndex:
+    """
+    Query index over one tract table
+
+    Rows are stored in descending resilience_score order (NaN last), so any
+    ascending set of row positions is already ranked and top-N is a slice.
+    """
+
+    def __init__(self, table=None):
+        table = load_table() if table is None else table
+        table = table.sort_values('resilience_score', ascending=False, na_position='last',
+                                  kind='stable').reset_index(drop=True)
+        self.columns = {c: table[c].to_numpy() for c in table.columns}
+        for c in ('GEOID', 'StateAbbr', 'County'):
+            if c in self.columns:
+                self.columns[c] = self.columns[c].astype(str)
+        self.n = len(table)
+        self.geoid = {g: i for i, g in enumerate(self.columns['GEOID'])}
+        self.states = {s: np.flatnonzero(self.columns['StateAbbr'] == s)
+                       for s in np.unique(self.columns['StateAbbr'])}
+        located = np.flatnonzero(np.isfinite(table['latitude'].to_numpy(dtype=np.float64)))
+        self.located = located
+        self.tree = STRtree(shapely.points(table['longitude'].to_numpy()[located],
+                                           table['latitude'].to_numpy()[located]))
+        # Negated so the descending scores are ascending for searchsorted
+        self.neg_score = -np.nan_to_num(table['resilience_score'].to_numpy(dtype=np.float64),
+                                        nan=-np.inf)
+
+    def query(self, bbox=None, state=None, lila=None, min_score=None, max_score=None):
+        """Ascending (= rank-ordered) row positions matching every given filter"""
+        pos = None
+
+        def narrow(current, candidates):
+            return candidates if current is None else np.intersect1d(current, candidates,
+                                                                     assume_unique=True)
+
+        if min_score is not None or max_score is not None:
+            start, stop = 0, self.n
+            if max_score is not None:
+                start = np.searchsorted(self.neg_score, -max_score, side='left')
+            if min_score is not None:
+                stop = np.searchsorted(self.neg_score, -min_score, side='right')
+            pos = np.arange(start, stop)
+        if state is not None:
+            pos = narrow(pos, self.states.get(state.upper(), np.array([], dtype=np.int64)))
+        if bbox is not None:
+            hits = self.located[self.tree.query(shapely.box(*bbox))]
+            pos = narrow(pos, np.sort(hits))
+        if pos is None:
+            pos = np.arange(self.n)
+        if lila is not None:
+            pos = pos[self.columns['lila'][pos] == int(lila)]
+        return pos
+
+    def records(self, pos, columns=None):
+        """Column arrays for the given row positions"""
+        return {c: self.columns[c][pos] for c in (columns or COLUMNS) if c in self.columns}
+
+    def to_json(self, pos, total, columns=None):
+        data = {c: _json_list(v) for c, v in self.records(pos, columns).items()}
+        return json.dumps({'total': int(total), 'returned': len(pos), 'columns': data},
+                          separators=(',', ':')).encode()
+
+    def to_arrow(self, pos, columns=None):
+        table = pa.table(self.records(pos, columns))
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def tract(self, geoid):
+        """One tract as a dict, or None"""
+        i = self.geoid.get(str(geoid).zfill(11))
+        if i is None:
+            return None
+        row = {c: _json_list(v[i:i + 1])[0] for c, v in self.columns.items()}
+        row['rank'] = i + 1
+        return row
+
+
+def parse_params(query):
+    """Filters and output options from a /tracts query string"""
+    params = {k: v[-1] for k, v in parse_qs(query).items()}
+    filters = {}
+    if 'bbox' in params:
+        bbox = [float(v) for v in params['bbox'].split(',')]
+        if len(bbox) != 4:
+            raise ValueError('bbox must be minlon,minlat,maxlon,maxlat')
+        filters['bbox'] = bbox
+    if 'state' in params:
+        filters['state'] = params['state']
+    if 'lila' in params:
+        filters['lila'] = int(params['lila'])
+    for key in ('min_score', 'max_score'):
+        if key in params:
+            filters[key] = float(params[key])
+    top = int(params.get('top', MAX_ROWS))
+    if top < 0:
+        raise ValueError('top must be non-negative')
+    columns = params['columns'].split(',') if 'columns' in params else None
+    return filters, top, columns, params.get('format')
+
+
+class QueryAPI:
+    """HTTP adapter used by serve_map: respond() returns (status, headers, body)"""
+
+    def __init__(self, index=None):
+        self.index = index or TractIndex()
+
+    def handles(self, path):
+        return path == '/tracts' or path.startswith('/tract/')
+
+    def respond(self, path, query, accept='', accept_encoding=''):
+        try:
+            if path.startswith('/tract/'):
+                row = self.index.tract(path[len('/tract/'):])
+                if row is None:
+                    return self._json(404, {'error': 'unknown GEOID'}, accept_encoding)
+                return self._json(200, row, accept_encoding)
+            filters, top, columns, fmt = parse_params(query)
+        except ValueError as e:
+            return self._json(400, {'error': str(e)}, accept_encoding)
+
+        pos = self.index.query(**filters)
+        total = len(pos)
+        pos = pos[:top]
+        if fmt == 'arrow' or (fmt is None and ARROW_TYPE in accept):
+            return 200, {'Content-Type': ARROW_TYPE}, self.index.to_arrow(pos, columns)
+        return self._encoded(200, self.index.to_json(pos, total, columns), accept_encoding)
+
+    def _json(self, status, payload, accept_encoding):
+        return self._encoded(status, json.dumps(payload, separators=(',', ':')).encode(),
+                             accept_encoding)
+
+    def _encoded(self, status, body, accept_encoding):
+        headers = {'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'}
+        if len(body) > 1400 and 'gzip' in accept_encoding:
+            body = gzip.compress(body, 5)
+            headers['Content-Encoding'] = 'gzip'
+        return status, headers, body
+
+
+if __name__ == "__main__":
+    import time
+    print("=" * 60)
+    print("TRACT QUERY INDEX")
+    print("=" * 60)
+    start = time.perf_counter()
+    index = TractIndex()
+    print(f"Indexed {index.n:,} tracts in {time.perf_counter() - start:.2f}s")
+    for label, filters in [('bbox (Nashville)', {'bbox': [-87.1, 35.9, -86.5, 36.4]}),
+                           ('state=TN lila=1', {'state': 'TN', 'lila': 1})]:
+        start = time.perf_counter()
+        pos = index.query(**filters)[:50]
+        body = index.to_json(pos, len(pos))
+        print(f"{label}: {len(pos)} rows, {len(body):,} bytes, "
+              f"{(time.perf_counter() - start) * 1000:.2f} ms")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Shared columnar tract store
+Converts the model table and FARA CSV to Parquet once, keyed by a normalized
+11-digit GEOID, and serves cached merges to every analysis script. Tables
+are stored compact (see compact_types) and expanded back to their CSV
+types on load unless compact=True is asked for.
+"""
+
+import os
+import zipfile
+from functools import lru_cache
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import compact_types
+
+MODEL_CSV = 'data/processed/model_table_with_residuals.csv'
+FARA_CSV = 'data/interim/fara_2019.csv'
+STORE_DIR = 'data/interim/tract_store'
+GAZETTEER_ZIP = 'data/census_gazetteer/tracts.zip'
+GAZETTEER_MEMBER = '2019_Gaz_tracts_national.txt'
+
+# FARA columns that stay as text; everything else is coerced to numeric
+FARA_TEXT_COLUMNS = ['State', 'County']
+
+
+def normalize_geoid(values):
+    """Return GEOIDs as zero-padded 11-character strings"""
+    return pd.Series(values).astype(str).str.strip().str.zfill(11).values
+
+
+def _is_stale(source, target):
+    """True when the Parquet copy is missing or older than its CSV source"""
+    if not os.path.exists(target):
+        return True
+    return os.path.getmtime(source) > os.path.getmtime(target)
+
+
+def _convert_model_table(source, target):
+    """Parse the model table once and write it as Parquet"""
+    print(f"Converting {source} to columnar store...")
+    df = pd.read_csv(source, dtype={'TractFIPS': str, 'GEOID': str, 'StateAbbr': str})
+    df['TractFIPS'] = normalize_geoid(df['TractFIPS'])
+    df['GEOID'] = normalize_geoid(df['GEOID'])
+    compact_types.write_parquet(compact_types.compact_frame(df), target)
+
+
+def convert_fara(source, target):
+    """Parse a wide FARA CSV and write it as typed Parquet (also used for panel vintages)"""
+    print(f"Converting {source} to columnar store...")
+    df = pd.read_csv(source, dtype={'CensusTract': str}, low_memory=False)
+    df.insert(0, 'GEOID', normalize_geoid(df['CensusTract']))
+    for col in df.columns:
+        if col in ('GEOID', 'CensusTract') or col in FARA_TEXT_COLUMNS:
+            continue
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            # FARA marks suppressed values with text such as "NULL"
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    compact_types.write_parquet(compact_types.compact_frame(df), target)
+
+
+def store_path(name, store_dir=STORE_DIR):
+    """Path of a table inside the store"""
+    return os.path.join(store_dir, f"{name}.parquet")
+
+
+def build_store(model_csv=MODEL_CSV, fara_csv=FARA_CSV, store_dir=STORE_DIR, force=False):
+    """Convert any stale CSV sources into the columnar store"""
+    os.makedirs(store_dir, exist_ok=True)
+    for name, source, convert in [('model', model_csv, _convert_model_table),
+                                  ('fara', fara_csv, convert_fara)]:
+        target = store_path(name, store_dir)
+        if force or _is_stale(source, target):
+            # Readers in other processes never see a half-written file
+            tmp = f"{target}.{os.getpid()}.tmp"
+            convert(source, tmp)
+            os.replace(tmp, target)
+    return store_dir
+
+
+def _read_table(name, columns=None, store_dir=STORE_DIR, compact=False):
+    """Memory-map a store table and return the requested columns"""
+    path = store_path(name, store_dir)
+    if columns is not None:
+        available = pq.read_schema(path).names
+        missing = [c for c in columns if c not in available]
+        if missing:
+            raise KeyError(f"{name} store has no column(s): {', '.join(missing)}")
+    return compact_types.read_parquet(path, columns, expand=not compact)
+
+
+@lru_cache(maxsize=None)
+def _cached_table(name, columns, store_dir, compact=False):
+    build_store(store_dir=store_dir)
+    return _read_table(name, list(columns) if columns is not None else None, store_dir, compact)
+
+
+@lru_cache(maxsize=None)
+def _cached_merge(columns, store_dir, compact=False):
+    # Every column subset is sliced from the one full FARA read
+    results = _cached_table('model', None, store_dir, compact)
+    fara = _cached_table('fara', None, store_dir, compact)
+    if columns is None:
+        fara = fara.drop(columns=[c for c in fara.columns if c in results.columns and c != 'GEOID'])
+    else:
+        fara_cols = ['GEOID'] + [c for c in columns if c != 'GEOID']
+        missing = [c for c in fara_cols if c not in fara.columns]
+        if missing:
+            raise KeyError(f"fara store has no column(s): {', '.join(missing)}")
+        fara = fara[fara_cols]
+    if not compact:
+        return results.merge(fara, on='GEOID', how='left')
+    # Integer join; nullable integers keep unmatched rows from upcasting to float64
+    merged = results.merge(compact_types.nullable(fara), on='GEOID', how='left')
+    merged.attrs['compact'] = compact_types.merge_info(results, fara)
+    return merged
+
+
+def _as_key(columns):
+    return None if columns is None else tuple(columns)
+
+
+def load_model_table(store_dir=STORE_DIR, compact=False):
+    """Model results (TractFIPS, StateAbbr, burden, resid, resilience_score, GEOID)"""
+    return _cached_table('model', None, store_dir, compact).copy()
+
+
+def load_fara(columns=None, store_dir=STORE_DIR, compact=False):
+    """FARA 2019 tract attributes with a normalized GEOID column"""
+    if columns is not None and 'GEOID' not in columns:
+        columns = ['GEOID'] + list(columns)
+    return _cached_table('fara', _as_key(columns), store_dir, compact).copy()
+
+
+def load_merged(columns=None, store_dir=STORE_DIR, compact=False):
+    """
+    Model results left-joined to FARA on GEOID
+
+    columns selects the FARA columns to attach (all of them when None).
+    Repeated calls with the same columns are served from memory; callers
+    receive their own copy and may modify it freely. compact=True returns
+    int64 GEOIDs, categorical text, int8 flags and float32 values instead
+    (compact_types.expand_frame converts back).
+    """
+    return _cached_merge(_as_key(columns), store_dir, compact).copy()
+
+
+@lru_cache(maxsize=None)
+def _cached_centroids(zip_path, member):
+    # Always the downloaded archive, never an extracted copy, so the zip is the
+    # one file pipeline steps need to declare
+    with zipfile.ZipFile(zip_path) as z:
+        with z.open(member) as f:
+            gaz = pd.read_csv(f, sep='\t', dtype={'GEOID': str})
+    gaz.columns = gaz.columns.str.strip()
+    gaz = gaz[['GEOID', 'INTPTLAT', 'INTPTLONG']]
+    gaz.columns = ['GEOID', 'latitude', 'longitude']
+    gaz['GEOID'] = normalize_geoid(gaz['GEOID'])
+    return gaz
+
+
+def load_centroids(zip_path=GAZETTEER_ZIP, member=GAZETTEER_MEMBER):
+    """Tract internal points (GEOID, latitude, longitude) from the 2019 gazetteer zip"""
+    return _cached_centroids(zip_path, member).copy()
+
+
+def clear_cache():
+    """Drop in-memory tables, e.g. after rebuilding the store"""
+    _cached_table.cache_clear()
+    _cached_merge.cache_clear()
+    _cached_centroids.cache_clear()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BUILDING COLUMNAR TRACT STORE")
+    print("=" * 60)
+    build_store(force=True)
+    for name in ['model', 'fara']:
+        meta = pq.read_metadata(store_path(name))
+        size_mb = os.path.getsize(store_path(name)) / 1e6
+        print(f"  {store_path(name)}: {meta.num_rows:,} rows x {meta.num_columns} columns ({size_mb:.1f} MB)")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Nearest-neighbour twin matching
+Pairs each tract with its most similar tracts from a comparison pool on
+standardized covariates, using one KD-tree per exact-match stratum and a
+single vectorized query per stratum
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+DEFAULT_COVARIATES = ['PovertyRate', 'Pop2010']
+DEFAULT_EXACT = ['Urban']
+CALIPER_CANDIDATES = 50  # nearest candidates checked against calipers before widening
+
+
+def add_demographic_shares(frame, population='Pop2010'):
+    """Add pct_white/black/hispanic/asian columns from FARA tract counts"""
+    frame = frame.copy()
+    pop = frame[population].where(frame[population] > 0)
+    for col, share in [('TractWhite', 'pct_white'), ('TractBlack', 'pct_black'),
+                       ('TractHispanic', 'pct_hispanic'), ('TractAsian', 'pct_asian')]:
+        if col in frame.columns:
+            frame[share] = frame[col] / pop * 100
+    return frame
+
+
+def match_twins(treated, pool, covariates=None, exact=None, k=1, weights=None, calipers=None):
+    """
+    The k nearest pool tracts for every treated tract
+
+    Covariates are z-scored with the combined mean/SD of treated and pool
+    (weights optionally rescales them) and matching is exact on the exact
+    columns. calipers maps a covariate to the largest allowed absolute
+    difference in its original units: each treated tract gets its k closest
+    twins inside every caliper, searching further out as needed, and no
+    twin when none qualifies.
+
+    Returns one row per pair: treated_index, pool_index (labels from the input
+    frames), twin_rank (1 = closest) and distance (standardized units).
+    """
+    covariates = covariates or DEFAULT_COVARIATES
+    exact = DEFAULT_EXACT if exact is None else exact
+    needed = covariates + exact
+    treated = treated.dropna(subset=needed)
+    pool = pool.dropna(subset=needed)
+
+    both = pd.concat([treated[covariates], pool[covariates]])
+    center = both.mean().to_numpy()
+    scale = both.std().replace(0, 1).to_numpy()
+    if weights is not None:
+        scale = scale / np.array([weights.get(c, 1.0) for c in covariates])
+
+    def standardize(frame):
+        return (frame[covariates].to_numpy(dtype=np.float64) - center) / scale
+
+    pairs = []
+    pool_groups = pool.groupby(exact).indices if exact else {(): np.arange(len(pool))}
+    treated_groups = treated.groupby(exact).indices if exact else {(): np.arange(len(treated))}
+    calipers = calipers or {}
+    for key, t_pos in treated_groups.items():
+        p_pos = pool_groups.get(key)
+        if p_pos is None or len(p_pos) == 0:
+            continue
+        tree = cKDTree(standardize(pool.iloc[p_pos]))
+        points = standardize(treated.iloc[t_pos])
+        t_cal = {c: treated[c].to_numpy(dtype=np.float64)[t_pos] for c in calipers}
+        p_cal = {c: pool[c].to_numpy(dtype=np.float64)[p_pos] for c in calipers}
+        # Candidates are widened only for tracts without k twins inside the calipers
+        kk = min(max(k, CALIPER_CANDIDATES) if calipers else k, len(p_pos))
+        todo = np.arange(len(t_pos))
+        while len(todo):
+            dist, idx = tree.query(points[todo], k=kk)
+            dist, idx = dist.reshape(len(todo), kk), idx.reshape(len(todo), kk)
+            valid = np.ones(idx.shape, dtype=bool)
+            for col, limit in calipers.items():
+                valid &= np.abs(t_cal[col][todo][:, None] - p_cal[col][idx]) < limit
+            rank = np.cumsum(valid, axis=1)
+            take = valid & (rank <= k)
+            done = (rank[:, -1] >= k) | (kk == len(p_pos))
+            rows, cols = np.nonzero(take & done[:, None])
+            pairs.append(pd.DataFrame({
+                'treated_index': treated.index.values[t_pos[todo[rows]]],
+                'pool_index': pool.index.values[p_pos[idx[rows, cols]]],
+                'twin_rank': rank[rows, cols],
+                'distance': dist[rows, cols],
+            }))
+            todo = todo[~done]
+            kk = min(kk * 4, len(p_pos))
+
+    if not pairs:
+        return pd.DataFrame(columns=['treated_index', 'pool_index', 'twin_rank', 'distance'])
+    return pd.concat(pairs, ignore_index=True)
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Vector tile pyramid for the resilience map
+Simplifies tract polygons per zoom level, clips them to web-mercator tiles,
+quantizes to the tile grid and encodes Mapbox Vector Tiles (MVT v2) carrying
+GEOID, resilience_score, burden, resid and the bivariate LILA intensity x
+resilience class. Writes a z/x/y .pbf directory
+and/or a single MBTiles archive so the map only fetches the tiles in view.
+"""
+
+import gzip
+import json
+import math
+import os
+import shutil
+import sqlite3
+import struct
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+import yaml
+
+import bivariate
+import tract_store
+
+CONFIG_PATH = 'config/default.yml'
+FIGURES_DIR = 'figures'
+TILE_DIR = 'figures/tiles'
+MBTILES_PATH = 'figures/resilience.mbtiles'
+
+LAYER = 'tracts'
+PROPERTIES = ['resilience_score', 'burden', 'resid']
+CLASS_PROPERTY = 'bivariate_class'  # integer code, carried at every zoom
+EXTENT = 4096
+BUFFER = 64            # tile units of geometry kept outside each tile edge
+MIN_ZOOM = 3
+MAX_ZOOM = 10
+SIMPLIFY_UNITS = 2.0   # simplification tolerance in tile units (16 units = 1 px at 256 px)
+MIN_AREA_UNITS = 64.0  # polygons/rings smaller than this (tile units², ~1/4 px²) are dropped
+DECIMALS = 3           # attribute rounding; lets equal values share one entry
+DETAIL_ZOOM = 8        # first zoom carrying ids, GEOID and every property
+COARSE_DECIMALS = 1    # resilience_score rounding below DETAIL_ZOOM
+
+ORIGIN = math.pi * 6378137.0  # half the web-mercator world width (m)
+
+
+def load_tracts(path=None):
+    """Tract polygons (GEOID, geometry) joined to the model table and bivariate classes, in EPSG:3857"""
+    if path is None:
+        with open(CONFIG_PATH) as f:
+            path = yaml.safe_load(f)['paths'].get('tracts_geojson_path')
+    tracts = gpd.read_file(path)[['GEOID', 'geometry']]
+    tracts['GEOID'] = tract_store.normalize_geoid(tracts['GEOID'])
+    model = tract_store.load_model_table()[['GEOID'] + PROPERTIES]
+    tracts = tracts.merge(model, on='GEOID', how='left')
+    classes = bivariate.tract_classes()[['GEOID', CLASS_PROPERTY]]
+    tracts = tracts.merge(classes, on='GEOID', how='left')
+    tracts[CLASS_PROPERTY] = tracts[CLASS_PROPERTY].fillna(0).astype(np.int16)
+    if tracts.crs is None:
+        tracts = tracts.set_crs('EPSG:4326')
+    return tracts.to_crs('EPSG:3857')
+
+
+# --- protobuf primitives -----------------------------------------------------
+
+def _varint(n):
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _field(number, payload):
+    """Length-delimited field"""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _varint_array(values):
+    """Varint-encode a uint array; returns (bytes as uint8 array, bytes per value)"""
+    v = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(v), dtype=np.int64)
+    for k in range(1, 5):
+        nbytes += v >= np.uint64(1 << (7 * k))
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max()) if len(v) else 0):
+        sel = nbytes > k
+        byte = (v[sel] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        byte |= np.where(nbytes[sel] > k + 1, 0x80, 0).astype(np.uint64)
+        out[starts[sel] + k] = byte
+    return out, nbytes
+
+
+# --- geometry ------------------------------------------------------------------
+
+def tile_bounds(z, x, y):
+    """(minx, miny, maxx, maxy) of a tile in web-mercator metres"""
+    span = 2 * ORIGIN / 2 ** z
+    return -ORIGIN + x * span, ORIGIN - (y + 1) * span, -ORIGIN + (x + 1) * span, ORIGIN - y * span
+
+
+def tiles_for_bounds(bounds, z, buffer=0.0):
+    """Feature-tile pairs (feature, x, y) for every tile each bounding box touches"""
+    n = 2 ** z
+    span = 2 * ORIGIN / n
+    pad = buffer * span
+    x0 = np.clip(np.floor((bounds[:, 0] - pad + ORIGIN) / span), 0, n - 1).astype(np.int64)
+    x1 = np.clip(np.floor((bounds[:, 2] + pad + ORIGIN) / span), 0, n - 1).astype(np.int64)
+    y0 = np.clip(np.floor((ORIGIN - bounds[:, 3] - pad) / span), 0, n - 1).astype(np.int64)
+    y1 = np.clip(np.floor((ORIGIN - bounds[:, 1] + pad) / span), 0, n - 1).astype(np.int64)
+    nx = x1 - x0 + 1
+    count = nx * (y1 - y0 + 1)
+    feature = np.repeat(np.arange(len(bounds)), count)
+    k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    return feature, x0[feature] + k % nx[feature], y0[feature] + k // nx[feature]
+
+
+def encode_geometries(geoms, z, x, y, extent=EXTENT, min_area=MIN_AREA_UNITS):
+    """
+    MVT polygon command streams for the (already clipped) geometries of one tile
+
+    Quantization, duplicate-point removal, tiny-ring dropping, winding fixes
+    and zigzag delta encoding are vectorized over every ring in the tile.
+    Returns (feature positions kept, list of encoded geometry bytes).
+    """
+    parts, owner = shapely.get_parts(geoms, return_index=True)
+    is_poly = shapely.get_type_id(parts) == 3
+    parts, owner = parts[is_poly], owner[is_poly]
+    if len(parts) == 0:
+        return np.array([], dtype=np.int64), []
+    _, coords, (ring_off, poly_off) = shapely.to_ragged_array(parts)
+
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    scale = extent / (maxx - minx)
+    q = np.empty((len(coords), 2), dtype=np.int64)
+    q[:, 0] = np.round((coords[:, 0] - minx) * scale)
+    q[:, 1] = np.round((maxy - coords[:, 1]) * scale)
+
+    n_rings = len(ring_off) - 1
+    ring = np.repeat(np.arange(n_rings), np.diff(ring_off))
+    ring_poly = np.repeat(np.arange(len(poly_off) - 1), np.diff(poly_off))
+    exterior = np.zeros(n_rings, dtype=bool)
+    exterior[poly_off[:-1][np.diff(poly_off) > 0]] = True
+
+    # Drop each ring's closing point and consecutive duplicates after quantization
+    first = np.r_[True, ring[1:] != ring[:-1]]
+    last = np.r_[ring[1:] != ring[:-1], True]
+    keep = ~last & (first | np.r_[True, (q[1:] != q[:-1]).any(axis=1)])
+    q, ring = q[keep], ring[keep]
+
+    # Twice the signed ring area (surveyor's formula, y down) and point counts
+    m = np.bincount(ring, minlength=n_rings)
+    start = np.cumsum(m) - m
+    nxt = np.arange(len(q)) + 1
+    wrap = np.r_[ring[1:] != ring[:-1], True]
+    nxt[wrap] = start[ring[wrap]]
+    cross = q[:, 0] * q[nxt, 1] - q[nxt, 0] * q[:, 1]
+    area2 = np.bincount(ring, weights=cross, minlength=n_rings)
+
+    ring_ok = (m >= 3) & (np.abs(area2) >= 2 * min_area)
+    poly_ok = np.zeros(len(poly_off) - 1, dtype=bool)
+    poly_ok[ring_poly[exterior]] = ring_ok[exterior]
+    ring_ok &= poly_ok[ring_poly]
+
+    # Exteriors must have positive area in tile coordinates, holes negative
+    flip = ring_ok & ((area2 > 0) != exterior)
+    pos = np.arange(len(q)) - start[ring]
+    order = np.where(flip[ring], start[ring] + m[ring] - 1 - pos, np.arange(len(q)))
+    q = q[order]
+    point_ok = ring_ok[ring]
+    q, ring = q[point_ok], ring[point_ok]
+    if len(q) == 0:
+        return np.array([], dtype=np.int64), []
+
+    kept_rings = np.flatnonzero(ring_ok)
+    ring_feature = owner[ring_poly[kept_rings]]
+    m = m[kept_rings]
+    point_feature = np.repeat(ring_feature, m)
+
+    # Cursor deltas restart at (0, 0) for each feature, zigzag encoded
+    prev = np.vstack([[0, 0], q[:-1]])
+    feature_start = np.r_[True, point_feature[1:] != point_feature[:-1]]
+    prev[feature_start] = 0
+    d = q - prev
+    zz = (d << 1) ^ (d >> 63)
+
+    # Per ring: MoveTo(1) x y LineTo(m-1) x y ... ClosePath
+    length = 2 * m + 3
+    out_start = np.cumsum(length) - length
+    stream = np.empty(int(length.sum()), dtype=np.int64)
+    stream[out_start] = 1 | (1 << 3)
+    stream[out_start + 3] = 2 | ((m - 1) << 3)
+    stream[out_start + length - 1] = 7 | (1 << 3)
+    p = np.arange(len(q)) - np.repeat(np.cumsum(m) - m, m)
+    slot = np.repeat(out_start, m) + 1 + 2 * p + (p >= 1)
+    stream[slot] = zz[:, 0]
+    stream[slot + 1] = zz[:, 1]
+
+    encoded, nbytes = _varint_array(stream)
+    element_feature = np.repeat(ring_feature, length)
+    features, first_elem = np.unique(element_feature, return_index=True)
+    byte_start = np.r_[np.cumsum(nbytes) - nbytes, len(encoded)]
+    bounds = np.r_[first_elem, len(stream)]
+    blobs = [encoded[byte_start[a]:byte_start[b]].tobytes() for a, b in zip(bounds[:-1], bounds[1:])]
+    return features, blobs
+
+
+def _tags(columns, n):
+    """
+    Layer keys, encoded values and per-feature packed tag bytes
+
+    columns maps key -> per-feature array (float with NaN, int, or str/None);
+    each column's distinct values go into the value table once.
+    """
+    keys, values, tag_f, tag_kv = [], [], [], []
+    for k, (name, col) in enumerate(columns.items()):
+        col = np.asarray(col)
+        if col.dtype.kind == 'f':
+            ok = ~np.isnan(col)
+            uniq, inv = np.unique(col[ok].astype(np.float32), return_inverse=True)
+            encoded = [b'\x15' + struct.pack('<f', v) for v in uniq]
+        elif col.dtype.kind in 'iu':
+            ok = np.ones(len(col), dtype=bool)
+            uniq, inv = np.unique(col, return_inverse=True)
+            encoded = [b'\x28' + _varint(int(v)) for v in uniq]  # uint_value
+        else:
+            ok = pd.notna(col)
+            uniq, inv = np.unique(col[ok].astype(str), return_inverse=True)
+            encoded = [_field(1, v.encode()) for v in uniq]
+        keys.append(name)
+        feature = np.flatnonzero(ok)
+        tag_f.append(feature)
+        tag_kv.append(np.column_stack([np.full(len(feature), k), inv + len(values)]))
+        values += encoded
+    tag_f = np.concatenate(tag_f)
+    order = np.argsort(tag_f, kind='stable')
+    tag_f, tag_kv = tag_f[order], np.concatenate(tag_kv)[order].ravel()
+    encoded, nbytes = _varint_array(tag_kv)
+    per_feature = np.bincount(np.repeat(tag_f, 2), weights=nbytes, minlength=n).astype(np.int64)
+    ends = np.cumsum(per_feature)
+    blob = encoded.tobytes()
+    return keys, values, [blob[e - b:e] for e, b in zip(ends, per_feature)]
+
+
+def encode_tile(ids, columns, geometries, layer=LAYER, extent=EXTENT):
+    """
+    One MVT tile with a single polygon layer
+
+    columns maps attribute name -> per-feature values; NaN/None are omitted.
+    """
+    keys, values, tags = _tags(columns, len(ids))
+    features = []
+    for fid, tag, geometry in zip(ids, tags, geometries):
+        feature = b'' if fid is None else b'\x08' + _varint(int(fid))
+        if tag:
+            feature += b'\x12' + _varint(len(tag)) + tag
+        feature += b'\x18\x03\x22' + _varint(len(geometry)) + geometry
+        features.append(b'\x12' + _varint(len(feature)) + feature)
+    body = (b'\x78\x02' + _field(1, layer.encode()) + b''.join(features) +
+            b''.join(_field(3, k.encode()) for k in keys) +
+            b''.join(_field(4, v) for v in values) +
+            b'\x28' + _varint(extent))
+    return _field(3, body)
+
+
+# --- pyramid -------------------------------------------------------------------
+
+def feature_attributes(tracts, z):
+    """
+    Per-feature attribute columns for zoom z
+
+    Below DETAIL_ZOOM only resilience_score is kept, rounded to
+    COARSE_DECIMALS (enough for the colour classes); with the feature ids
+    dropped as well this roughly halves the national overview tiles. The
+    small integer bivariate class is kept at every zoom.
+    """
+    classes = {}
+    if CLASS_PROPERTY in tracts:
+        classes[CLASS_PROPERTY] = tracts[CLASS_PROPERTY].to_numpy(dtype=np.int64)
+    if z < DETAIL_ZOOM:
+        return {'resilience_score': tracts['resilience_score'].astype(float).round(COARSE_DECIMALS).to_numpy(),
+                **classes}
+    columns = {'GEOID': tracts['GEOID'].astype(str).to_numpy(), **classes}
+    for col in PROPERTIES:
+        columns[col] = tracts[col].astype(float).round(DECIMALS).to_numpy()
+    return columns
+
+
+def build_pyramid(tracts, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, extent=EXTENT,
+                  simplify_units=SIMPLIFY_UNITS, min_area=MIN_AREA_UNITS):
+    """
+    Yield (z, x, y, tile_bytes) for every non-empty tile, highest zoom first
+
+    Each zoom simplifies the previous zoom's geometry (tolerance doubles per
+    level, so the full-resolution polygons are only simplified once),
+    polygons too small to draw at that zoom are skipped before clipping, and
+    each tile's features are clipped in one vectorized call.
+    """
+    simplified = np.asarray(tracts.geometry.values)
+    ids = tract_store.normalize_geoid(tracts['GEOID']).astype(np.int64)
+    area = shapely.area(simplified)
+
+    for z in range(max_zoom, min_zoom - 1, -1):
+        unit = 2 * ORIGIN / 2 ** z / extent
+        simplified = shapely.simplify(simplified, unit * simplify_units, preserve_topology=True)
+        attrs = feature_attributes(tracts, z)
+        visible = np.flatnonzero(area >= min_area * unit ** 2)
+        feature, tx, ty = tiles_for_bounds(shapely.bounds(simplified[visible]), z, BUFFER / extent)
+        order = np.lexsort((ty, tx))
+        feature, tx, ty = visible[feature[order]], tx[order], ty[order]
+        breaks = np.flatnonzero(np.r_[True, (tx[1:] != tx[:-1]) | (ty[1:] != ty[:-1]), True])
+        pad = BUFFER * unit
+        for a, b in zip(breaks[:-1], breaks[1:]):
+            x, y = int(tx[a]), int(ty[a])
+            minx, miny, maxx, maxy = tile_bounds(z, x, y)
+            members = feature[a:b]
+            clipped = shapely.clip_by_rect(simplified[members], minx - pad, miny - pad,
+                                           maxx + pad, maxy + pad)
+            kept, blobs = encode_geometries(clipped, z, x, y, extent, min_area)
+            if len(kept) == 0:
+                continue
+            rows = members[kept]
+            columns = {name: col[rows] for name, col in attrs.items()}
+            tile_ids = ids[rows] if z >= DETAIL_ZOOM else [None] * len(rows)
+            yield z, x, y, encode_tile(tile_ids, columns, blobs, extent=extent)
+
+
+def tilejson(tracts, min_zoom, max_zoom, tiles_url='tiles/{z}/{x}/{y}.pbf'):
+    """TileJSON metadata describing the layer"""
+    west, south, east, north = tracts.to_crs('EPSG:4326').total_bounds
+    return {
+        'tilejson': '3.0.0',
+        'tiles': [tiles_url],
+        'minzoom': min_zoom,
+        'maxzoom': max_zoom,
+        'bounds': [round(float(v), 5) for v in (west, south, east, north)],
+        'vector_layers': [{'id': LAYER, 'minzoom': min_zoom, 'maxzoom': max_zoom,
+                           'fields': {'GEOID': 'String', CLASS_PROPERTY: 'Number',
+                                      **{c: 'Number' for c in PROPERTIES}}}],
+    }
+
+
+def write_directory(tiles, tile_dir=TILE_DIR):
+    """Write tiles as tile_dir/z/x/y.pbf; returns (count, total bytes)"""
+    if os.path.exists(tile_dir):
+        shutil.rmtree(tile_dir)
+    count = size = 0
+    for z, x, y, data in tiles:
+        os.makedirs(os.path.join(tile_dir, str(z), str(x)), exist_ok=True)
+        with open(os.path.join(tile_dir, str(z), str(x), f"{y}.pbf"), 'wb') as f:
+            f.write(data)
+        count += 1
+        size += len(data)
+    return count, size
+
+
+def write_mbtiles(tiles, path=MBTILES_PATH, metadata=None):
+    """Write tiles (gzipped, TMS row order) to an MBTiles archive; returns (count, total bytes)"""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE metadata (name TEXT, value TEXT)')
+    conn.execute('CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, '
+                 'tile_row INTEGER, tile_data BLOB)')
+    count = size = 0
+    for z, x, y, data in tiles:
+        blob = gzip.compress(data)
+        conn.execute('INSERT INTO tiles VALUES (?, ?, ?, ?)', (z, x, 2 ** z - 1 - y, blob))
+        count += 1
+        size += len(blob)
+    conn.execute('CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)')
+    if metadata:
+        rows = {'name': 'resilience', 'format': 'pbf',
+                'minzoom': metadata['minzoom'], 'maxzoom': metadata['maxzoom'],
+                'bounds': ','.join(map(str, metadata['bounds'])),
+                'json': json.dumps({'vector_layers': metadata['vector_layers']})}
+        conn.executemany('INSERT INTO metadata VALUES (?, ?)', [(k, str(v)) for k, v in rows.items()])
+    conn.commit()
+    conn.close()
+    return count, size
+
+
+def _tee(tiles, sinks):
+    """Materialize tiles once when several writers need them"""
+    return list(tiles) if len(sinks) > 1 else tiles
+
+
+INDEX_HTML = """<!doctype html><html><head><meta charset="utf-8"/><title>Resilience Map</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
+<style>#map{height:92vh}</style></head><body>
+<div id="map"></div>
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<script src="https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js"></script>
+<script>
+const map = L.map('map').setView([39.5,-98.35], 4);
+L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {maxZoom: 18}).addTo(map);
+function getColor(v){ // simple quantiles
+  if (v==null || isNaN(v)) return '#cccccc';
+  if (v>1.5) return '#08306b';
+  if (v>0.5) return '#2171b5';
+  if (v>-0.5) return '#6baed6';
+  if (v>-1.5) return '#c6dbef';
+  return '#eff3ff';
+}
+// ?style=bivariate colours by LILA intensity x resilience class (1-9, 0 = missing)
+const BIVARIATE = __PALETTE__;
+const bivariateMode = new URLSearchParams(location.search).get('style') === 'bivariate';
+const fill = p => bivariateMode ? (BIVARIATE[p.bivariate_class - 1] || '#cccccc') : getColor(p.resilience_score);
+const fmt = v => v==null ? '' : v.toFixed(2);
+L.vectorGrid.protobuf('__TILES__', {
+  minNativeZoom: __MINZOOM__, maxNativeZoom: __MAXZOOM__, maxZoom: 18, interactive: true,
+  rendererFactory: L.canvas.tile,
+  vectorTileLayerStyles: {
+    __LAYER__: p => ({fill: true, color:'#999', weight: 0.2, fillOpacity: 0.9, fillColor: fill(p)})
+  }
+}).on('click', e => {
+  const p = e.layer.properties;
+  L.popup().setLatLng(e.latlng).setContent(
+    '<b>Tract:</b> '+(p.GEOID||'zoom in for tract ID')+'<br/>' +
+    '<b>Resilience z:</b> '+fmt(p.resilience_score)+'<br/>' +
+    '<b>Bivariate class:</b> '+(p.bivariate_class||'')+'<br/>' +
+    '<b>Burden:</b> '+fmt(p.burden)+'<br/>' +
+    '<b>Resid:</b> '+fmt(p.resid)).openOn(map);
+}).addTo(map);
+</script></body></html>"""
+
+
+def write_index_html(metadata, path=os.path.join(FIGURES_DIR, 'index.html')):
+    """Leaflet page that draws the vector tiles instead of the full GeoJSON"""
+    html = (INDEX_HTML.replace('__TILES__', metadata['tiles'][0])
+            .replace('__MINZOOM__', str(metadata['minzoom']))
+            .replace('__MAXZOOM__', str(metadata['maxzoom']))
+            .replace('__LAYER__', LAYER)
+            .replace('__PALETTE__', json.dumps(bivariate.palette(3))))
+    with open(path, 'w') as f:
+        f.write(html)
+
+
+def make_tiles(tracts=None, directory=True, mbtiles=False, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """Build the pyramid, write the requested outputs, metadata and index.html"""
+    tracts = load_tracts() if tracts is None else tracts
+    metadata = tilejson(tracts, min_zoom, max_zoom)
+    sinks = [s for s, on in [('directory', directory), ('mbtiles', mbtiles)] if on]
+    tiles = _tee(build_pyramid(tracts, min_zoom, max_zoom), sinks)
+    written = {}
+    if directory:
+        written['directory'] = write_directory(tiles)
+        with open(os.path.join(TILE_DIR, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+    if mbtiles:
+        written['mbtiles'] = write_mbtiles(tiles, metadata=metadata)
+    if directory:
+        write_index_html(metadata)
+    return written
+
+
+if __name__ == "__main__":
+    import sys
+    print("=" * 60)
+    print("VECTOR TILE PYRAMID")
+    print("=" * 60)
+    written = make_tiles(mbtiles='--mbtiles' in sys.argv)
+    for sink, (count, size) in written.items():
+        print(f"{sink}: {count:,} tiles, {size / 1e6:.1f} MB")
+    print(f"\nSaved: {TILE_DIR}/" + (f" and {MBTILES_PATH}" if 'mbtiles' in written else ""))